@@ -1,23 +1,26 @@
-import streamlit as st
-import torch
+import io
 import os
-import matplotlib.pyplot as plt
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import numpy as np
-import seaborn as sns
-from PIL import Image
-import pandas as pd
+import streamlit as st
+from PIL import Image, UnidentifiedImageError
 
-import sys
 sys.path.append('src')
 
-from src.config import NUM_CLASSES, CLASS_NAMES, DUMMY_MODEL_PATH
-from models.baseline import ClothingClassifier
-from data.dataset import get_transforms
+from src.config import CLASS_NAMES, COLOR_NAMES, DUMMY_MODEL_PATH, PREDICTION_CACHE_PATH
 
-st.set_page_config(page_title="Wardrobe AI", page_icon="✨", layout="wide", initial_sidebar_state="expanded")
+st.set_page_config(
+    page_title="Wardrobe AI",
+    page_icon="✨",
+    layout="wide",
+    initial_sidebar_state="expanded",
+)
 
 # Modern Dark/Light Theme Support with Custom CSS
-st.markdown("""
+st.markdown(
+    """
     <style>
     /* Main Background */
     .stApp {
@@ -25,14 +28,14 @@ st.markdown("""
         color: #FAFAFA;
         font-family: 'Inter', sans-serif;
     }
-    
+
     /* Headers */
     h1, h2, h3 {
         color: #00E5FF !important;
         font-weight: 700 !important;
         letter-spacing: -0.5px;
     }
-    
+
     /* Custom Button */
     .stButton>button {
         width: 100%;
@@ -49,20 +52,20 @@ st.markdown("""
         transform: translateY(-2px);
         box-shadow: 0 6px 20px rgba(0, 229, 255, 0.5);
     }
-    
+
     /* Image Container */
     .uploaded-img {
         border-radius: 12px;
         box-shadow: 0 8px 30px rgba(0,0,0,0.5);
         border: 2px solid #262730;
     }
-    
+
     /* Sidebar */
     [data-testid="stSidebar"] {
         background-color: #1E1E1E;
         border-right: 1px solid #333;
     }
-    
+
     /* Success/Info Boxes */
     .stSuccess, .stInfo {
         background-color: #1A1A1A !important;
@@ -71,47 +74,350 @@ st.markdown("""
         border-radius: 8px;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """,
+    unsafe_allow_html=True,
+)
 
 st.title("✨ Wardrobe AI Vision")
-st.markdown("<p style='font-size: 1.2rem; color: #A0A0A0;'>Next-generation clothing classification powered by deep learning.</p>", unsafe_allow_html=True)
+st.markdown(
+    "<p style='font-size: 1.2rem; color: #A0A0A0;'>Next-generation clothing "
+    "classification powered by deep learning.</p>",
+    unsafe_allow_html=True,
+)
 st.markdown("---")
 
+# The page shell above is on screen before torch/torchvision finish importing;
+# timm is only imported if a checkpoint has to be rebuilt (see models/baseline.py)
+import torch  # noqa: E402
+
+from data.dataset import get_transforms  # noqa: E402
+from models.checkpoint import warmup  # noqa: E402
+from models.engine import BACKENDS, load_engine  # noqa: E402
+from serving.prediction_cache import (  # noqa: E402
+    PredictionCache,
+    content_hash,
+    model_version,
+)
+
 st.sidebar.markdown("### ⚙️ Engine Settings")
 model_path = st.sidebar.text_input("Model Weights", DUMMY_MODEL_PATH)
-num_classes_input = st.sidebar.number_input("Output Classes", min_value=1, value=NUM_CLASSES)
+backend = st.sidebar.selectbox(
+    "Inference Backend",
+    BACKENDS,
+    help="auto picks TorchScript/ONNX/fp32 from the file extension; int8-dynamic "
+    "quantizes a checkpoint on load",
+)
+mode = st.sidebar.radio(
+    "Mode",
+    ["Single Scan", "Batch Upload"],
+    help="Batch Upload scores a whole outfit or haul in batched forward passes",
+)
+batch_size = st.sidebar.slider("Batch Size", 1, 64, 32, disabled=mode != "Batch Upload")
 st.sidebar.markdown("---")
-st.sidebar.markdown("<p style='font-size: 0.9rem; color: #666;'>v2.0.0 - Neural Engine Active</p>", unsafe_allow_html=True)
+st.sidebar.markdown(
+    "<p style='font-size: 0.9rem; color: #666;'>v2.0.0 - Neural Engine Active</p>",
+    unsafe_allow_html=True,
+)
 
 
 @st.cache_resource
-def load_model(path, expected_num_classes):
+def load_model(path, backend):
+    """Load the inference engine for a checkpoint or exported artifact."""
     if not os.path.exists(path):
-        return None
+        return None, None, {}
     try:
-        model = ClothingClassifier(num_classes=expected_num_classes, pretrained=False)
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        model.load_state_dict(torch.load(path, map_location=device))
-        model.eval()
-        return model
+        # Architecture comes from the checkpoint itself; pin the device once and
+        # pay lazy-initialization costs here rather than on the first scan.
+        model, device, meta = load_engine(path, backend)
+        warmup(model, device)
+        return model, device, meta['labels']
     except Exception as e:
         st.error(f"Error loading model from {path}: {e}")
-        return None
+        return None, None, {}
+
+
+@st.cache_resource
+def load_preprocess():
+    """Return the evaluation transform of the loaded model."""
+    return get_transforms(train=False)
+
+
+@st.cache_resource
+def load_prediction_cache(path, backend):
+    """Open the prediction cache, keyed to the loaded weights and backend."""
+    # One cache per model version, shared by every session of this server
+    return PredictionCache(PREDICTION_CACHE_PATH, model_version(path, backend))
+
+
+@st.cache_resource
+def load_executors():
+    """Return a decoding pool and the single thread that runs forward passes."""
+    return (
+        ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 4, thread_name_prefix='decode'
+        ),
+        ThreadPoolExecutor(max_workers=1, thread_name_prefix='forward'),
+    )
+
+
+@st.cache_resource
+def load_catalog_index(path):
+    """Load the catalog index next to the weights, if one was built."""
+    # Built by src/build_index.py next to the weights; matches are skipped without one
+    from retrieval.index import EmbeddingIndex, default_index_path
+
+    index_path = default_index_path(path)
+    return (
+        EmbeddingIndex.load(index_path)
+        if os.path.exists(index_path + '.json')
+        else None
+    )
+
+
+def decode(image_bytes):
+    """Decode and preprocess an uploaded image."""
+    return preprocess(Image.open(io.BytesIO(image_bytes)).convert('RGB'))
+
+
+@torch.no_grad()
+def forward(tensors):
+    """Run one batched forward pass and return a prediction dict per input."""
+    cat_logits, color_logits, embeddings = model(torch.stack(tensors).to(device))
+    cat_probs = torch.nn.functional.softmax(cat_logits, dim=1).float().cpu().numpy()
+    color_probs = torch.nn.functional.softmax(color_logits, dim=1).float().cpu().numpy()
+    embeddings = embeddings.float().cpu().numpy()
+    return [
+        {
+            'category_probs': cat_probs[i],
+            'color_probs': color_probs[i],
+            'embedding': embeddings[i],
+        }
+        for i in range(len(tensors))
+    ]
+
+
+def predict(image_bytes):
+    """
+    Return the prediction for an uploaded image, from the cache when possible.
+
+    The prediction holds category/color probabilities and the embedding; repeat
+    uploads of the same bytes skip the forward pass.
+    """
+    cache = load_prediction_cache(model_path, backend)
+    key = content_hash(image_bytes)
+    prediction = cache.get(key)
+    if prediction is None:
+        prediction = forward([decode(image_bytes)])[0]
+        cache.put(key, prediction)
+    return prediction
+
+
+def predict_batch(images, batch_size):
+    """
+    Yield (position, prediction) for image bytes as results arrive.
+
+    Cache hits come first, then each batch of up to batch_size images once its
+    single forward pass finishes. Decoding runs on the thread pool while
+    earlier batches are still in the model. Undecodable images yield None.
+    """
+    cache = load_prediction_cache(model_path, backend)
+    decoder, runner = load_executors()
+    keys = [content_hash(data) for data in images]
+    missing = []
+    for position, key in enumerate(keys):
+        prediction = cache.get(key)
+        if prediction is None:
+            missing.append(position)
+        else:
+            yield position, prediction
 
-model = load_model(model_path, num_classes_input)
+    decoded = {
+        position: decoder.submit(decode, images[position]) for position in missing
+    }
+
+    def run_batch(positions):
+        tensors, ok = [], []
+        for position in positions:
+            try:
+                tensors.append(decoded[position].result())
+                ok.append(position)
+            except (UnidentifiedImageError, OSError):
+                continue  # reported by the caller as a skipped file
+        outputs = dict(zip(ok, forward(tensors))) if tensors else {}
+        return [(position, outputs.get(position)) for position in positions]
+
+    batches = [
+        runner.submit(run_batch, missing[i : i + batch_size])
+        for i in range(0, len(missing), batch_size)
+    ]
+    for future in as_completed(batches):
+        for position, prediction in future.result():
+            if prediction is not None:
+                cache.put(keys[position], prediction)
+            yield position, prediction
+
+
+def nearest_matches(embeddings, k=3):
+    """Return the k nearest catalog items for each embedding."""
+    index = load_catalog_index(model_path)
+    if index is None or not len(embeddings):
+        return [[] for _ in embeddings]
+    _, ids = index.search(np.stack(embeddings), k)
+    return [[item_id for item_id in row if item_id is not None] for row in ids]
+
+
+@st.cache_data(show_spinner=False)
+def confidence_chart(probs, plot_names, top_class_idx):
+    """
+    Render the class-probability bar chart as PNG bytes.
+
+    Rendered once per distinct prediction and served from the cache on reruns.
+    """
+    # Plotting libraries are only needed once a single scan is shown
+    import matplotlib
+
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Modern Dark Theme Plot
+    with plt.style.context('dark_background'):
+        fig, ax = plt.subplots(figsize=(6, 3))
+        fig.patch.set_facecolor('#0E1117')
+        ax.set_facecolor('#0E1117')
+
+        # Custom color palette
+        colors = [
+            '#00E5FF' if i == top_class_idx else '#333333' for i in range(len(probs))
+        ]
+
+        sns.barplot(x=list(probs), y=list(plot_names), ax=ax, palette=colors)
+
+        ax.set_xlim(0, 1)
+        ax.set_xlabel("Probability", color='#A0A0A0')
+        ax.set_ylabel("")
+        ax.tick_params(colors='#A0A0A0')
+
+        # Remove borders
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', facecolor=fig.get_facecolor())
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+def result_row(name, prediction, matches):
+    """Build one row of the batch results table."""
+    if prediction is None:
+        return {
+            'Image': name,
+            'Category': 'Unreadable image',
+            'Confidence': None,
+            'Color': None,
+            'Color Confidence': None,
+            'Nearest Matches': '',
+        }
+    cat_idx = int(np.argmax(prediction['category_probs']))
+    color_idx = int(np.argmax(prediction['color_probs']))
+    return {
+        'Image': name,
+        'Category': class_names.get(cat_idx, f"Class {cat_idx}"),
+        'Confidence': float(prediction['category_probs'][cat_idx]),
+        'Color': color_names.get(color_idx, f"Color {color_idx}"),
+        'Color Confidence': float(prediction['color_probs'][color_idx]),
+        'Nearest Matches': ', '.join(matches),
+    }
+
+
+model, device, labels = load_model(model_path, backend)
+preprocess = load_preprocess()
+class_names = labels.get('categories') or CLASS_NAMES
+color_names = labels.get('colors') or COLOR_NAMES
 
 if model is None:
     st.sidebar.error(f"❌ Weights not found or failed to load from {model_path}")
-    st.error("System offline: Please ensure the model path is correct and the weights are valid. You can generate dummy weights using `python create_dummy.py`.")
+    st.error(
+        "System offline: Please ensure the model path is correct and the weights "
+        "are valid. You can generate dummy weights using `python create_dummy.py`."
+    )
+elif mode == "Batch Upload":
+    st.sidebar.success("🟢 Neural Engine Online")
+
+    st.markdown("### 📤 Batch Input")
+    uploaded_files = st.file_uploader(
+        "Drop clothing images here",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+        label_visibility="collapsed",
+    )
+
+    if uploaded_files:
+        st.image(
+            [f.getvalue() for f in uploaded_files],
+            width=120,
+            caption=[f.name for f in uploaded_files],
+        )
+        upload_ids = tuple(f.file_id for f in uploaded_files)
+
+        st.markdown("### 🧠 Analysis")
+        table = st.empty()
+        if st.button(f"Scan {len(uploaded_files)} Images 🚀"):
+            names = [f.name for f in uploaded_files]
+            rows = [None] * len(uploaded_files)
+            progress = st.progress(0.0)
+            # Rows appear as soon as their batch comes back from the background threads
+            for done, (position, prediction) in enumerate(
+                predict_batch([f.getvalue() for f in uploaded_files], batch_size), 1
+            ):
+                if prediction is None:
+                    st.warning(
+                        f"Skipped {names[position]}: the file could not be "
+                        "decoded as an image."
+                    )
+                matches = (
+                    nearest_matches([prediction['embedding']])[0]
+                    if prediction is not None
+                    else []
+                )
+                rows[position] = result_row(names[position], prediction, matches)
+                progress.progress(done / len(rows), text=f"{done}/{len(rows)} scanned")
+                table.dataframe(
+                    [row for row in rows if row is not None], use_container_width=True
+                )
+            progress.empty()
+            st.session_state['batch_results'] = (upload_ids, rows)
+        elif st.session_state.get('batch_results', (None,))[0] == upload_ids:
+            # Reruns redraw the last scan of these same files without recomputing it
+            table.dataframe(
+                st.session_state['batch_results'][1], use_container_width=True
+            )
+
+        if load_catalog_index(model_path) is None:
+            st.caption(
+                "No catalog index next to the weights: build one with "
+                "`src/build_index.py` to see nearest matches."
+            )
+    else:
+        st.info(
+            "Awaiting visual input. Please upload one or more files to the input "
+            "stream."
+        )
 else:
     st.sidebar.success("🟢 Neural Engine Online")
-    
+
     col1, col2 = st.columns([1.2, 1])
-    
+
     with col1:
         st.markdown("### 📤 Input Stream")
-        uploaded_file = st.file_uploader("Drop an image of clothing here", type=["jpg", "jpeg", "png"], label_visibility="collapsed")
-        
+        uploaded_file = st.file_uploader(
+            "Drop an image of clothing here",
+            type=["jpg", "jpeg", "png"],
+            label_visibility="collapsed",
+        )
+
         if uploaded_file is not None:
             image = Image.open(uploaded_file).convert('RGB')
             st.image(image, use_column_width=True, clamp=True)
@@ -121,51 +427,41 @@ else:
         if uploaded_file is not None:
             if st.button("Initialize Scan 🚀"):
                 with st.spinner("Processing image through neural network..."):
-                    transforms = get_transforms(train=False)
-                    input_tensor = transforms(image).unsqueeze(0)
-                    
-                    with torch.no_grad():
-                        output = model(input_tensor)
-                        probabilities = torch.nn.functional.softmax(output[0], dim=0)
-                        
+                    prediction = predict(uploaded_file.getvalue())
+
                     # Get all predictions sorted
-                    probs_np = probabilities.cpu().numpy()
+                    probs_np = prediction['category_probs']
                     indices = np.argsort(probs_np)[::-1]
-                    
+
                     top_class_idx = indices[0]
-                    top_class_name = CLASS_NAMES.get(top_class_idx, f"Class {top_class_idx}")
+                    top_class_name = class_names.get(
+                        top_class_idx, f"Class {top_class_idx}"
+                    )
                     confidence = probs_np[top_class_idx]
-                    
+
+                    color_np = prediction['color_probs']
+                    top_color_idx = int(np.argmax(color_np))
+                    top_color_name = color_names.get(
+                        top_color_idx, f"Color {top_color_idx}"
+                    )
+
                     st.markdown("<br>", unsafe_allow_html=True)
                     st.markdown("#### Primary Match")
-                    st.success(f"**{top_class_name}** • {confidence*100:.2f}% Match")
-                    
+                    st.success(f"**{top_class_name}** • {confidence * 100:.2f}% Match")
+                    st.info(
+                        f"Color: **{top_color_name}** • "
+                        f"{color_np[top_color_idx] * 100:.2f}%"
+                    )
+
                     st.markdown("#### Confidence Matrix")
-                    
-                    # Modern Dark Theme Plot
-                    plt.style.use('dark_background')
-                    fig, ax = plt.subplots(figsize=(6, 3))
-                    fig.patch.set_facecolor('#0E1117')
-                    ax.set_facecolor('#0E1117')
-                    
-                    plot_names = [CLASS_NAMES.get(i, f"Class {i}") for i in range(len(CLASS_NAMES))]
-                    
-                    # Custom color palette
-                    colors = ['#00E5FF' if CLASS_NAMES.get(i) == top_class_name else '#333333' for i in range(len(CLASS_NAMES))]
-                    
-                    sns.barplot(x=probs_np, y=plot_names, ax=ax, palette=colors)
-                    
-                    ax.set_xlim(0, 1)
-                    ax.set_xlabel("Probability", color='#A0A0A0')
-                    ax.set_ylabel("")
-                    ax.tick_params(colors='#A0A0A0')
-                    
-                    # Remove borders
-                    for spine in ax.spines.values():
-                        spine.set_visible(False)
-                        
-                    plt.tight_layout()
-                    st.pyplot(fig)
+
+                    plot_names = tuple(
+                        class_names.get(i, f"Class {i}") for i in range(len(probs_np))
+                    )
+                    st.image(
+                        confidence_chart(
+                            tuple(probs_np.tolist()), plot_names, int(top_class_idx)
+                        )
+                    )
         else:
             st.info("Awaiting visual input. Please upload a file to the input stream.")
-
@@ -0,0 +1,376 @@
+"""
+Benchmark the training, inference and retrieval hot paths.
+
+Covers image decode + transforms, dataset iteration (PIL transforms vs the
+batched uint8 pipeline), WardrobeNet forward, top-k similarity search and
+scatter-gather search over shard processes. Everything runs on synthetic data,
+so no dataset or network is needed.
+
+    git switch main
+    python benchmarks/run.py --save_baseline /tmp/baseline.json
+    git switch my-branch
+    python benchmarks/run.py --baseline /tmp/baseline.json --threshold 0.15
+
+Results are {name: {value, unit, higher_is_better}}. With --baseline every
+metric is compared to the stored run, and the process exits with status 1
+if any metric is worse by more than --threshold (relative). Timings depend on
+the machine, so the baseline is recorded on the same machine rather than
+committed (see SETUP.md).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from synthetic import make_images, synthetic_embeddings  # noqa: E402
+
+from data.dataset import MultiTaskWardrobeDataset, get_transforms  # noqa: E402
+from data.fast_augment import FastWardrobeDataset, fast_loader  # noqa: E402
+from models.baseline import WardrobeNet  # noqa: E402
+from retrieval.index import EmbeddingIndex  # noqa: E402
+from retrieval.sharded import ShardedIndex, build_shards  # noqa: E402
+
+SUITES = ('transforms', 'dataset', 'augment', 'model', 'search', 'shards')
+
+
+def _ints(value):
+    return [int(v) for v in value.split(',')]
+
+
+def median_time(fn, repeats=5, warmup=1):
+    """Return the median wall time of fn over repeats calls, after warmup calls."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def metric(value, unit, higher_is_better=True):
+    """Build one result entry for the JSON report."""
+    return {'value': float(value), 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def bench_transforms(args, image_dir, csv_path):
+    """Single-process PIL decode + get_transforms throughput."""
+    paths = [
+        os.path.join(image_dir, name)
+        for name in sorted(os.listdir(image_dir))
+        if name.endswith('.jpg')
+    ]
+    results = {}
+    for name, transform in (
+        ('eval', get_transforms(train=False)),
+        ('train', get_transforms(train=True)),
+    ):
+
+        def run(transform=transform):
+            for path in paths:
+                transform(Image.open(path).convert('RGB'))
+
+        results[f'transforms/decode+{name}'] = metric(
+            len(paths) / median_time(run, args.repeats), 'img/s'
+        )
+    return results
+
+
+def bench_dataset(args, image_dir, csv_path):
+    """One full pass of MultiTaskWardrobeDataset through a DataLoader."""
+    dataset = MultiTaskWardrobeDataset(
+        csv_path, image_dir, transform=get_transforms(train=True)
+    )
+    results = {}
+    for num_workers in _ints(args.num_workers):
+        loader = DataLoader(
+            dataset,
+            batch_size=32,
+            shuffle=True,
+            num_workers=num_workers,
+            persistent_workers=num_workers > 0,
+        )
+
+        def run(loader=loader):
+            for _ in loader:
+                pass
+
+        results[f'dataset/workers{num_workers}'] = metric(
+            len(dataset) / median_time(run, args.repeats), 'img/s'
+        )
+    return results
+
+
+def bench_augment(args, image_dir, csv_path):
+    """
+    Measure training augmentation throughput per worker count.
+
+    Compares per-image PIL transforms with uint8 decode + BatchAugment on
+    collated batches.
+    """
+    pil = MultiTaskWardrobeDataset(
+        csv_path, image_dir, transform=get_transforms(train=True)
+    )
+    fast = FastWardrobeDataset(csv_path, image_dir)
+    results = {}
+    for num_workers in _ints(args.num_workers):
+        loaders = {
+            'pil': DataLoader(
+                pil,
+                batch_size=args.augment_batch_size,
+                shuffle=True,
+                num_workers=num_workers,
+                persistent_workers=num_workers > 0,
+            ),
+            'batched': fast_loader(
+                fast, args.augment_batch_size, num_workers=num_workers
+            ),
+        }
+        for name, loader in loaders.items():
+
+            def run(loader=loader):
+                for _ in loader:
+                    pass
+
+            results[f'augment/{name}/workers{num_workers}'] = metric(
+                len(pil) / median_time(run, args.repeats), 'img/s'
+            )
+    return results
+
+
+@torch.no_grad()
+def bench_model(args, image_dir, csv_path):
+    """WardrobeNet forward latency and throughput per batch size and thread count."""
+    model = WardrobeNet(pretrained=False).eval()
+    default_threads = torch.get_num_threads()
+    results = {}
+    for threads in _ints(args.threads) if args.threads else [default_threads]:
+        torch.set_num_threads(threads)
+        for batch_size in _ints(args.batch_sizes):
+            images = torch.randn(batch_size, 3, 224, 224)
+            seconds = median_time(lambda images=images: model(images), args.repeats)
+            prefix = f'model/forward/bs{batch_size}/threads{threads}'
+            results[f'{prefix}/latency'] = metric(
+                seconds * 1000, 'ms', higher_is_better=False
+            )
+            results[f'{prefix}/throughput'] = metric(batch_size / seconds, 'img/s')
+    torch.set_num_threads(default_threads)
+    return results
+
+
+def bench_search(args, image_dir, csv_path):
+    """Exact top-k search (the default index for catalogs up to 20k items)."""
+    results = {}
+    for size in _ints(args.catalog_sizes):
+        vectors = synthetic_embeddings(size, 512)
+        index = EmbeddingIndex.build(vectors, np.arange(size), index_type='flat')
+        queries = vectors[: args.num_queries]
+
+        def single(queries=queries, index=index):
+            for query in queries:
+                index.search(query, args.k)
+
+        seconds = median_time(single, args.repeats)
+        results[f'search/flat/n{size}/latency'] = metric(
+            seconds * 1000 / len(queries), 'ms', higher_is_better=False
+        )
+        seconds = median_time(
+            lambda queries=queries, index=index: index.search(queries, args.k),
+            args.repeats,
+        )
+        results[f'search/flat/n{size}/batched'] = metric(
+            len(queries) / seconds, 'queries/s'
+        )
+    return results
+
+
+def bench_shards(args, image_dir, csv_path):
+    """
+    Measure sharded scatter-gather search latency per shard count.
+
+    Exact top-k search through a ShardedIndex: one worker process per shard,
+    Unix sockets and a heap merge.
+    """
+    results = {}
+    for size in _ints(args.catalog_sizes):
+        vectors = synthetic_embeddings(size, 512)
+        queries = vectors[: args.num_queries]
+        for num_shards in _ints(args.num_shards):
+            with tempfile.TemporaryDirectory() as shard_dir:
+                build_shards(
+                    vectors, np.arange(size), shard_dir, num_shards, index_type='flat'
+                )
+                with ShardedIndex.launch(shard_dir, timeout_ms=60_000) as index:
+
+                    def single(queries=queries, index=index):
+                        for query in queries:
+                            index.search(query, args.k)
+
+                    seconds = median_time(single, args.repeats)
+                    prefix = f'shards/flat/n{size}/shards{num_shards}'
+                    results[f'{prefix}/latency'] = metric(
+                        seconds * 1000 / len(queries), 'ms', higher_is_better=False
+                    )
+                    seconds = median_time(
+                        lambda queries=queries, index=index: index.search(
+                            queries, args.k
+                        ),
+                        args.repeats,
+                    )
+                    results[f'{prefix}/batched'] = metric(
+                        len(queries) / seconds, 'queries/s'
+                    )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print every metric against the baseline and return the regressed names."""
+    regressions = []
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['value'], current['value']
+        change = (after - before) / before if before else 0.0
+        worse = -change if current['higher_is_better'] else change
+        status = 'REGRESSION' if worse > threshold else 'ok'
+        if status != 'ok':
+            regressions.append(name)
+        print(
+            f"{name:<50} {before:>12.3f} -> {after:>12.3f} {current['unit']:<10} "
+            f"{change:+7.1%}  {status}"
+        )
+    return regressions
+
+
+def main():
+    """Run the selected benchmarks and compare them with a baseline."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the inference, data loading and retrieval hot paths'
+    )
+    parser.add_argument(
+        '--suites',
+        type=str,
+        default=','.join(SUITES),
+        help=f'Comma-separated subset of {SUITES}',
+    )
+    parser.add_argument(
+        '--num_images', type=int, default=128, help='Synthetic images to generate'
+    )
+    parser.add_argument(
+        '--num_workers',
+        type=str,
+        default='0,2,4',
+        help='DataLoader worker counts to compare',
+    )
+    parser.add_argument('--augment_batch_size', type=int, default=32)
+    parser.add_argument(
+        '--image_size', type=str, default='640,480', help='Synthetic image width,height'
+    )
+    parser.add_argument('--batch_sizes', type=str, default='1,8,32,128,256')
+    parser.add_argument(
+        '--threads',
+        type=str,
+        default=None,
+        help='Comma-separated torch thread counts (default: current)',
+    )
+    parser.add_argument('--catalog_sizes', type=str, default='10000,100000')
+    parser.add_argument(
+        '--num_shards',
+        type=str,
+        default='2,4',
+        help='Shard counts for the shards suite',
+    )
+    parser.add_argument('--num_queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=3,
+        help='Timed repetitions per measurement (median is kept)',
+    )
+    parser.add_argument(
+        '--output', type=str, default=None, help='Write results as JSON'
+    )
+    parser.add_argument(
+        '--baseline', type=str, default=None, help='Baseline JSON to compare against'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='Relative slowdown counted as a regression',
+    )
+    parser.add_argument(
+        '--save_baseline',
+        type=str,
+        default=None,
+        help='Write this run as the new baseline',
+    )
+    args = parser.parse_args()
+
+    suites = {
+        'transforms': bench_transforms,
+        'dataset': bench_dataset,
+        'augment': bench_augment,
+        'model': bench_model,
+        'search': bench_search,
+        'shards': bench_shards,
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as image_dir:
+        csv_path = make_images(
+            image_dir, args.num_images, size=tuple(_ints(args.image_size))
+        )
+        for suite in args.suites.split(','):
+            print(f"Running {suite}...", file=sys.stderr)
+            results.update(suites[suite](args, image_dir, csv_path))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'cpu_count': os.cpu_count(),
+            'torch_threads': torch.get_num_threads(),
+        },
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline is None:
+        for name, result in results.items():
+            print(f"{name:<50} {result['value']:>12.3f} {result['unit']}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(
+            f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: "
+            f"{', '.join(regressions)}",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
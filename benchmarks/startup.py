@@ -0,0 +1,170 @@
+"""
+Cold-start budget for the entry points.
+
+Each target is imported in a fresh interpreter under `python -X importtime`; the script
+reports the total import time, the heaviest top-level imports and any module that must
+stay lazy but was loaded anyway.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --targets serve,app --budget serve=3000 \
+        --output startup.json
+
+Exits with status 1 if a target imports a forbidden module or exceeds its
+budget (milliseconds of cumulative import time). Budgets are
+machine-dependent; the forbidden-module checks are not.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+
+# target -> (statement, default budget in ms, modules that must not be imported at
+# startup)
+TARGETS = {
+    'train': ('import train', 6000, ('wandb', 'timm', 'pandas')),
+    'evaluate': ('import evaluate', 6000, ('timm', 'wandb')),
+    'serve': ('import serve', 6000, ('timm', 'wandb', 'transformers', 'pandas')),
+    'model': ('import models.engine', 4000, ('timm', 'wandb', 'onnxruntime')),
+    # Streamlit runs app.py as a script; bare mode renders to nowhere, without a model
+    'app': (
+        "import runpy; runpy.run_path('app.py')",
+        6000,
+        ('timm', 'wandb', 'matplotlib', 'seaborn', 'pandas', 'faiss'),
+    ),
+}
+
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:') :].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(statement):
+    """Run statement in a fresh interpreter and return its import-time profile."""
+    env = dict(
+        os.environ, PYTHONPATH=os.pathsep.join([SRC, os.environ.get('PYTHONPATH', '')])
+    )
+    result = subprocess.run(  # noqa: S603 - runs this interpreter on our own code
+        [sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', statement],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"`{statement}` failed:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    # Top-level entries have the smallest indentation; their cumulative times add up
+    # to the total
+    top_depth = min(depth for _, _, _, depth in rows)
+    total_us = sum(cumulative for _, _, cumulative, depth in rows if depth == top_depth)
+
+    # What the entry point imports directly: the children of the imported module
+    # (printed just before it), or the top-level modules themselves when running a
+    # script
+    target = (
+        statement.split()[1]
+        if statement.startswith('import ') and ';' not in statement
+        else None
+    )
+    direct, start = [], 0
+    for i, (name, _, cumulative, depth) in enumerate(rows):
+        if depth != top_depth:
+            continue
+        if name == target:
+            direct.extend(
+                (child, us) for child, _, us, d in rows[start:i] if d == top_depth + 1
+            )
+        else:
+            direct.append((name, cumulative))
+        start = i + 1
+    return {
+        'total_ms': total_us / 1000,
+        'modules': {name for name, _, _, _ in rows},
+        'heaviest': sorted(direct, key=lambda item: -item[1]),
+    }
+
+
+def main():
+    """Report the import cost of each entry point."""
+    parser = argparse.ArgumentParser(
+        description='Measure and enforce entry-point import time'
+    )
+    parser.add_argument(
+        '--targets',
+        type=str,
+        default=','.join(TARGETS),
+        help=f'Comma-separated subset of {tuple(TARGETS)}',
+    )
+    parser.add_argument(
+        '--budget',
+        action='append',
+        default=[],
+        help='Override a budget, e.g. serve=2500 (ms)',
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=5,
+        help='Heaviest top-level imports to list per target',
+    )
+    parser.add_argument(
+        '--output', type=str, default=None, help='Write the results as JSON'
+    )
+    args = parser.parse_args()
+
+    budgets = {name: budget for name, (_, budget, _) in TARGETS.items()}
+    for override in args.budget:
+        name, value = override.split('=')
+        budgets[name] = float(value)
+
+    results, failures = {}, []
+    for name in args.targets.split(','):
+        statement, _, forbidden = TARGETS[name]
+        measured = measure(statement)
+        loaded = sorted(module for module in forbidden if module in measured['modules'])
+        ok = measured['total_ms'] <= budgets[name] and not loaded
+        results[name] = {
+            'total_ms': measured['total_ms'],
+            'budget_ms': budgets[name],
+            'forbidden_loaded': loaded,
+            'ok': ok,
+            'heaviest': [
+                {'module': module, 'ms': us / 1000}
+                for module, us in measured['heaviest'][: args.top]
+            ],
+        }
+        print(
+            f"{name:<10} {measured['total_ms']:>8.0f} ms / {budgets[name]:>6.0f} ms  "
+            f"{'ok' if ok else 'FAIL'}"
+        )
+        for module, us in measured['heaviest'][: args.top]:
+            print(f"    {module:<40} {us / 1000:>8.0f} ms")
+        if loaded:
+            print(f"    imported at startup but should be lazy: {', '.join(loaded)}")
+        if not ok:
+            failures.append(name)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if failures:
+        print(f"Startup budget exceeded for: {', '.join(failures)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""Synthetic inputs so the benchmarks run without any dataset."""
+
+import csv
+import os
+
+import numpy as np
+from PIL import Image
+
+
+def make_images(
+    output_dir, num_images=256, size=(640, 480), num_categories=3, num_colors=5, seed=0
+):
+    """
+    Write a synthetic image dataset and return its annotations CSV path.
+
+    The num_images JPEGs are smooth random colour fields plus noise, so they
+    compress like photos rather than flat colour; the CSV uses the
+    MultiTaskWardrobeDataset layout.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    for i in range(num_images):
+        coarse = rng.integers(
+            0, 256, (height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8
+        )
+        image = Image.fromarray(coarse).resize(size, Image.BILINEAR)
+        noise = rng.integers(-12, 13, (height, width, 3))
+        pixels = np.clip(np.asarray(image, dtype=np.int16) + noise, 0, 255).astype(
+            np.uint8
+        )
+        name = f'img_{i:05d}.jpg'
+        Image.fromarray(pixels).save(os.path.join(output_dir, name), quality=90)
+        rows.append((name, i % num_categories, i % num_colors))
+
+    csv_path = os.path.join(output_dir, 'annotations.csv')
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['image_path', 'category_id', 'color_id'])
+        writer.writerows(rows)
+    return csv_path
+
+
+def synthetic_embeddings(num_items, dim, num_clusters=256, noise=0.8, seed=0):
+    """
+    Return clustered random unit vectors shaped like garment embeddings.
+
+    The vectors are scattered around random cluster centers, so neighbourhoods
+    have structure the way garment embeddings do.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, num_clusters, num_items)]
+    vectors += noise * rng.standard_normal((num_items, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
@@ -0,0 +1,137 @@
+"""
+Benchmark two-stage compressed retrieval against an exact flat index.
+
+Prints latency / recall / memory curves of compressed-code candidate search
+plus exact re-ranking, on synthetic clustered unit vectors shaped like
+WardrobeNet embeddings.
+
+    python benchmarks/two_stage_retrieval.py --sizes 10000,100000 \
+        --output two_stage.json
+"""
+
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from synthetic import synthetic_embeddings  # noqa: E402
+
+from retrieval.index import EmbeddingIndex  # noqa: E402
+from retrieval.quantized import CODE_TYPES, TwoStageIndex  # noqa: E402
+
+
+def per_query_ms(search, queries):
+    """Mean single-query latency, the way the API issues searches."""
+    start = time.perf_counter()
+    for query in queries:
+        search(query[None])
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def run(size, args):
+    """Benchmark every code type on a catalog of size vectors."""
+    vectors = synthetic_embeddings(size, args.dim, seed=args.seed)
+    ids = np.arange(size).astype(str)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.choice(size, args.num_queries, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    flat = EmbeddingIndex.build(vectors, ids, index_type='flat')
+    results = [
+        {
+            'size': size,
+            'method': 'flat',
+            'rerank': None,
+            'recall': 1.0,
+            'latency_ms': per_query_ms(lambda q: flat.search(q, args.k), queries),
+            'memory_mb': vectors.nbytes / 2**20,
+        }
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for code_type in args.codes.split(','):
+            # Reload from disk so the float32 vectors are memory-mapped, as in serving
+            path = os.path.join(tmp, f'{code_type}.index')
+            TwoStageIndex.build(vectors, ids, code_type).save(path)
+            index = TwoStageIndex.load(path)
+            truth = index.exact_search(queries, args.k)
+
+            for depth in (int(d) for d in args.depths.split(',')):
+                results.append(
+                    {
+                        'size': size,
+                        'method': code_type,
+                        'rerank': depth,
+                        'recall': index.recall(
+                            queries, args.k, rerank=depth, truth=truth
+                        ),
+                        'latency_ms': per_query_ms(
+                            functools.partial(index.search, k=args.k, rerank=depth),
+                            queries,
+                        ),
+                        'memory_mb': index.memory_bytes / 2**20,
+                    }
+                )
+            del index
+    return results
+
+
+def main():
+    """Run the benchmark for each catalog size and print the curves."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark two-stage (compressed + exact re-rank) retrieval'
+    )
+    parser.add_argument(
+        '--sizes',
+        type=str,
+        default='10000,100000',
+        help='Comma-separated catalog sizes',
+    )
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--codes', type=str, default=','.join(CODE_TYPES))
+    parser.add_argument(
+        '--depths',
+        type=str,
+        default='20,50,100,200,400,800',
+        help='Re-rank depths to sweep',
+    )
+    parser.add_argument('--num_queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output',
+        type=str,
+        default=None,
+        help='Optional path to write the results as JSON',
+    )
+    args = parser.parse_args()
+
+    results = []
+    print(
+        f"{'size':>9} {'method':>7} {'rerank':>6} {f'recall@{args.k}':>10} "
+        f"{'ms/query':>9} {'memory MB':>10}"
+    )
+    for size in (int(s) for s in args.sizes.split(',')):
+        for row in run(size, args):
+            results.append(row)
+            print(
+                f"{row['size']:>9} {row['method']:>7} {row['rerank'] or '-':>6} "
+                f"{row['recall']:>10.4f} "
+                f"{row['latency_ms']:>9.3f} {row['memory_mb']:>10.2f}"
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
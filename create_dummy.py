@@ -1,22 +1,28 @@
-import torch
 import os
 import sys
 
+import torch
+
 # Ensure imports work
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 
-from models.baseline import ClothingClassifier
-from config import NUM_CLASSES, DUMMY_MODEL_PATH
+from config import DUMMY_MODEL_PATH, NUM_CLASSES, NUM_COLORS
+from models.baseline import WardrobeNet
+
 
 def create_dummy_model():
+    """Save a randomly initialized WardrobeNet checkpoint for local testing."""
     print("Creating dummy model...")
     os.makedirs('models', exist_ok=True)
-    
-    model = ClothingClassifier(num_classes=NUM_CLASSES, pretrained=False)
-    
+
+    model = WardrobeNet(
+        num_categories=NUM_CLASSES, num_colors=NUM_COLORS, pretrained=False
+    )
+
     # Save the initialized weights as a dummy trained model
     torch.save(model.state_dict(), DUMMY_MODEL_PATH)
     print(f"Saved dummy model to {DUMMY_MODEL_PATH}")
 
+
 if __name__ == '__main__':
     create_dummy_model()
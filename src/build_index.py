@@ -0,0 +1,209 @@
+import argparse
+import logging
+import time
+
+import pandas as pd
+from torch.utils.data import DataLoader
+
+from data.dataset import ImageListDataset, get_transforms, list_images
+from models.checkpoint import get_device, load_wardrobenet
+from retrieval.index import (
+    INDEX_TYPES,
+    EmbeddingIndex,
+    default_clip_index_path,
+    default_index_path,
+    embed_catalog,
+)
+from retrieval.quantized import CODE_TYPES, TwoStageIndex
+from retrieval.sharded import build_shards, default_shard_dir
+
+
+def main(args):
+    """Embed the catalog and save the retrieval index."""
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    device = get_device()
+
+    # Catalog: either the image_path column of an annotations CSV or every image
+    # under data_dir
+    if args.csv:
+        image_paths = pd.read_csv(args.csv).iloc[:, 0].tolist()
+    else:
+        image_paths = list_images(args.data_dir)
+    logging.info(f"Embedding {len(image_paths)} catalog images on {device}...")
+
+    dataset = ImageListDataset(
+        image_paths, root_dir=args.data_dir, transform=get_transforms(train=False)
+    )
+    loader = DataLoader(
+        dataset,
+        batch_size=args.batch_size,
+        shuffle=False,
+        num_workers=args.num_workers,
+        pin_memory=device.type == 'cuda',
+    )
+
+    model = load_wardrobenet(args.model_path, device)
+
+    start = time.perf_counter()
+    embeddings, labels = embed_catalog(model, loader, device, with_labels=True)
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Embedded {len(dataset)} images in {elapsed:.1f}s "
+        f"({len(dataset) / elapsed:.1f} img/s)"
+    )
+
+    if args.num_shards:
+        output = args.shard_dir or default_shard_dir(args.model_path)
+        manifest = build_shards(
+            embeddings,
+            image_paths,
+            output,
+            args.num_shards,
+            index_type=args.index_type,
+            labels=labels,
+        )
+        sizes = ', '.join(str(shard['num_items']) for shard in manifest['shards'])
+        logging.info(
+            f"Saved {len(image_paths)} items in {args.num_shards} shards ({sizes}) "
+            f"to {output}"
+        )
+    elif args.codes:
+        index = TwoStageIndex.build(
+            embeddings,
+            image_paths,
+            code_type=args.codes,
+            rerank=args.rerank,
+            labels=labels,
+        )
+        if args.recall_tolerance is not None:
+            depth, recall = index.tune_rerank(k=10, tolerance=args.recall_tolerance)
+            logging.info(
+                f"Re-rank depth {depth} gives recall@10 {recall:.4f} vs exact search"
+            )
+        logging.info(
+            f"Compressed codes use {index.memory_bytes / 2**20:.1f} MiB "
+            f"(float32 vectors: {embeddings.nbytes / 2**20:.1f} MiB, memory-mapped)"
+        )
+    else:
+        index = EmbeddingIndex.build(
+            embeddings, image_paths, index_type=args.index_type, labels=labels
+        )
+    if not args.num_shards:
+        output = args.output or default_index_path(args.model_path)
+        index.save(output)
+        logging.info(
+            f"Saved {index.index_type} index with {len(index)} items to {output}"
+        )
+
+    if args.clip_dir:
+        build_clip_index(args, image_paths, device)
+
+
+def build_clip_index(args, image_paths, device):
+    """Embed the same catalog with the CLIP image tower, for text queries."""
+    from models.clip_encoder import ClipEncoder
+
+    encoder = ClipEncoder(args.clip_dir, device)
+
+    dataset = ImageListDataset(
+        image_paths, root_dir=args.data_dir, transform=encoder.transform
+    )
+    loader = DataLoader(
+        dataset,
+        batch_size=args.batch_size,
+        shuffle=False,
+        num_workers=args.num_workers,
+        pin_memory=device.type == 'cuda',
+    )
+    start = time.perf_counter()
+    embeddings = encoder.embed_catalog(loader)
+    logging.info(
+        f"CLIP-embedded {len(dataset)} images in {time.perf_counter() - start:.1f}s"
+    )
+
+    index = EmbeddingIndex.build(embeddings, image_paths, index_type=args.index_type)
+    output = args.clip_output or default_clip_index_path(args.model_path)
+    index.save(output)
+    logging.info(
+        f"Saved CLIP {index.index_type} index with {len(index)} items to {output}"
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build a FAISS similarity index over a wardrobe catalog'
+    )
+    parser.add_argument(
+        '--model_path',
+        type=str,
+        required=True,
+        help='Path to trained WardrobeNet weights',
+    )
+    parser.add_argument(
+        '--data_dir', type=str, required=True, help='Path to images directory'
+    )
+    parser.add_argument(
+        '--csv',
+        type=str,
+        default=None,
+        help='Optional CSV whose first column lists image paths',
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        default=None,
+        help='Index path (default: next to the model weights)',
+    )
+    parser.add_argument('--index_type', type=str, default='auto', choices=INDEX_TYPES)
+    parser.add_argument(
+        '--codes',
+        type=str,
+        default=None,
+        choices=CODE_TYPES,
+        help='Build a two-stage index: search compressed codes, then re-rank exactly',
+    )
+    parser.add_argument(
+        '--rerank',
+        type=int,
+        default=200,
+        help='Candidates re-ranked exactly (with --codes)',
+    )
+    parser.add_argument(
+        '--recall_tolerance',
+        type=float,
+        default=None,
+        help='With --codes, tune --rerank to the smallest depth keeping recall@10 '
+        'within this of exact',
+    )
+    parser.add_argument(
+        '--num_shards',
+        type=int,
+        default=None,
+        help='Partition the index into this many shards for serve.py --shard_dir',
+    )
+    parser.add_argument(
+        '--shard_dir',
+        type=str,
+        default=None,
+        help='Shard directory (default: <model>.shards/)',
+    )
+    parser.add_argument(
+        '--clip_dir',
+        type=str,
+        default=None,
+        help='Local CLIP checkpoint directory; also builds a CLIP index for text '
+        'search',
+    )
+    parser.add_argument(
+        '--clip_output',
+        type=str,
+        default=None,
+        help='CLIP index path (default: <model>.clip.index)',
+    )
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--num_workers', type=int, default=4)
+
+    args = parser.parse_args()
+    main(args)
@@ -10,8 +10,22 @@ CLASS_NAMES = {
     2: "👟 Shoes"
 }
 
+# Define the number of color/pattern classes and their display names
+NUM_COLORS = 5
+
+COLOR_NAMES = {
+    0: "Black",
+    1: "White",
+    2: "Red",
+    3: "Blue",
+    4: "Green"
+}
+
 # Path to the directory where models will be saved
 MODELS_DIR = "models"
 
 # Default path for the dummy model
 DUMMY_MODEL_PATH = "models/dummy_model.pth"
+
+# On-disk cache of app predictions, keyed by image content hash + model version
+PREDICTION_CACHE_PATH = "models/prediction_cache.sqlite"
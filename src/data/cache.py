@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(transform, files, extra=''):
+    """
+    Return the invalidation key for cached deterministic outputs.
+
+    The key changes whenever the transform config (its repr lists every
+    parameter), any source file's path/size/mtime, or the extra tag (e.g. a
+    backbone fingerprint) changes.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr(transform).encode('utf-8'))
+    digest.update(str(extra).encode('utf-8'))
+    for path in files:
+        stat = os.stat(path)
+        digest.update(f'{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()[:32]
+
+
+def module_fingerprint(module):
+    """Hash of a module's weights, for keying caches of its (frozen) outputs."""
+    digest = hashlib.sha256()
+    for name, tensor in module.state_dict().items():
+        digest.update(name.encode('utf-8'))
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+class TensorCache:
+    """
+    Serve cached deterministic loader outputs from a memory map.
+
+    Batches come out as (inputs, category_labels, color_labels). The cache is
+    built once from a DataLoader (optionally through an encoder such as a frozen
+    backbone) and reused for as long as its key matches.
+
+    With num_views > 1 the loader was run that many times, so a random
+    transform gave each sample a fixed set of augmented views, stored as
+    consecutive blocks of one pass each. Epoch e (see set_epoch) serves
+    block e % num_views. With shuffle the rows of that block come in a
+    seeded random order per epoch.
+    """
+
+    def __init__(
+        self, inputs, categories, colors, batch_size, num_views=1, shuffle=False, seed=0
+    ):
+        self.inputs = inputs
+        self.categories = categories
+        self.colors = colors
+        self.batch_size = batch_size
+        self.num_views = num_views
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
+
+    @property
+    def num_samples(self):
+        """Number of samples in one view."""
+        return len(self.inputs) // self.num_views
+
+    def set_epoch(self, epoch):
+        """Select the view and shuffle order served by the next iteration."""
+        self.epoch = epoch
+
+    def __iter__(self):
+        offset = (self.epoch % self.num_views) * self.num_samples
+        if not self.shuffle:
+            for start in range(offset, offset + self.num_samples, self.batch_size):
+                end = min(start + self.batch_size, offset + self.num_samples)
+                yield (
+                    torch.from_numpy(
+                        np.array(self.inputs[start:end], dtype=np.float32)
+                    ),
+                    torch.from_numpy(self.categories[start:end]),
+                    torch.from_numpy(self.colors[start:end]),
+                )
+            return
+
+        order = offset + np.random.default_rng((self.seed, self.epoch)).permutation(
+            self.num_samples
+        )
+        for start in range(0, len(order), self.batch_size):
+            # Sorted gathers read the memmap front to back; order within a batch
+            # doesn't matter
+            rows = np.sort(order[start : start + self.batch_size])
+            yield (
+                torch.from_numpy(np.asarray(self.inputs[rows], dtype=np.float32)),
+                torch.from_numpy(self.categories[rows]),
+                torch.from_numpy(self.colors[rows]),
+            )
+
+    @classmethod
+    def load_or_build(
+        cls,
+        cache_dir,
+        key,
+        loader,
+        encode=None,
+        device='cpu',
+        dtype=np.float16,
+        num_views=1,
+        batch_size=None,
+        shuffle=False,
+    ):
+        """
+        Load the cache for key, or fill it from loader.
+
+        Filling runs loader (and encode, if given) num_views times. Raw image
+        tensors are stored as dtype (float16 halves the footprint); encoded features
+        stay float32. batch_size defaults to the loader's.
+        """
+        inputs_path = os.path.join(cache_dir, f'{key}.inputs.npy')
+        labels_path = os.path.join(cache_dir, f'{key}.labels.npz')
+        batch_size = batch_size or loader.batch_size
+
+        if os.path.exists(inputs_path) and os.path.exists(labels_path):
+            labels = np.load(labels_path)
+            logger.info(
+                f"Using cached {'features' if encode else 'tensors'} from {inputs_path}"
+            )
+            return cls(
+                np.load(inputs_path, mmap_mode='r'),
+                labels['category'],
+                labels['color'],
+                batch_size,
+                num_views=num_views,
+                shuffle=shuffle,
+            )
+
+        os.makedirs(cache_dir, exist_ok=True)
+        num_samples = len(loader.dataset) * num_views
+        tmp_path = inputs_path + '.tmp.npy'
+        inputs, categories, colors, row = None, [], [], 0
+
+        with torch.no_grad():
+            for view in range(num_views):
+                if hasattr(loader.dataset, 'set_epoch'):
+                    loader.dataset.set_epoch(view)
+                for images, cat_labels, color_labels in loader:
+                    if encode is not None:
+                        batch = encode(images.to(device)).float().cpu().numpy()
+                    else:
+                        batch = images.numpy().astype(dtype)
+                    if inputs is None:
+                        inputs = np.lib.format.open_memmap(
+                            tmp_path,
+                            mode='w+',
+                            dtype=batch.dtype,
+                            shape=(num_samples,) + batch.shape[1:],
+                        )
+                    inputs[row : row + len(batch)] = batch
+                    row += len(batch)
+                    categories.append(cat_labels.numpy())
+                    colors.append(color_labels.numpy())
+
+        inputs.flush()
+        if row < num_samples:
+            # The loader yielded fewer rows than len(loader.dataset) promised: keep
+            # only the rows written, so inputs and labels stay aligned
+            data = np.array(inputs[:row])
+            del inputs
+            np.save(tmp_path, data)
+        else:
+            del inputs
+        os.replace(tmp_path, inputs_path)
+        # Labels are written last: their presence marks a complete cache
+        np.savez(
+            labels_path,
+            category=np.concatenate(categories),
+            color=np.concatenate(colors),
+        )
+        logger.info(
+            f"Cached {row} {'features' if encode else 'tensors'} to {inputs_path}"
+        )
+        return cls.load_or_build(
+            cache_dir,
+            key,
+            loader,
+            encode,
+            device,
+            dtype,
+            num_views,
+            batch_size,
+            shuffle,
+        )
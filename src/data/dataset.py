@@ -1,55 +1,130 @@
 import os
-import pandas as pd
+
 from PIL import Image
 from torch.utils.data import Dataset
 from torchvision import transforms
 
+# ImageNet statistics the pretrained backbone expects
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
 class MultiTaskWardrobeDataset(Dataset):
     """
     Professional Multi-Task Dataset.
+
     Loads images and multi-label metadata from a CSV file.
-    Expects metadata format: image_path, category_id, color_id
+    Expects metadata format: image_path, category_id, color_id.
     """
+
     def __init__(self, csv_file, root_dir, transform=None):
+        import pandas as pd  # deferred: inference-only entry points never read CSVs
+
         self.annotations = pd.read_csv(csv_file)
         self.root_dir = root_dir
         self.transform = transform
-        
+
     def __len__(self):
         return len(self.annotations)
 
+    def source_files(self):
+        """Return the image paths, for cache keys."""
+        return [
+            os.path.join(self.root_dir, path) for path in self.annotations.iloc[:, 0]
+        ]
+
     def __getitem__(self, idx):
         img_name = os.path.join(self.root_dir, self.annotations.iloc[idx, 0])
         image = Image.open(img_name).convert('RGB')
-        
+
         category_label = int(self.annotations.iloc[idx, 1])
         color_label = int(self.annotations.iloc[idx, 2])
-        
+
         if self.transform:
             image = self.transform(image)
-            
+
         return image, category_label, color_label
 
+
+class ImageListDataset(Dataset):
+    """
+    Serve the images of a list of paths without labels.
+
+    Meant for e.g. a wardrobe catalog. Samples are (image, index), so callers
+    can map outputs back to their item IDs.
+    """
+
+    def __init__(self, image_paths, root_dir='', transform=None):
+        self.image_paths = list(image_paths)
+        self.root_dir = root_dir
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def source_files(self):
+        """Return the image paths, for cache keys."""
+        return [os.path.join(self.root_dir, path) for path in self.image_paths]
+
+    def __getitem__(self, idx):
+        image = Image.open(os.path.join(self.root_dir, self.image_paths[idx])).convert(
+            'RGB'
+        )
+
+        if self.transform:
+            image = self.transform(image)
+
+        return image, idx
+
+
+def iter_images(root_dir, extensions=('.jpg', '.jpeg', '.png')):
+    """
+    Lazily yield image paths under root_dir, relative to it.
+
+    The order is stable (directories and files are visited sorted), and the full
+    listing is never built.
+    """
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(extensions):
+                yield os.path.relpath(os.path.join(dirpath, name), root_dir)
+
+
+def list_images(root_dir, extensions=('.jpg', '.jpeg', '.png')):
+    """Recursively list image files under root_dir, relative to it and sorted."""
+    return sorted(iter_images(root_dir, extensions))
+
+
 def get_transforms(train=True):
     """
-    Advanced Data Augmentation Pipeline to handle noisy real-world data (wrinkles, lighting)
+    Return the preprocessing pipeline; augmented when train is True.
+
+    The training pipeline is designed to handle noisy real-world data (wrinkles,
+    lighting).
     """
-    normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                                     std=[0.229, 0.224, 0.225])
-    
+    normalize = transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+
     if train:
-        return transforms.Compose([
-            transforms.RandomResizedCrop(224, scale=(0.8, 1.0)),
-            transforms.RandomHorizontalFlip(),
-            transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1),
-            transforms.RandomAffine(degrees=15, translate=(0.1, 0.1), scale=(0.9, 1.1)),
-            transforms.ToTensor(),
-            normalize,
-        ])
-    else:
-        return transforms.Compose([
+        return transforms.Compose(
+            [
+                transforms.RandomResizedCrop(224, scale=(0.8, 1.0)),
+                transforms.RandomHorizontalFlip(),
+                transforms.ColorJitter(
+                    brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1
+                ),
+                transforms.RandomAffine(
+                    degrees=15, translate=(0.1, 0.1), scale=(0.9, 1.1)
+                ),
+                transforms.ToTensor(),
+                normalize,
+            ]
+        )
+    return transforms.Compose(
+        [
             transforms.Resize(256),
             transforms.CenterCrop(224),
             transforms.ToTensor(),
             normalize,
-        ])
+        ]
+    )
@@ -0,0 +1,325 @@
+import math
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+
+from data.dataset import IMAGENET_MEAN, IMAGENET_STD
+
+# RGB <-> YIQ; rotating the IQ chroma plane shifts hue
+_RGB_TO_YIQ = torch.tensor(
+    [[0.299, 0.587, 0.114], [0.596, -0.274, -0.322], [0.211, -0.523, 0.312]]
+)
+_YIQ_TO_RGB = torch.linalg.inv(_RGB_TO_YIQ)
+_GRAY = torch.tensor([0.299, 0.587, 0.114]).view(1, 3, 1, 1)
+
+
+def decode_to_canvas(path, canvas_size=256):
+    """
+    Decode an image to a uint8 CHW tensor on a square canvas.
+
+    The image is scaled so its long side is canvas_size and placed in the
+    top-left corner of a zero canvas, so a batch can be stacked whatever the
+    aspect ratios. JPEGs are draft-decoded with DCT scaling at the smallest size
+    still covering the target, so large photos are never decoded at full
+    resolution. Returns (canvas, box) with box = (x0, y0, x1, y1) of the image.
+    """
+    with Image.open(path) as image:
+        scale = canvas_size / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image.draft('RGB', size)
+        image = image.convert('RGB')
+        if image.size != size:
+            image = image.resize(size, Image.BILINEAR)
+        pixels = torch.from_numpy(np.array(image)).permute(2, 0, 1)
+
+    canvas = torch.zeros(3, canvas_size, canvas_size, dtype=torch.uint8)
+    canvas[:, : size[1], : size[0]] = pixels
+    return canvas, torch.tensor([0.0, 0.0, size[0], size[1]])
+
+
+def _uniform(low, high, n, device):
+    return low + (high - low) * torch.rand(n, device=device)
+
+
+class BatchAugment(nn.Module):
+    """
+    get_transforms() for whole batches of uint8 canvases from decode_to_canvas.
+
+    In train mode: RandomResizedCrop, horizontal flip and RandomAffine (composed into
+    one affine_grid/grid_sample per batch), then ColorJitter and Normalize. In eval
+    mode: Resize(256) + CenterCrop(224) as a single resample. Parameters are drawn per
+    image, as with the PIL pipeline, but every operation runs on the full (N, 3, H, W)
+    tensor.
+
+    Differences from torchvision: the jitter operations run in a fixed order
+    (brightness, contrast, saturation, hue) and hue is a YIQ chroma rotation
+    rather than an HSV round trip.
+    """
+
+    def __init__(
+        self,
+        train=True,
+        output_size=224,
+        canvas_size=256,
+        scale=(0.8, 1.0),
+        ratio=(3 / 4, 4 / 3),
+        flip=0.5,
+        brightness=0.2,
+        contrast=0.2,
+        saturation=0.2,
+        hue=0.1,
+        degrees=15,
+        translate=(0.1, 0.1),
+        affine_scale=(0.9, 1.1),
+        eval_resize=256,
+    ):
+        super().__init__()
+        self.train_mode = train
+        self.output_size = output_size
+        self.canvas_size = canvas_size
+        self.scale = scale
+        self.ratio = ratio
+        self.flip = flip
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.hue = hue
+        self.degrees = degrees
+        self.translate = translate
+        self.affine_scale = affine_scale
+        self.eval_resize = eval_resize
+        self.register_buffer(
+            'mean', torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1), persistent=False
+        )
+        self.register_buffer(
+            'std', torch.tensor(IMAGENET_STD).view(1, 3, 1, 1), persistent=False
+        )
+
+    def extra_repr(self):
+        """List every parameter, so the repr can serve as a cache key."""
+        # Part of cache keys (see data.cache.cache_key), so list every parameter
+        names = (
+            'train_mode',
+            'output_size',
+            'canvas_size',
+            'scale',
+            'ratio',
+            'flip',
+            'brightness',
+            'contrast',
+            'saturation',
+            'hue',
+            'degrees',
+            'translate',
+            'affine_scale',
+            'eval_resize',
+        )
+        return ', '.join(f'{name}={getattr(self, name)}' for name in names)
+
+    def _crop_boxes(self, boxes, attempts=10):
+        """
+        Sample a RandomResizedCrop box for every image in the batch.
+
+        Each image gets the first of `attempts` candidates that fits, else the whole
+        image. Returns (center_x, center_y, width, height) in canvas pixels.
+        """
+        n, device = len(boxes), boxes.device
+        width, height = boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]
+        area = (width * height)[:, None] * _uniform(
+            *self.scale, n * attempts, device
+        ).view(n, attempts)
+        log_ratio = _uniform(
+            math.log(self.ratio[0]), math.log(self.ratio[1]), n * attempts, device
+        ).view(n, attempts)
+        crop_w, crop_h = (
+            torch.sqrt(area * log_ratio.exp()),
+            torch.sqrt(area / log_ratio.exp()),
+        )
+        fits = (crop_w <= width[:, None]) & (crop_h <= height[:, None])
+        first = fits.float().argmax(dim=1)
+        rows = torch.arange(n, device=device)
+        ok = fits[rows, first]
+        crop_w = torch.where(ok, crop_w[rows, first], width)
+        crop_h = torch.where(ok, crop_h[rows, first], height)
+        x0 = boxes[:, 0] + torch.rand(n, device=device) * (width - crop_w)
+        y0 = boxes[:, 1] + torch.rand(n, device=device) * (height - crop_h)
+        return x0 + crop_w / 2, y0 + crop_h / 2, crop_w, crop_h
+
+    def _affine(self, n, device):
+        """
+        Return the inverse affine maps for the batch.
+
+        RandomAffine (+ flip) as (n, 2, 3) maps from output to crop coordinates,
+        both normalized to [-1, 1].
+        """
+        angle = torch.deg2rad(_uniform(-self.degrees, self.degrees, n, device))
+        scale = _uniform(*self.affine_scale, n, device)
+        shift = torch.stack(
+            [_uniform(-t, t, n, device) * 2 for t in self.translate], dim=1
+        )
+        cos, sin = torch.cos(angle) / scale, torch.sin(angle) / scale
+        matrix = torch.stack(
+            [torch.stack([cos, sin], 1), torch.stack([-sin, cos], 1)], 1
+        )
+        flip = torch.where(torch.rand(n, device=device) < self.flip, -1.0, 1.0)
+        matrix[:, 0] *= flip[:, None]
+        offset = -(matrix @ shift[:, :, None])
+        return torch.cat([matrix, offset], dim=2)
+
+    def _jitter(self, x, mask):
+        n, device = len(x), x.device
+        gray = _GRAY.to(device)
+
+        x = (
+            x
+            * _uniform(1 - self.brightness, 1 + self.brightness, n, device).view(
+                n, 1, 1, 1
+            )
+        ).clamp_(0, 1)
+
+        factor = _uniform(1 - self.contrast, 1 + self.contrast, n, device).view(
+            n, 1, 1, 1
+        )
+        luma = (x * gray).sum(dim=1, keepdim=True)
+        mean = (luma * mask).sum(dim=(2, 3), keepdim=True) / mask.sum(
+            dim=(2, 3), keepdim=True
+        ).clamp_min(1)
+        x = (factor * x + (1 - factor) * mean).clamp_(0, 1)
+
+        factor = _uniform(1 - self.saturation, 1 + self.saturation, n, device).view(
+            n, 1, 1, 1
+        )
+        x = (factor * x + (1 - factor) * (x * gray).sum(dim=1, keepdim=True)).clamp_(
+            0, 1
+        )
+
+        theta = _uniform(-self.hue, self.hue, n, device) * 2 * math.pi
+        rotation = torch.zeros(n, 3, 3, device=device)
+        rotation[:, 0, 0] = 1
+        rotation[:, 1, 1], rotation[:, 1, 2] = torch.cos(theta), -torch.sin(theta)
+        rotation[:, 2, 1], rotation[:, 2, 2] = torch.sin(theta), torch.cos(theta)
+        transform = _YIQ_TO_RGB.to(device) @ rotation @ _RGB_TO_YIQ.to(device)
+        return torch.einsum('nij,njhw->nihw', transform, x).clamp_(0, 1)
+
+    @torch.no_grad()
+    def forward(self, canvases, boxes):
+        """
+        Augment a batch of decode_to_canvas outputs.
+
+        canvases is (N, 3, S, S) uint8 and boxes (N, 4) float. Returns
+        normalized (N, 3, output_size, output_size) float32.
+        """
+        x = canvases.float().div_(255)
+        n, size, device = len(x), x.shape[-1], x.device
+        out_shape = (n, 3, self.output_size, self.output_size)
+        mask = torch.ones(n, 1, *out_shape[2:], device=device)
+
+        if self.train_mode:
+            center_x, center_y, crop_w, crop_h = self._crop_boxes(boxes)
+            to_crop = self._affine(n, device)
+            # Output pixels the affine maps outside the crop are zero-filled, like
+            # RandomAffine
+            inside = (
+                nn.functional.affine_grid(to_crop, out_shape, align_corners=False)
+                .abs()
+                .amax(dim=-1)
+                <= 1
+            )
+            mask = inside[:, None].float()
+        else:
+            width, height = boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]
+            crop_w = crop_h = (
+                torch.minimum(width, height) * self.output_size / self.eval_resize
+            )
+            center_x, center_y = boxes[:, 0] + width / 2, boxes[:, 1] + height / 2
+            to_crop = torch.eye(2, 3, device=device).expand(n, 2, 3)
+
+        # Crop coordinates -> canvas coordinates, composed with the affine into one
+        # sampling grid
+        half = torch.stack([crop_w, crop_h], dim=1) / size
+        center = torch.stack([center_x, center_y], dim=1) * 2 / size - 1
+        theta = to_crop * half[:, :, None]
+        theta[:, :, 2] += center
+        grid = nn.functional.affine_grid(theta, out_shape, align_corners=False)
+        x = nn.functional.grid_sample(
+            x, grid, mode='bilinear', padding_mode='zeros', align_corners=False
+        )
+
+        if self.train_mode:
+            x = self._jitter(x, mask) * mask
+        return (x - self.mean) / self.std
+
+
+class FastWardrobeDataset(Dataset):
+    """
+    Serve uint8 canvases for the batched augmentation pipeline.
+
+    Samples come from decode_to_canvas; the BatchAugment (self.transform) runs
+    in collate(), once per batch, inside the DataLoader workers.
+    """
+
+    def __init__(self, csv_file, root_dir, augment=None):
+        import pandas as pd
+
+        self.annotations = pd.read_csv(csv_file)
+        self.root_dir = root_dir
+        self.transform = augment or BatchAugment(train=True)
+
+    def __len__(self):
+        return len(self.annotations)
+
+    def source_files(self):
+        """Return the image paths, for cache keys."""
+        return [
+            os.path.join(self.root_dir, path) for path in self.annotations.iloc[:, 0]
+        ]
+
+    def __getitem__(self, idx):
+        canvas, box = decode_to_canvas(
+            os.path.join(self.root_dir, self.annotations.iloc[idx, 0]),
+            self.transform.canvas_size,
+        )
+        return (
+            canvas,
+            box,
+            int(self.annotations.iloc[idx, 1]),
+            int(self.annotations.iloc[idx, 2]),
+        )
+
+    def collate(self, samples):
+        """Stack samples and augment them as one batch."""
+        canvases, boxes, categories, colors = zip(*samples)
+        images = self.transform(torch.stack(canvases), torch.stack(boxes))
+        return images, torch.tensor(categories), torch.tensor(colors)
+
+
+def fast_loader(
+    dataset,
+    batch_size,
+    shuffle=True,
+    sampler=None,
+    num_workers=4,
+    prefetch_factor=2,
+    pin_memory=False,
+):
+    """
+    Build a DataLoader that augments whole batches in its workers.
+
+    Batches are augmented (images, category_labels, color_labels) from a
+    FastWardrobeDataset; prefetch_factor batches per worker are kept in flight.
+    """
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle and sampler is None,
+        sampler=sampler,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor if num_workers > 0 else None,
+        persistent_workers=num_workers > 0,
+        pin_memory=pin_memory,
+        collate_fn=dataset.collate,
+    )
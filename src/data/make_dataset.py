@@ -1,73 +1,354 @@
-# -*- coding: utf-8 -*-
+import csv
+import hashlib
+import json
+import logging
 import os
 import shutil
-import random
-import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+
+import click
 from PIL import Image
 from tqdm import tqdm
-import click
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+MANIFEST_FILE = 'manifest.json'
+# Inspected images between manifest checkpoints, so a crash loses at most this much work
+MANIFEST_FLUSH_EVERY = 1000
+# dHash is 64 bits; split into 4 bands so any pair within 3 bits of each
+# other is guaranteed to share at least one band exactly (pigeonhole).
+HASH_BANDS = 4
+BAND_BITS = 64 // HASH_BANDS
+
+
+def dhash(image, size=8):
+    """
+    Return the 64-bit difference hash of an image.
+
+    The perceptual fingerprint survives re-encoding, resizing and small
+    brightness changes.
+    """
+    pixels = image.convert('L').resize((size + 1, size), Image.BILINEAR).tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def inspect_image(path):
+    """Verify an image and fingerprint it. Runs in a worker process."""
+    record = {'valid': False}
+    try:
+        with open(path, 'rb') as f:
+            record['sha256'] = hashlib.sha256(f.read()).hexdigest()
+        with Image.open(path) as img:
+            img.verify()
+        # verify() leaves the file unusable, so reopen for hashing
+        with Image.open(path) as img:
+            img.draft('RGB', (64, 64))
+            record['dhash'] = dhash(img)
+        record['valid'] = True
+    except Exception as e:
+        record['error'] = str(e)
+    return record
+
+
+def discover(input_path):
+    """
+    Find the images of a raw dataset directory.
+
+    Images are laid out as <category>/<image> or <category>/<color>/<image>.
+    Returns [(relative path, category name, color name or None)].
+    """
+    items = []
+    for category_dir in sorted(d for d in input_path.iterdir() if d.is_dir()):
+        for path in sorted(category_dir.rglob('*')):
+            if path.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            rel = path.relative_to(input_path)
+            color = rel.parts[1] if len(rel.parts) > 2 else None
+            items.append((rel.as_posix(), category_dir.name, color))
+    return items
+
+
+def save_manifest(manifest, manifest_path):
+    """Write the manifest atomically: a crash mid-write leaves the previous one."""
+    tmp_path = manifest_path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def fingerprint_all(input_path, items, manifest, num_workers, manifest_path=None):
+    """
+    Fill the manifest for every item, re-inspecting only changed files.
+
+    A file counts as changed when its size or mtime differs from the last run.
+    With manifest_path, progress is checkpointed every MANIFEST_FLUSH_EVERY
+    images.
+    """
+    stale = []
+    for rel, _, _ in items:
+        stat = (input_path / rel).stat()
+        entry = manifest.get(rel)
+        if (
+            entry is None
+            or entry['size'] != stat.st_size
+            or entry['mtime_ns'] != stat.st_mtime_ns
+        ):
+            stale.append((rel, stat.st_size, stat.st_mtime_ns))
+
+    logging.getLogger(__name__).info(
+        f"{len(items) - len(stale)} images unchanged, inspecting {len(stale)}"
+    )
+    if not stale:
+        return
+
+    paths = [str(input_path / rel) for rel, _, _ in stale]
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        records = pool.map(inspect_image, paths, chunksize=64)
+        progress = tqdm(zip(stale, records), total=len(stale), desc="Verifying images")
+        for done, ((rel, size, mtime_ns), record) in enumerate(progress, 1):
+            manifest[rel] = {'size': size, 'mtime_ns': mtime_ns, **record}
+            if manifest_path is not None and done % MANIFEST_FLUSH_EVERY == 0:
+                save_manifest(manifest, manifest_path)
+
+
+class DisjointSet:
+    """Union-find over item positions."""
+
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        """Return the root of the set containing i."""
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        """Merge the sets containing i and j."""
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def group_duplicates(records, max_distance):
+    """
+    Group exact and near-duplicate images.
+
+    Exact duplicates share a SHA-256; near duplicates are within max_distance
+    dHash Hamming distance. Returns the group root of each item.
+    """
+    groups = DisjointSet(len(records))
+
+    by_content = {}
+    for i, record in enumerate(records):
+        groups.union(i, by_content.setdefault(record['sha256'], i))
+
+    if max_distance > 0:
+        mask = (1 << BAND_BITS) - 1
+        buckets = {}
+        for i, record in enumerate(records):
+            for band in range(HASH_BANDS):
+                buckets.setdefault(
+                    (band, (record['dhash'] >> (band * BAND_BITS)) & mask), []
+                ).append(i)
+        for members in buckets.values():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    i, j = members[a], members[b]
+                    if (
+                        bin(records[i]['dhash'] ^ records[j]['dhash']).count('1')
+                        <= max_distance
+                    ):
+                        groups.union(i, j)
+
+    return [groups.find(i) for i in range(len(records))]
+
+
+def group_keys(records, roots):
+    """
+    Return a stable key for each item's duplicate group.
+
+    The key is the smallest member SHA-256. Unlike the union-find root it does
+    not depend on discovery order, so adding images never moves an existing
+    group to the other split unless its membership changes.
+    """
+    smallest = {}
+    for record, root in zip(records, roots):
+        smallest[root] = min(smallest.get(root, record['sha256']), record['sha256'])
+    return [smallest[root] for root in roots]
+
+
+def remove_stale(output_path, expected):
+    """
+    Delete split images that are not in expected.
+
+    Stale images come from e.g. a group that moved split, or a source image
+    that was removed.
+    """
+    removed = 0
+    for split in ('train', 'val'):
+        for path in (output_path / split).rglob('*'):
+            if path.suffix.lower() in IMAGE_EXTENSIONS and path not in expected:
+                path.unlink()
+                removed += 1
+    return removed
+
+
+def is_val(group_key, split_ratio):
+    """Return whether a duplicate group belongs to the validation split."""
+    # Hash-based assignment: stable across runs, so re-running never reshuffles
+    # existing images and every member of a duplicate group lands on the same side.
+    return (
+        int(hashlib.sha256(group_key.encode('utf-8')).hexdigest()[:8], 16) / 0xFFFFFFFF
+        < split_ratio
+    )
+
+
+def copy_if_changed(src, dst):
+    """
+    Copy src to dst unless dst is already an up-to-date copy.
+
+    copy2 preserves the modification time, so a copy is current when both its
+    size and its mtime match the source. An image edited in place keeps its
+    size but gets a new mtime.
+    """
+    if dst.exists():
+        src_stat, dst_stat = src.stat(), dst.stat()
+        if (
+            dst_stat.st_size == src_stat.st_size
+            and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+        ):
+            return False
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copy2(src, dst)
+    return True
+
 
 @click.command()
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
 @click.option('--split_ratio', default=0.2, help='Ratio of validation set')
-def main(input_filepath, output_filepath, split_ratio):
-    """ Runs data processing scripts to turn raw data from (../raw) into
-        cleaned data ready to be analyzed (saved in ../processed).
-    """
+@click.option(
+    '--num_workers',
+    default=None,
+    type=int,
+    help='Processes used to verify and hash images',
+)
+@click.option(
+    '--near_dup_distance',
+    default=3,
+    help='Max dHash Hamming distance treated as a near duplicate (0 disables)',
+)
+@click.option(
+    '--clean',
+    is_flag=True,
+    help='Delete the output directory (and manifest) before processing',
+)
+def main(
+    input_filepath, output_filepath, split_ratio, num_workers, near_dup_distance, clean
+):
+    """Turn raw data from (../raw) into cleaned data (saved in ../processed)."""
     logger = logging.getLogger(__name__)
     logger.info('making final data set from raw data')
 
     input_path = Path(input_filepath)
     output_path = Path(output_filepath)
-    
-    # Create train/val directories
-    train_dir = output_path / 'train'
-    val_dir = output_path / 'val'
-    
-    if output_path.exists():
+
+    if clean and output_path.exists():
         shutil.rmtree(output_path)
-    
-    train_dir.mkdir(parents=True, exist_ok=True)
-    val_dir.mkdir(parents=True, exist_ok=True)
-
-    # Iterate through classes (subdirectories)
-    classes = [d for d in input_path.iterdir() if d.is_dir()]
-    
-    for class_dir in tqdm(classes, desc="Processing classes"):
-        class_name = class_dir.name
-        
-        # Create class subdirectories
-        (train_dir / class_name).mkdir(exist_ok=True)
-        (val_dir / class_name).mkdir(exist_ok=True)
-        
-        images = [f for f in class_dir.glob('*') if f.suffix.lower() in ['.jpg', '.jpeg', '.png']]
-        random.shuffle(images)
-        
-        split_idx = int(len(images) * split_ratio)
-        val_images = images[:split_idx]
-        train_images = images[split_idx:]
-        
-        # Copy files
-        for img in train_images:
-            try:
-                # Verify image is valid
-                with Image.open(img) as i:
-                    i.verify() 
-                shutil.copy(img, train_dir / class_name / img.name)
-            except Exception as e:
-                logger.warning(f"Skipping corrupt image {img}: {e}")
-
-        for img in val_images:
-            try:
-                with Image.open(img) as i:
-                    i.verify()
-                shutil.copy(img, val_dir / class_name / img.name)
-            except Exception as e:
-                logger.warning(f"Skipping corrupt image {img}: {e}")
-
-    logger.info(f"Processed data saved to {output_filepath}")
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    # Resume from the previous run's fingerprints
+    manifest_path = output_path / MANIFEST_FILE
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    items = discover(input_path)
+    fingerprint_all(input_path, items, manifest, num_workers, manifest_path)
+    save_manifest(manifest, manifest_path)
+
+    for rel, _, _ in items:
+        if not manifest[rel]['valid']:
+            logger.warning(
+                f"Skipping corrupt image {rel}: {manifest[rel].get('error')}"
+            )
+    items = [item for item in items if manifest[item[0]]['valid']]
+
+    # Duplicate groups share a split; exact copies beyond the first are dropped
+    records = [manifest[rel] for rel, _, _ in items]
+    roots = group_duplicates(records, near_dup_distance)
+    seen_content = set()
+    kept = []
+    for item, record, group_key in zip(items, records, group_keys(records, roots)):
+        if record['sha256'] in seen_content:
+            continue
+        seen_content.add(record['sha256'])
+        kept.append((item, group_key))
+    num_groups = len(set(roots))
+    logger.info(
+        f"{len(items) - len(kept)} exact duplicates dropped, "
+        f"{len(kept) - num_groups} near duplicates grouped with their originals"
+    )
+
+    categories = sorted({category for _, category, _ in items})
+    colors = sorted({color for _, _, color in items if color is not None})
+    category_ids = {name: i for i, name in enumerate(categories)}
+    color_ids = {name: i for i, name in enumerate(colors)}
+
+    rows = {'train': [], 'val': []}
+    copies = []
+    for (rel, category, color), group_key in kept:
+        split = 'val' if is_val(group_key, split_ratio) else 'train'
+        dst_rel = f'{split}/{rel}'
+        copies.append((input_path / rel, output_path / dst_rel))
+        rows[split].append((dst_rel, category_ids[category], color_ids.get(color, 0)))
+
+    # Copying is I/O bound: threads are enough
+    with ThreadPoolExecutor(max_workers=num_workers or 8) as pool:
+        copied = sum(
+            tqdm(
+                pool.map(lambda paths: copy_if_changed(*paths), copies),
+                total=len(copies),
+                desc="Copying",
+            )
+        )
+    logger.info(
+        f"Copied {copied} new or changed images, "
+        f"{len(copies) - copied} already up to date"
+    )
+    removed = remove_stale(output_path, {dst for _, dst in copies})
+    if removed:
+        logger.info(f"Removed {removed} stale images from earlier runs")
+
+    for split, split_rows in rows.items():
+        with open(output_path / f'{split}.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['image_path', 'category_id', 'color_id'])
+            writer.writerows(split_rows)
+    with open(output_path / 'labels.json', 'w') as f:
+        json.dump(
+            {
+                'categories': dict(enumerate(categories)),
+                'colors': dict(enumerate(colors)),
+            },
+            f,
+            indent=2,
+        )
+
+    logger.info(
+        f"Processed data saved to {output_filepath} "
+        f"({len(rows['train'])} train / {len(rows['val'])} val images)"
+    )
+
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -0,0 +1,47 @@
+import logging
+import os
+import sys
+
+import click
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.shards import write_shards  # noqa: E402
+
+
+@click.command()
+@click.argument('csv_file', type=click.Path(exists=True))
+@click.argument('image_dir', type=click.Path(exists=True))
+@click.argument('output_dir', type=click.Path())
+@click.option(
+    '--image_size',
+    default=256,
+    help='Side length images are resized and center-cropped to',
+)
+@click.option('--shard_size', default=1024, help='Images per shard file')
+@click.option(
+    '--num_workers',
+    default=None,
+    type=int,
+    help='Decode processes (default: all cores)',
+)
+def main(csv_file, image_dir, output_dir, image_size, shard_size, num_workers):
+    """
+    Pack the images of an annotations CSV into uint8 shards.
+
+    Images are decoded once, for ShardedWardrobeDataset.
+    """
+    write_shards(
+        csv_file,
+        image_dir,
+        output_dir,
+        image_size=image_size,
+        shard_size=shard_size,
+        num_workers=num_workers,
+    )
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import torch.distributed as dist
+from PIL import Image
+from torch.utils.data import IterableDataset, get_worker_info
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+LABELS_FILE = 'labels.npz'
+
+
+def shard_path(shard_dir, shard_id):
+    """Return the path of one shard file."""
+    return os.path.join(shard_dir, f'shard_{shard_id:05d}.npy')
+
+
+def load_and_resize(path, image_size):
+    """
+    Decode, resize and center-crop an image to a uint8 array.
+
+    The shorter side is resized to image_size before the crop, giving an
+    (image_size, image_size, 3) array. Returns None for unreadable files.
+    """
+    try:
+        with Image.open(path) as image:
+            # Let the JPEG decoder downscale by a power of two while decoding
+            image.draft('RGB', (image_size, image_size))
+            image = image.convert('RGB')
+            scale = image_size / min(image.size)
+            width, height = (
+                max(image_size, round(image.width * scale)),
+                max(image_size, round(image.height * scale)),
+            )
+            image = image.resize((width, height), Image.BILINEAR)
+            left, top = (width - image_size) // 2, (height - image_size) // 2
+            image = image.crop((left, top, left + image_size, top + image_size))
+            return np.asarray(image, dtype=np.uint8)
+    except Exception as e:
+        logger.warning(f"Skipping unreadable image {path}: {e}")
+        return None
+
+
+def _load_task(task):
+    return load_and_resize(*task)
+
+
+def write_shards(
+    csv_file, root_dir, output_dir, image_size=256, shard_size=1024, num_workers=None
+):
+    """
+    Pack the images of an annotations CSV into uint8 .npy shards.
+
+    Every image is decoded once; each shard holds shard_size images. Labels are
+    extracted up front into labels.npz (aligned with shard order).
+    """
+    import pandas as pd  # only needed when building shards, not when training from them
+
+    annotations = pd.read_csv(csv_file)
+    paths = annotations.iloc[:, 0].astype(str).tolist()
+    categories = annotations.iloc[:, 1].to_numpy(dtype=np.int64)
+    colors = annotations.iloc[:, 2].to_numpy(dtype=np.int64)
+
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(os.path.join(root_dir, path), image_size) for path in paths]
+    kept, shard_sizes = [], []
+    shard, row = None, 0
+
+    with Pool(num_workers) as pool:
+        for i, pixels in enumerate(pool.imap(_load_task, tasks, chunksize=16)):
+            if pixels is None:
+                continue
+            if shard is None:
+                rows = min(shard_size, len(paths) - i)
+                shard = np.lib.format.open_memmap(
+                    shard_path(output_dir, len(shard_sizes)),
+                    mode='w+',
+                    dtype=np.uint8,
+                    shape=(rows, image_size, image_size, 3),
+                )
+                row = 0
+            shard[row] = pixels
+            row += 1
+            kept.append(i)
+            if row == len(shard):
+                shard.flush()
+                shard_sizes.append(row)
+                shard = None
+
+    if shard is not None:
+        # Some images were skipped: shrink the last shard to the rows written
+        shard.flush()
+        data = np.array(shard[:row])
+        del shard
+        np.save(shard_path(output_dir, len(shard_sizes)), data)
+        shard_sizes.append(row)
+
+    kept = np.asarray(kept, dtype=np.int64)
+    np.savez(
+        os.path.join(output_dir, LABELS_FILE),
+        category=categories[kept],
+        color=colors[kept],
+        paths=np.asarray(paths)[kept],
+    )
+    with open(os.path.join(output_dir, INDEX_FILE), 'w') as f:
+        json.dump(
+            {
+                'image_size': image_size,
+                'num_samples': int(len(kept)),
+                'shard_sizes': shard_sizes,
+            },
+            f,
+            indent=2,
+        )
+
+    logger.info(
+        f"Wrote {len(kept)} images ({len(paths) - len(kept)} skipped) into "
+        f"{len(shard_sizes)} shards"
+    )
+    return len(kept)
+
+
+class ShardedWardrobeDataset(IterableDataset):
+    """
+    Stream (image, category_id, color_id) from shards written by write_shards.
+
+    Each shard is read in contiguous blocks of block_size images; shuffling permutes the
+    block order and the images within a block, so the disk only sees sequential reads.
+    Blocks are split across distributed ranks and then across DataLoader workers. Call
+    set_epoch() every epoch to reshuffle.
+    """
+
+    def __init__(self, shard_dir, transform=None, shuffle=True, block_size=256, seed=0):
+        self.shard_dir = shard_dir
+        self.transform = transform
+        self.shuffle = shuffle
+        self.block_size = block_size
+        self.seed = seed
+        self.epoch = 0
+        # Captured here, in the main process, since DataLoader workers may not share
+        # the process group
+        distributed = dist.is_available() and dist.is_initialized()
+        self.rank = dist.get_rank() if distributed else 0
+        self.world_size = dist.get_world_size() if distributed else 1
+
+        with open(os.path.join(shard_dir, INDEX_FILE)) as f:
+            self.meta = json.load(f)
+        labels = np.load(os.path.join(shard_dir, LABELS_FILE))
+        self.categories = labels['category']
+        self.colors = labels['color']
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(self.meta['shard_sizes'])]
+        ).astype(np.int64)
+
+    def __len__(self):
+        # What this rank yields this epoch: blocks are split across ranks, so the
+        # share (and, with shuffle, the block sizes it gets) differs per rank
+        return sum(end - start for _, start, end in self._rank_blocks())
+
+    def source_files(self):
+        """Return the shard and label files, for cache keys."""
+        return [
+            os.path.join(self.shard_dir, INDEX_FILE),
+            os.path.join(self.shard_dir, LABELS_FILE),
+        ] + [
+            shard_path(self.shard_dir, shard_id)
+            for shard_id in range(len(self.meta['shard_sizes']))
+        ]
+
+    def set_epoch(self, epoch):
+        """Set the epoch that seeds the shuffle order."""
+        self.epoch = epoch
+
+    def _rank_blocks(self):
+        blocks = [
+            (shard_id, start, min(start + self.block_size, size))
+            for shard_id, size in enumerate(self.meta['shard_sizes'])
+            for start in range(0, size, self.block_size)
+        ]
+        if self.shuffle:
+            order = np.random.default_rng((self.seed, self.epoch)).permutation(
+                len(blocks)
+            )
+            blocks = [blocks[i] for i in order]
+        return blocks[self.rank :: self.world_size]
+
+    def _blocks(self):
+        blocks = self._rank_blocks()
+        worker = get_worker_info()
+        if worker is not None:
+            blocks = blocks[worker.id :: worker.num_workers]
+        return blocks
+
+    def __iter__(self):
+        rng = np.random.default_rng(
+            (self.seed, self.epoch, getattr(get_worker_info(), 'id', 0))
+        )
+        shards = {}
+
+        for shard_id, start, end in self._blocks():
+            if shard_id not in shards:
+                shards[shard_id] = np.load(
+                    shard_path(self.shard_dir, shard_id), mmap_mode='r'
+                )
+            block = np.array(shards[shard_id][start:end])  # one sequential read
+            base = self.offsets[shard_id] + start
+
+            order = rng.permutation(len(block)) if self.shuffle else range(len(block))
+            for i in order:
+                image = Image.fromarray(block[i])
+                if self.transform:
+                    image = self.transform(image)
+                yield image, int(self.categories[base + i]), int(self.colors[base + i])
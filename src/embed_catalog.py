@@ -0,0 +1,300 @@
+import argparse
+import collections
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import torch
+from PIL import Image
+from torchvision import transforms
+from tqdm import tqdm
+
+from data.dataset import IMAGENET_MEAN, IMAGENET_STD, get_transforms, iter_images
+from models.checkpoint import hash_files
+from models.engine import BACKENDS, load_engine
+
+CONFIG_FILE = 'config.json'
+# Resize + center crop of the evaluation transform; ToTensor/Normalize run batched in
+# the main process
+GEOMETRY = transforms.Compose(get_transforms(train=False).transforms[:2])
+
+
+def iter_catalog(data_dir, csv_file=None, chunk_size=10_000):
+    """
+    Yield the catalog image paths.
+
+    Paths come from the first column of csv_file, read in chunks, or from every
+    image under data_dir.
+    """
+    if csv_file is None:
+        yield from iter_images(data_dir)
+        return
+    for chunk in pd.read_csv(csv_file, chunksize=chunk_size):
+        yield from chunk.iloc[:, 0].astype(str)
+
+
+def decode_batch(task):
+    """
+    Decode and crop a batch of images to uint8 HWC arrays.
+
+    Runs in a worker process. JPEGs are draft-decoded at the smallest scale
+    still covering the resize target. Unreadable files come back as None.
+    """
+    root_dir, paths = task
+    arrays = []
+    for path in paths:
+        try:
+            with Image.open(os.path.join(root_dir, path)) as image:
+                image.draft('RGB', (256, 256))
+                arrays.append(
+                    np.asarray(GEOMETRY(image.convert('RGB')), dtype=np.uint8)
+                )
+        except Exception as e:
+            logging.getLogger(__name__).warning(
+                f"Skipping unreadable image {path}: {e}"
+            )
+            arrays.append(None)
+    return paths, arrays
+
+
+def shard_files(output_dir, shard_id, fmt):
+    """Return the files of one output shard, the last written one last."""
+    if fmt == 'parquet':
+        return [os.path.join(output_dir, f'part-{shard_id:05d}.parquet')]
+    return [
+        os.path.join(output_dir, f'embeddings-{shard_id:05d}.npy'),
+        os.path.join(output_dir, f'meta-{shard_id:05d}.npz'),
+    ]
+
+
+def completed_shards(output_dir, fmt):
+    """
+    Return the number of leading shards fully written.
+
+    The last file of a shard is renamed into place only after everything else is on
+    disk, so its presence marks a complete shard.
+    """
+    shard_id = 0
+    while os.path.exists(shard_files(output_dir, shard_id, fmt)[-1]):
+        shard_id += 1
+    return shard_id
+
+
+def write_shard(output_dir, shard_id, fmt, ids, embeddings, categories, colors, failed):
+    """Write one output shard, renaming its last file into place last."""
+    paths = shard_files(output_dir, shard_id, fmt)
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table(
+            {
+                'id': ids,
+                'category': categories,
+                'color': colors,
+                'embedding': pa.FixedSizeListArray.from_arrays(
+                    pa.array(embeddings.ravel()), embeddings.shape[1]
+                ),
+            }
+        )
+        pq.write_table(table, paths[0] + '.tmp')
+        os.replace(paths[0] + '.tmp', paths[0])
+        return
+
+    with open(paths[0] + '.tmp', 'wb') as f:
+        np.save(f, embeddings)
+    os.replace(paths[0] + '.tmp', paths[0])
+    with open(paths[1] + '.tmp', 'wb') as f:
+        np.savez(
+            f,
+            ids=np.asarray(ids, dtype=str),
+            category=categories,
+            color=colors,
+            failed=np.asarray(failed, dtype=str),
+        )
+    os.replace(paths[1] + '.tmp', paths[1])
+
+
+def check_config(output_dir, config):
+    """Resuming is only valid with the same model and shard layout."""
+    path = os.path.join(output_dir, CONFIG_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != config:
+            raise ValueError(
+                f"{output_dir} was written with different settings: {previous}; "
+                f"use a new --output_dir or delete it"
+            )
+    else:
+        with open(path, 'w') as f:
+            json.dump(config, f, indent=2)
+
+
+@torch.no_grad()
+def main(args):
+    """Embed the catalog shard by shard, resuming after the last complete one."""
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    os.makedirs(args.output_dir, exist_ok=True)
+    check_config(
+        args.output_dir,
+        {
+            'model_path': os.path.abspath(args.model_path),
+            'model_hash': hash_files([args.model_path]),
+            'source': os.path.abspath(args.csv or args.data_dir),
+            'shard_size': args.shard_size,
+            'format': args.format,
+            'dtype': args.dtype,
+        },
+    )
+
+    model, device, meta = load_engine(args.model_path, args.backend)
+    embed_dim = meta['arch']['embed_dim']
+    mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1) * 255
+    std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1) * 255
+
+    start_shard = completed_shards(args.output_dir, args.format)
+    paths = itertools.islice(
+        iter_catalog(args.data_dir, args.csv), start_shard * args.shard_size, None
+    )
+    if start_shard:
+        logging.info(
+            f"Resuming after {start_shard} completed shards "
+            f"({start_shard * args.shard_size} images)"
+        )
+
+    def batches():
+        # Batches never straddle shards, so shard n always covers inputs
+        # [n * shard_size, (n + 1) * shard_size)
+        shard_paths = iter(lambda: list(itertools.islice(paths, args.shard_size)), [])
+        for shard in shard_paths:
+            for i in range(0, len(shard), args.batch_size):
+                yield shard[i : i + args.batch_size], i + args.batch_size >= len(shard)
+
+    shard_id = start_shard
+    buffers = collections.defaultdict(list)
+    progress = tqdm(desc='Embedding', unit='img')
+
+    with ProcessPoolExecutor(max_workers=args.num_workers) as pool:
+        # At most num_workers * prefetch batches are decoded ahead of the model:
+        # memory stays bounded
+        pending = collections.deque()
+        source = batches()
+        for batch, last in itertools.islice(source, args.num_workers * args.prefetch):
+            pending.append((pool.submit(decode_batch, (args.data_dir, batch)), last))
+
+        while pending:
+            future, last = pending.popleft()
+            next_batch = next(source, None)
+            if next_batch is not None:
+                pending.append(
+                    (
+                        pool.submit(decode_batch, (args.data_dir, next_batch[0])),
+                        next_batch[1],
+                    )
+                )
+
+            batch_paths, arrays = future.result()
+            ok = [i for i, array in enumerate(arrays) if array is not None]
+            buffers['failed'].extend(
+                batch_paths[i] for i, array in enumerate(arrays) if array is None
+            )
+            if ok:
+                images = (
+                    torch.from_numpy(np.stack([arrays[i] for i in ok]))
+                    .to(device)
+                    .permute(0, 3, 1, 2)
+                    .float()
+                )
+                cat_logits, color_logits, embeddings = model((images - mean) / std)
+                buffers['ids'].extend(batch_paths[i] for i in ok)
+                buffers['embeddings'].append(
+                    embeddings.float().cpu().numpy().astype(args.dtype)
+                )
+                buffers['categories'].append(
+                    cat_logits.argmax(dim=1).cpu().numpy().astype(np.int32)
+                )
+                buffers['colors'].append(
+                    color_logits.argmax(dim=1).cpu().numpy().astype(np.int32)
+                )
+            progress.update(len(batch_paths))
+
+            if last:
+                write_shard(
+                    args.output_dir,
+                    shard_id,
+                    args.format,
+                    buffers['ids'],
+                    np.concatenate(
+                        buffers['embeddings'] or [np.empty((0, embed_dim), args.dtype)]
+                    ),
+                    np.concatenate(buffers['categories'] or [np.empty(0, np.int32)]),
+                    np.concatenate(buffers['colors'] or [np.empty(0, np.int32)]),
+                    buffers['failed'],
+                )
+                logging.info(
+                    f"Wrote shard {shard_id} ({len(buffers['ids'])} images, "
+                    f"{len(buffers['failed'])} failed)"
+                )
+                shard_id += 1
+                buffers.clear()
+
+    progress.close()
+    logging.info(f"Catalog embedded into {shard_id} shards in {args.output_dir}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Embed a whole catalog into sharded embedding files'
+    )
+    parser.add_argument(
+        '--model_path',
+        type=str,
+        required=True,
+        help='Path to trained WardrobeNet weights or export',
+    )
+    parser.add_argument('--backend', type=str, default='auto', choices=BACKENDS)
+    parser.add_argument(
+        '--data_dir',
+        type=str,
+        required=True,
+        help='Root directory of the catalog images',
+    )
+    parser.add_argument(
+        '--csv',
+        type=str,
+        default=None,
+        help='Optional CSV whose first column lists image paths',
+    )
+    parser.add_argument('--output_dir', type=str, required=True)
+    parser.add_argument('--format', type=str, default='npy', choices=('npy', 'parquet'))
+    parser.add_argument(
+        '--dtype', type=str, default='float16', choices=('float16', 'float32')
+    )
+    parser.add_argument(
+        '--shard_size', type=int, default=16_384, help='Images per output shard'
+    )
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument(
+        '--num_workers', type=int, default=os.cpu_count(), help='Decode processes'
+    )
+    parser.add_argument(
+        '--prefetch', type=int, default=2, help='Batches decoded ahead per worker'
+    )
+    parser.add_argument(
+        '--num_threads',
+        type=int,
+        default=None,
+        help='Intra-op threads for the forward pass',
+    )
+
+    args = parser.parse_args()
+    main(args)
@@ -1,57 +1,198 @@
 import argparse
+import json
+import logging
+import time
+
+import numpy as np
 import torch
-from torchvision import datasets, transforms
 from torch.utils.data import DataLoader
-# from models import YourModel  # Assuming YourModel is defined in a models module
-from sklearn.metrics import accuracy_score, classification_report
-
-def evaluate_model(model_path, data_dir, batch_size):
-    # 1. Load the trained model
-    # model = YourModel(...) # Initialize your model architecture
-    # model.load_state_dict(torch.load(model_path))
-    # model.eval() # Set model to evaluation mode
-    print("Placeholder: Model loading and evaluation logic here.")
-    print(f"Would evaluate model from: {model_path}")
-    print(f"Using data from: {data_dir}")
-
-    # 2. Prepare the evaluation dataset
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
-    # Placeholder for actual dataset and dataloader
-    # eval_dataset = datasets.ImageFolder(data_dir, transform=transform)
-    # eval_loader = DataLoader(eval_dataset, batch_size=batch_size, shuffle=False)
-
-    # 3. Perform inference (placeholder)
-    all_preds = [0, 1, 0, 1] # Dummy predictions
-    all_labels = [0, 1, 1, 0] # Dummy labels
-    # with torch.no_grad():
-    #     for inputs, labels in eval_loader:
-    #         outputs = model(inputs)
-    #         _, preds = torch.max(outputs, 1)
-    #         all_preds.extend(preds.cpu().numpy())
-    #         all_labels.extend(labels.cpu().numpy())
-
-    # 4. Calculate metrics (using dummy data)
-    accuracy = accuracy_score(all_labels, all_preds)
-    # report = classification_report(all_labels, all_preds, target_names=["class_0", "class_1"]) # Use actual class names
-
-    print(f"Model Accuracy (dummy): {accuracy:.4f}")
-    # print("\nClassification Report (dummy):\n", report)
-
-    # 5. Save results (optional)
-    # with open("evaluation_results.txt", "w") as f:
-    #     f.write(f"Accuracy: {accuracy}\n")
-    #     f.write(report)
+
+from data.dataset import MultiTaskWardrobeDataset, get_transforms
+from models.engine import BACKENDS, load_engine
+from retrieval.metrics import confusion_matrix, retrieval_metrics
+
+
+@torch.no_grad()
+def run_inference(model, loader, device):
+    """
+    Run the model over the loader and collect what the metrics need.
+
+    Only predictions, labels and embeddings are kept, never the images
+    themselves.
+    """
+    cat_preds, color_preds, cat_labels, color_labels, embeddings = [], [], [], [], []
+    num_images = 0
+    start = time.perf_counter()
+
+    for images, cat_batch, color_batch in loader:
+        images = images.to(device, non_blocking=True)
+        cat_logits, color_logits, norm_embeddings = model(images)
+
+        cat_preds.append(cat_logits.argmax(dim=1).cpu().numpy())
+        color_preds.append(color_logits.argmax(dim=1).cpu().numpy())
+        embeddings.append(norm_embeddings.float().cpu().numpy())
+        cat_labels.append(cat_batch.numpy())
+        color_labels.append(color_batch.numpy())
+        num_images += len(images)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'category_preds': np.concatenate(cat_preds),
+        'color_preds': np.concatenate(color_preds),
+        'category_labels': np.concatenate(cat_labels),
+        'color_labels': np.concatenate(color_labels),
+        'embeddings': np.concatenate(embeddings),
+        'images_per_sec': num_images / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def compute_metrics(outputs, num_categories, num_colors, ks=(1, 5, 10)):
+    """Compute accuracy, confusion and retrieval metrics from collected outputs."""
+    category_labels, color_labels = outputs['category_labels'], outputs['color_labels']
+    # An item is a relevant match for "same garment type" retrieval when both labels
+    # agree
+    pair_labels = category_labels * num_colors + color_labels
+
+    return {
+        'num_images': int(len(category_labels)),
+        'images_per_sec': outputs['images_per_sec'],
+        'category_accuracy': float(
+            (outputs['category_preds'] == category_labels).mean()
+        ),
+        'color_accuracy': float((outputs['color_preds'] == color_labels).mean()),
+        'category_confusion': confusion_matrix(
+            category_labels, outputs['category_preds'], num_categories
+        ).tolist(),
+        'color_confusion': confusion_matrix(
+            color_labels, outputs['color_preds'], num_colors
+        ).tolist(),
+        'retrieval_category': retrieval_metrics(
+            outputs['embeddings'], category_labels, ks
+        ),
+        'retrieval_category_color': retrieval_metrics(
+            outputs['embeddings'], pair_labels, ks
+        ),
+    }
+
+
+def evaluate_model(
+    model_path,
+    data_dir,
+    csv_file,
+    batch_size,
+    num_workers=4,
+    pin_memory=None,
+    prefetch_factor=2,
+    ks=(1, 5, 10),
+    backend='auto',
+):
+    """Evaluate a checkpoint or exported artifact on an annotations CSV."""
+    model, device, meta = load_engine(model_path, backend)
+    logging.info(f"Evaluating {model_path} ({backend} backend) on {device}")
+
+    dataset = MultiTaskWardrobeDataset(
+        csv_file=csv_file, root_dir=data_dir, transform=get_transforms(train=False)
+    )
+    loader = DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+        pin_memory=device.type == 'cuda' if pin_memory is None else pin_memory,
+        prefetch_factor=prefetch_factor if num_workers > 0 else None,
+    )
+
+    outputs = run_inference(model, loader, device)
+    return compute_metrics(
+        outputs, meta['arch']['num_categories'], meta['arch']['num_colors'], ks
+    )
+
+
+def format_report(metrics):
+    """Format metrics as a human-readable report."""
+    lines = [
+        f"Images: {metrics['num_images']} ({metrics['images_per_sec']:.1f} img/s)",
+        f"Category accuracy: {metrics['category_accuracy']:.4f}",
+        f"Color accuracy: {metrics['color_accuracy']:.4f}",
+    ]
+    for name in ('retrieval_category', 'retrieval_category_color'):
+        scores = ', '.join(f"{k}={v:.4f}" for k, v in metrics[name].items())
+        lines.append(f"{name}: {scores}")
+    lines.append(f"Category confusion:\n{np.array(metrics['category_confusion'])}")
+    lines.append(f"Color confusion:\n{np.array(metrics['color_confusion'])}")
+    return '\n'.join(lines)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Evaluate a trained Capstone model.")
-    parser.add_argument("--model_path", type=str, required=True, help="Path to the trained model (.pt file).")
-    parser.add_argument("--data_dir", type=str, required=True, help="Path to the evaluation dataset.")
-    parser.add_argument("--batch_size", type=int, default=32, help="Batch size for evaluation.")
+    parser.add_argument(
+        "--model_path",
+        type=str,
+        required=True,
+        help="Path to the trained WardrobeNet checkpoint.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="auto",
+        choices=BACKENDS,
+        help="Inference backend (auto: picked from the file extension, see "
+        "models.engine).",
+    )
+    parser.add_argument(
+        "--data_dir", type=str, required=True, help="Path to the evaluation images."
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        required=True,
+        help="Annotations CSV (image_path, category_id, color_id).",
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=64, help="Batch size for evaluation."
+    )
+    parser.add_argument(
+        "--num_workers", type=int, default=4, help="DataLoader worker processes."
+    )
+    parser.add_argument(
+        "--pin_memory",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Pin host memory (default: only when running on CUDA).",
+    )
+    parser.add_argument(
+        "--prefetch_factor", type=int, default=2, help="Batches prefetched per worker."
+    )
+    parser.add_argument(
+        "--ks",
+        type=str,
+        default="1,5,10",
+        help="Comma-separated k values for recall@k.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Optional path to write the metrics as JSON.",
+    )
     args = parser.parse_args()
 
-    evaluate_model(args.model_path, args.data_dir, args.batch_size)
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    metrics = evaluate_model(
+        args.model_path,
+        args.data_dir,
+        args.csv,
+        args.batch_size,
+        num_workers=args.num_workers,
+        pin_memory=args.pin_memory,
+        prefetch_factor=args.prefetch_factor,
+        ks=tuple(int(k) for k in args.ks.split(',')),
+        backend=args.backend,
+    )
+    print(format_report(metrics))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(metrics, f, indent=2)
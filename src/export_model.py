@@ -0,0 +1,238 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+
+import torch
+from torch.utils.data import DataLoader
+
+from data.dataset import MultiTaskWardrobeDataset, get_transforms
+from evaluate import compute_metrics, run_inference
+from models.checkpoint import load_wardrobenet
+from models.engine import load_engine
+from models.export import (
+    export_onnx,
+    export_torchscript,
+    quantize_dynamic,
+    quantize_static,
+)
+
+FORMATS = ('torchscript', 'int8-dynamic', 'int8-static', 'onnx')
+
+
+def artifact_path(output_dir, stem, fmt):
+    """Return the output path of an artifact in the given format."""
+    if fmt == 'onnx':
+        return os.path.join(output_dir, f'{stem}.onnx')
+    if fmt == 'torchscript':
+        return os.path.join(output_dir, f'{stem}.fp32.ts')
+    return os.path.join(output_dir, f'{stem}.{fmt}.ts')
+
+
+def compare(reference, outputs, metrics, reference_metrics):
+    """
+    Compare an exported artifact with the fp32 model.
+
+    Reports, on the same images, how often the top-1 predictions agree, how
+    close the embeddings are, and the change in every accuracy/retrieval metric.
+    """
+    report = {
+        'category_agreement': float(
+            (outputs['category_preds'] == reference['category_preds']).mean()
+        ),
+        'color_agreement': float(
+            (outputs['color_preds'] == reference['color_preds']).mean()
+        ),
+        'embedding_cosine': float(
+            (outputs['embeddings'] * reference['embeddings']).sum(axis=1).mean()
+        ),
+        'images_per_sec': metrics['images_per_sec'],
+        'speedup': metrics['images_per_sec']
+        / max(reference_metrics['images_per_sec'], 1e-9),
+        'category_accuracy': metrics['category_accuracy'],
+        'color_accuracy': metrics['color_accuracy'],
+        'deltas': {
+            'category_accuracy': metrics['category_accuracy']
+            - reference_metrics['category_accuracy'],
+            'color_accuracy': metrics['color_accuracy']
+            - reference_metrics['color_accuracy'],
+        },
+    }
+    for name in ('retrieval_category', 'retrieval_category_color'):
+        for key, value in metrics[name].items():
+            report['deltas'][f'{name}/{key}'] = value - reference_metrics[name][key]
+    return report
+
+
+def main(args):
+    """Export the checkpoint in each requested format and report the accuracy cost."""
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(args.model_path))[0]
+    cpu = torch.device('cpu')
+
+    model, meta = load_wardrobenet(args.model_path, cpu, with_meta=True)
+    arch = meta['arch']
+
+    dataset = MultiTaskWardrobeDataset(
+        csv_file=args.csv, root_dir=args.data_dir, transform=get_transforms(train=False)
+    )
+    loader = DataLoader(
+        dataset, batch_size=args.batch_size, shuffle=False, num_workers=args.num_workers
+    )
+    example = next(iter(loader))[0]
+
+    artifacts = {}
+    for fmt in args.formats.split(','):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+        path = artifact_path(args.output_dir, stem, fmt)
+        artifact_meta = {
+            **meta,
+            'source': os.path.abspath(args.model_path),
+            'export_format': fmt,
+        }
+
+        if fmt == 'onnx':
+            export_onnx(model, path, example, artifact_meta)
+        elif fmt == 'torchscript':
+            export_torchscript(model, path, example, artifact_meta)
+        elif fmt == 'int8-dynamic':
+            export_torchscript(quantize_dynamic(model), path, example, artifact_meta)
+        else:
+            # Calibrate on a shuffled sample of the validation set
+            calibration_loader = DataLoader(
+                dataset,
+                batch_size=args.batch_size,
+                shuffle=True,
+                num_workers=args.num_workers,
+                generator=torch.Generator().manual_seed(0),
+            )
+            batches = (
+                images
+                for images, _, _ in itertools.islice(
+                    calibration_loader, args.calibration_batches
+                )
+            )
+            export_torchscript(
+                quantize_static(model, batches), path, example, artifact_meta
+            )
+
+        artifacts[fmt] = path
+        logging.info(
+            f"Exported {fmt} to {path} ({os.path.getsize(path) / 2**20:.1f} MiB)"
+        )
+
+    if not args.parity:
+        return 0
+
+    # Parity: every artifact against the eager fp32 model, on the same images and device
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    ks = tuple(int(k) for k in args.ks.split(','))
+    reference = run_inference(model, loader, cpu)
+    reference_metrics = compute_metrics(
+        reference, arch['num_categories'], arch['num_colors'], ks
+    )
+    report = {
+        'fp32': {
+            'images_per_sec': reference_metrics['images_per_sec'],
+            'category_accuracy': reference_metrics['category_accuracy'],
+            'color_accuracy': reference_metrics['color_accuracy'],
+            'retrieval_category': reference_metrics['retrieval_category'],
+        }
+    }
+
+    failed = []
+    for fmt, path in artifacts.items():
+        engine, device, _ = load_engine(path)
+        outputs = run_inference(engine, loader, device)
+        metrics = compute_metrics(
+            outputs, arch['num_categories'], arch['num_colors'], ks
+        )
+        report[fmt] = compare(reference, outputs, metrics, reference_metrics)
+        report[fmt]['size_mb'] = os.path.getsize(path) / 2**20
+
+        worst = min(report[fmt]['deltas'].values())
+        status = 'OK' if worst >= -args.max_drop else 'FAIL'
+        if status == 'FAIL':
+            failed.append(fmt)
+        logging.info(
+            f"{fmt}: top-1 agreement {report[fmt]['category_agreement']:.4f}, "
+            f"embedding cosine {report[fmt]['embedding_cosine']:.4f}, "
+            f"worst metric delta {worst:+.4f}, "
+            f"{report[fmt]['speedup']:.2f}x fp32 speed [{status}]"
+        )
+
+    with open(os.path.join(args.output_dir, f'{stem}.parity.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    if failed:
+        logging.error(
+            f"Accuracy parity failed for {', '.join(failed)} "
+            f"(max allowed drop {args.max_drop})"
+        )
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export WardrobeNet to TorchScript/ONNX/int8 and check accuracy '
+        'parity'
+    )
+    parser.add_argument(
+        '--model_path',
+        type=str,
+        required=True,
+        help='Path to trained WardrobeNet weights',
+    )
+    parser.add_argument(
+        '--data_dir', type=str, required=True, help='Path to the validation images'
+    )
+    parser.add_argument(
+        '--csv',
+        type=str,
+        required=True,
+        help='Validation annotations CSV (calibration + parity)',
+    )
+    parser.add_argument('--output_dir', type=str, default='models/export')
+    parser.add_argument(
+        '--formats',
+        type=str,
+        default='torchscript,int8-dynamic,int8-static',
+        help=f'Comma-separated subset of {",".join(FORMATS)} '
+        '(onnx needs the onnx package)',
+    )
+    parser.add_argument(
+        '--calibration_batches',
+        type=int,
+        default=16,
+        help='Batches used to calibrate int8-static',
+    )
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--num_workers', type=int, default=4)
+    parser.add_argument(
+        '--num_threads', type=int, default=None, help='CPU threads for the parity runs'
+    )
+    parser.add_argument(
+        '--ks', type=str, default='1,5,10', help='Comma-separated k values for recall@k'
+    )
+    parser.add_argument(
+        '--max_drop',
+        type=float,
+        default=0.01,
+        help='Fail if any accuracy/retrieval metric drops by more than this vs fp32',
+    )
+    parser.add_argument(
+        '--parity',
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help='Compare every artifact against the fp32 model on the validation set',
+    )
+
+    args = parser.parse_args()
+    sys.exit(main(args))
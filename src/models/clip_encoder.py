@@ -0,0 +1,126 @@
+import numpy as np
+import torch
+from torchvision import transforms
+
+from models.checkpoint import get_device
+from utils.lru import LRUCache
+
+
+class ClipEncoder:
+    """
+    Embed images and free text in CLIP's shared space.
+
+    Optional and lives alongside WardrobeNet, so free-text queries ("more
+    formal", "summer vibe") can be matched against catalog images.
+
+    Weights are only ever read from model_dir (a Hugging Face CLIP checkpoint
+    saved with save_pretrained); nothing is downloaded. Text embeddings are
+    kept in an LRU cache of text_cache_size phrases, since users repeat
+    queries constantly. All embeddings are L2-normalized float32.
+    """
+
+    def __init__(self, model_dir, device=None, text_cache_size=4096):
+        from transformers import CLIPImageProcessor, CLIPModel, CLIPTokenizer
+
+        self.device = device or get_device()
+        self.model = (
+            CLIPModel.from_pretrained(model_dir, local_files_only=True)
+            .to(self.device)
+            .eval()
+        )
+        self.tokenizer = CLIPTokenizer.from_pretrained(model_dir, local_files_only=True)
+        self.text_cache = LRUCache(text_cache_size)
+
+        # Same preprocessing as CLIPImageProcessor, as a torchvision transform
+        # that can run inside DataLoader workers
+        processor = CLIPImageProcessor.from_pretrained(model_dir, local_files_only=True)
+        crop = processor.crop_size
+        self.transform = transforms.Compose(
+            [
+                transforms.Resize(
+                    processor.size['shortest_edge'],
+                    interpolation=transforms.InterpolationMode.BICUBIC,
+                ),
+                transforms.CenterCrop((crop['height'], crop['width'])),
+                transforms.ToTensor(),
+                transforms.Normalize(
+                    mean=processor.image_mean, std=processor.image_std
+                ),
+            ]
+        )
+
+    @property
+    def dim(self):
+        """Embedding size."""
+        return self.model.config.projection_dim
+
+    @staticmethod
+    def _features(output):
+        # Older transformers return the projected tensor, newer ones a model output
+        return output if torch.is_tensor(output) else output.pooler_output
+
+    @torch.no_grad()
+    def encode_image_tensors(self, images):
+        """Embed a batch of images already passed through self.transform."""
+        features = self._features(
+            self.model.get_image_features(pixel_values=images.to(self.device))
+        )
+        return torch.nn.functional.normalize(features.float(), dim=1).cpu().numpy()
+
+    def encode_images(self, images):
+        """Embed a list of PIL images."""
+        return self.encode_image_tensors(
+            torch.stack([self.transform(image.convert('RGB')) for image in images])
+        )
+
+    @torch.no_grad()
+    def embed_catalog(self, loader):
+        """
+        Embed a dataset of images, ordered by dataset index.
+
+        Expects a DataLoader of (images, index) batches built with self.transform,
+        like retrieval.index.embed_catalog does for WardrobeNet.
+        """
+        embeddings = np.empty((len(loader.dataset), self.dim), dtype=np.float32)
+        for images, indices in loader:
+            embeddings[indices.numpy()] = self.encode_image_tensors(images)
+        return embeddings
+
+    @torch.no_grad()
+    def encode_text(self, texts):
+        """
+        Embed a list of phrases.
+
+        Only phrases missing from the cache go through the text tower, in a single
+        batch.
+        """
+        keys = [' '.join(text.lower().split()) for text in texts]
+        cached = {key: self.text_cache.get(key) for key in set(keys)}
+        missing = [key for key, value in cached.items() if value is None]
+
+        if missing:
+            tokens = self.tokenizer(
+                missing, padding=True, truncation=True, return_tensors='pt'
+            ).to(self.device)
+            features = self._features(self.model.get_text_features(**tokens))
+            features = (
+                torch.nn.functional.normalize(features.float(), dim=1).cpu().numpy()
+            )
+            for key, feature in zip(missing, features):
+                self.text_cache.put(key, feature)
+                cached[key] = feature
+
+        return np.stack([cached[key] for key in keys])
+
+    def combine(self, image_embedding, text, weight=0.5, negative_text=None):
+        """
+        Return an image embedding shifted by a text direction.
+
+        For example (photo of a blazer) + weight * "more formal". With
+        negative_text the direction is text - negative_text ("summer" - "winter").
+        """
+        direction = self.encode_text([text])[0]
+        if negative_text:
+            direction = direction - self.encode_text([negative_text])[0]
+        query = np.asarray(image_embedding, dtype=np.float32) + weight * direction
+        return query / max(np.linalg.norm(query), 1e-12)
@@ -0,0 +1,82 @@
+import os
+
+import torch
+
+from models.checkpoint import get_device, load_wardrobenet
+from models.export import INPUT_NAME, quantize_dynamic, read_meta
+
+BACKENDS = ('auto', 'fp32', 'int8-dynamic', 'torchscript', 'onnx')
+TORCHSCRIPT_EXTENSIONS = ('.ts', '.pt')
+
+
+class OnnxEngine:
+    """
+    Run an exported ONNX model like WardrobeNet.
+
+    Uses onnxruntime behind the WardrobeNet call signature: images tensor in,
+    (category_logits, color_logits, embeddings) tensors out.
+    """
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            path, options, providers=['CPUExecutionProvider']
+        )
+
+    def __call__(self, images):
+        """Return (category_logits, color_logits, embeddings) tensors."""
+        outputs = self.session.run(
+            None, {INPUT_NAME: images.detach().cpu().float().numpy()}
+        )
+        return tuple(torch.from_numpy(output) for output in outputs)
+
+    def eval(self):
+        """Return self, for code written against nn.Module."""
+        return self
+
+
+def detect_backend(path):
+    """Return the backend matching the file extension of path."""
+    extension = os.path.splitext(str(path))[1]
+    if extension == '.onnx':
+        return 'onnx'
+    if extension in TORCHSCRIPT_EXTENSIONS:
+        return 'torchscript'
+    return 'fp32'
+
+
+def load_engine(path, backend='auto', device=None):
+    """
+    Load a checkpoint or exported artifact for inference.
+
+    Returns (engine, device, meta); the engine is called like WardrobeNet.
+        fp32          eager checkpoint (.pth / .safetensors)
+        int8-dynamic  eager checkpoint with Linear layers quantized at load
+        torchscript   artifact from export_model.py (fp32 or int8)
+        onnx          artifact from export_model.py, run with onnxruntime
+    'auto' picks the backend from the file extension. Only fp32 can use
+    CUDA; the other backends run on the CPU.
+    """
+    if backend == 'auto':
+        backend = detect_backend(path)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+    if backend == 'fp32':
+        device = device or get_device()
+        model, meta = load_wardrobenet(path, device, with_meta=True)
+        return model, device, meta
+
+    device = torch.device('cpu')
+    if backend == 'int8-dynamic':
+        model, meta = load_wardrobenet(path, device, with_meta=True)
+        return quantize_dynamic(model), device, meta
+
+    meta = read_meta(path)
+    if backend == 'torchscript':
+        return torch.jit.load(path, map_location=device).eval(), device, meta
+    return OnnxEngine(path), device, meta
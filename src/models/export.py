@@ -0,0 +1,108 @@
+import copy
+import json
+
+import torch
+import torch.nn as nn
+
+from models.checkpoint import _int_keys
+
+INPUT_NAME = 'images'
+OUTPUT_NAMES = ['category_logits', 'color_logits', 'embeddings']
+
+
+def meta_path(path):
+    """Return the path of the metadata sidecar of an artifact."""
+    return f'{path}.json'
+
+
+def write_meta(path, meta):
+    """
+    Write the checkpoint metadata next to an exported artifact.
+
+    The metadata (arch, labels, normalization, ...) goes in a JSON sidecar, like
+    the retrieval index does.
+    """
+    with open(meta_path(path), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_meta(path):
+    """Read the metadata sidecar of an artifact."""
+    with open(meta_path(path)) as f:
+        meta = json.load(f)
+    labels = meta.setdefault('labels', {})
+    for key in ('categories', 'colors'):
+        if key in labels:
+            labels[key] = _int_keys(labels[key])
+    return meta
+
+
+def quantize_dynamic(model):
+    """
+    Quantize every Linear layer to int8 weights.
+
+    That covers the embedding projection and both heads; activations are
+    quantized on the fly, so no calibration is needed. The convolutional
+    backbone stays fp32.
+    """
+    model = copy.deepcopy(model).cpu().eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+@torch.no_grad()
+def quantize_static(model, calibration_batches, engine='x86'):
+    """
+    Quantize the whole model to int8 with calibration.
+
+    Post-training static quantization via FX graph mode: observers are
+    inserted, calibration_batches (an iterable of image tensors) are run
+    through to record activation ranges, and the graph is converted to int8
+    kernels for both the backbone and the heads.
+    """
+    torch.backends.quantized.engine = engine
+    model = copy.deepcopy(model).cpu().eval()
+    qconfig_mapping = torch.ao.quantization.get_default_qconfig_mapping(engine)
+
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    prepared = None
+    for images in calibration_batches:
+        if prepared is None:
+            prepared = prepare_fx(model, qconfig_mapping, example_inputs=(images,))
+        prepared(images)
+    if prepared is None:
+        raise ValueError("Static quantization needs at least one calibration batch")
+    return convert_fx(prepared)
+
+
+@torch.no_grad()
+def export_torchscript(model, path, example, meta):
+    """
+    Save model as a frozen TorchScript module.
+
+    model is traced with example (a batch of images); the saved module loads
+    without the Python model code.
+    """
+    traced = torch.jit.freeze(torch.jit.trace(model.eval(), example))
+    traced.save(path)
+    write_meta(path, meta)
+
+
+@torch.no_grad()
+def export_onnx(model, path, example, meta, opset_version=17):
+    """
+    Export model to ONNX with a dynamic batch dimension.
+
+    Requires the onnx package; run it with onnxruntime via models.engine.
+    """
+    torch.onnx.export(
+        model.eval(),
+        (example,),
+        path,
+        input_names=[INPUT_NAME],
+        output_names=OUTPUT_NAMES,
+        dynamic_axes={name: {0: 'batch'} for name in [INPUT_NAME] + OUTPUT_NAMES},
+        opset_version=opset_version,
+        dynamo=False,
+    )
+    write_meta(path, meta)
@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def mmr(
+    vectors,
+    scores,
+    k,
+    lambda_=0.7,
+    categories=None,
+    colors=None,
+    max_per_category=None,
+    max_per_color=None,
+):
+    """
+    Pick a relevant but varied subset of candidates.
+
+    Maximal Marginal Relevance: greedily picks the item maximising
+    lambda_ * relevance - (1 - lambda_) * (max similarity to the items already
+    picked). lambda_=1 is plain relevance order; lower values trade relevance
+    for variety.
+
+    The redundancy term is kept incrementally: each pick costs one
+    matrix-vector product against the candidates (O(N * dim)), so picking k
+    of N is O(k * N * dim) with no pairwise loop in Python.
+
+    categories/colors are per-candidate label arrays (e.g. WardrobeNet's
+    predicted category/color); max_per_category/max_per_color cap how many
+    picks may share a label. Returns the picked candidate positions in order.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    relevance = np.asarray(scores, dtype=np.float32)
+    num_candidates = len(relevance)
+    k = min(k, num_candidates)
+
+    redundancy = np.full(num_candidates, -np.inf, dtype=np.float32)
+    available = np.isfinite(relevance)
+    caps = [
+        (np.asarray(labels), cap, {})
+        for labels, cap in ((categories, max_per_category), (colors, max_per_color))
+        if labels is not None and cap is not None
+    ]
+
+    picked = []
+    while len(picked) < k and available.any():
+        objective = lambda_ * relevance
+        if picked:
+            objective -= (1 - lambda_) * redundancy
+        objective[~available] = -np.inf
+        best = int(np.argmax(objective))
+        picked.append(best)
+        available[best] = False
+
+        np.maximum(redundancy, vectors @ vectors[best], out=redundancy)
+        for labels, cap, counts in caps:
+            label = labels[best]
+            counts[label] = counts.get(label, 0) + 1
+            if counts[label] >= cap:
+                available &= labels != label
+    return np.asarray(picked, dtype=np.int64)
@@ -0,0 +1,267 @@
+import json
+import os
+
+import faiss
+import numpy as np
+import torch
+
+# Below this size an exact (flat) index answers queries in well under a
+# millisecond, so approximate structures only cost recall.
+FLAT_MAX_ITEMS = 20_000
+# HNSW keeps full vectors in RAM; past this size IVF-PQ's compressed codes win.
+HNSW_MAX_ITEMS = 1_000_000
+
+INDEX_TYPES = ('auto', 'flat', 'hnsw', 'ivfpq')
+
+
+@torch.no_grad()
+def embed_catalog(model, loader, device, with_labels=False):
+    """
+    Embed a dataset with the model, ordered by dataset index.
+
+    Expects a DataLoader of (images, index) batches and returns L2-normalized
+    float32 embeddings. With with_labels=True also returns the predicted labels
+    as {'category': int64 array, 'color': int64 array} in the same order.
+    """
+    model.eval()
+    embeddings = None
+    num_items = len(loader.dataset)
+    labels = {
+        'category': np.zeros(num_items, dtype=np.int64),
+        'color': np.zeros(num_items, dtype=np.int64),
+    }
+
+    for images, indices in loader:
+        images = images.to(device, non_blocking=True)
+        cat_logits, color_logits, norm_embeddings = model(images)
+        batch = norm_embeddings.float().cpu().numpy()
+
+        if embeddings is None:
+            embeddings = np.empty((num_items, batch.shape[1]), dtype=np.float32)
+        indices = indices.numpy()
+        embeddings[indices] = batch
+        labels['category'][indices] = cat_logits.argmax(dim=1).cpu().numpy()
+        labels['color'][indices] = color_logits.argmax(dim=1).cpu().numpy()
+
+    return (embeddings, labels) if with_labels else embeddings
+
+
+def default_index_path(model_path):
+    """
+    Return the index path for a checkpoint.
+
+    The index lives next to the weights it was built from:
+    best_model.pth -> best_model.index.
+    """
+    return os.path.splitext(model_path)[0] + '.index'
+
+
+def default_clip_index_path(model_path):
+    """Return the CLIP index path: best_model.pth -> best_model.clip.index."""
+    return os.path.splitext(model_path)[0] + '.clip.index'
+
+
+def _resolve_index_type(index_type, num_items):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}"
+        )
+    if index_type != 'auto':
+        return index_type if num_items else 'flat'
+    if num_items <= FLAT_MAX_ITEMS:
+        return 'flat'
+    if num_items <= HNSW_MAX_ITEMS:
+        return 'hnsw'
+    return 'ivfpq'
+
+
+def _pq_subquantizers(dim):
+    # 8-dim sub-vectors are a good recall/size trade-off for 512-D embeddings.
+    for m in (dim // 8, 64, 32, 16, 8, 4, 2, 1):
+        if m > 0 and dim % m == 0:
+            return m
+    return 1
+
+
+def _load_labels(path):
+    if not os.path.exists(path + '.labels.npz'):
+        return None
+    with np.load(path + '.labels.npz') as data:
+        return {key: data[key] for key in data.files}
+
+
+class EmbeddingIndex:
+    """
+    Top-k cosine search over L2-normalized embeddings backed by FAISS.
+
+    Cosine similarity is the inner product on unit vectors, so every index uses
+    METRIC_INNER_PRODUCT. Item IDs (e.g. image paths) are kept in a parallel array;
+    FAISS only sees row positions. The full-precision vectors are kept alongside
+    (memory-mapped after load) so items can be looked up exactly and the index rebuilt
+    without re-embedding. labels optionally holds per-item label arrays (e.g. the
+    predicted 'category' and 'color'), aligned with ids.
+    """
+
+    def __init__(self, index, ids, index_type, vectors=None, labels=None):
+        self.index = index
+        self.ids = np.asarray(ids)
+        self.index_type = index_type
+        self.vectors = vectors
+        self.labels = labels
+        self._positions = {
+            item_id: pos for pos, item_id in enumerate(self.ids.tolist())
+        }
+
+    @property
+    def dim(self):
+        """Embedding size."""
+        return self.index.d
+
+    def __len__(self):
+        return self.index.ntotal
+
+    @classmethod
+    def build(
+        cls,
+        embeddings,
+        ids,
+        index_type='auto',
+        nlist=None,
+        hnsw_m=32,
+        ef_search=64,
+        nprobe=16,
+        labels=None,
+    ):
+        """Build an index over embeddings, keyed by ids."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(embeddings) != len(ids):
+            raise ValueError(f"Got {len(embeddings)} embeddings but {len(ids)} ids")
+
+        num_items, dim = embeddings.shape
+        index_type = _resolve_index_type(index_type, num_items)
+
+        if index_type == 'flat':
+            index = faiss.IndexFlatIP(dim)
+        elif index_type == 'hnsw':
+            index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = ef_search
+        else:
+            # Rule of thumb: ~4*sqrt(N) lists, each trained on >= 39 points.
+            nlist = nlist or max(1, min(int(4 * np.sqrt(num_items)), num_items // 39))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(
+                quantizer,
+                dim,
+                nlist,
+                _pq_subquantizers(dim),
+                8,
+                faiss.METRIC_INNER_PRODUCT,
+            )
+            index.train(embeddings)
+            index.nprobe = min(nprobe, nlist)
+
+        index.add(embeddings)
+        return cls(index, ids, index_type, vectors=embeddings, labels=labels)
+
+    def search(self, queries, k=10):
+        """
+        Return (scores, ids) arrays of shape (num_queries, k).
+
+        Slots with no result (k larger than the catalog) have score -inf and id None.
+        """
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+        k = min(k, len(self))
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.empty(
+                (len(queries), 0), dtype=object
+            )
+        scores, positions = self.index.search(queries, k)
+
+        missing = positions < 0
+        ids = self.ids[np.where(missing, 0, positions)].astype(object)
+        ids[missing] = None
+        scores[missing] = -np.inf
+        return scores, ids
+
+    def __contains__(self, item_id):
+        return item_id in self._positions
+
+    def reconstruct(self, item_id):
+        """Return the stored vector for an item ID."""
+        position = self._positions[item_id]
+        if self.vectors is not None:
+            return np.asarray(self.vectors[position], dtype=np.float32)
+        if self.index_type == 'ivfpq':
+            # PQ codes only give an approximation of the original vector.
+            self.index.make_direct_map()
+        return self.index.reconstruct(position)
+
+    get = reconstruct
+
+    def labels_of(self, item_ids):
+        """
+        Return the stored labels for item_ids.
+
+        The result is {name: array}, or None when the index was built without
+        labels.
+        """
+        if self.labels is None:
+            return None
+        positions = np.array(
+            [self._positions[item_id] for item_id in item_ids], dtype=np.int64
+        )
+        return {name: values[positions] for name, values in self.labels.items()}
+
+    def _save_labels(self, path):
+        if self.labels is not None:
+            np.savez(path + '.labels.npz', **self.labels)
+
+    def save(self, path):
+        """
+        Save the index and its sidecar files.
+
+        Writes <path> (FAISS index), <path>.ids.npy, <path>.vectors.npy,
+        <path>.labels.npz (if labels are set) and <path>.json (metadata).
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        faiss.write_index(self.index, path)
+        np.save(path + '.ids.npy', self.ids.astype(str))
+        if self.vectors is not None:
+            np.save(path + '.vectors.npy', np.asarray(self.vectors, dtype=np.float32))
+        self._save_labels(path)
+        with open(path + '.json', 'w') as f:
+            json.dump(
+                {
+                    'index_type': self.index_type,
+                    'dim': self.dim,
+                    'num_items': len(self),
+                },
+                f,
+                indent=2,
+            )
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        Load an index saved with save().
+
+        With mmap=True the FAISS data is memory-mapped instead of read into RAM
+        (flat/IVF indexes only). Two-stage indexes (retrieval.quantized) are detected
+        and loaded as such.
+        """
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        if 'code_type' in meta and cls is EmbeddingIndex:
+            from retrieval.quantized import TwoStageIndex
+
+            return TwoStageIndex.load(path, mmap=mmap)
+
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index = faiss.read_index(path, flags)
+        ids = np.load(path + '.ids.npy')
+        vectors = None
+        if os.path.exists(path + '.vectors.npy'):
+            vectors = np.load(path + '.vectors.npy', mmap_mode='r')
+        return cls(
+            index, ids, meta['index_type'], vectors=vectors, labels=_load_labels(path)
+        )
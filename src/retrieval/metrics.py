@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def confusion_matrix(labels, preds, num_classes):
+    """Return the confusion matrix: rows are true classes, columns predicted."""
+    labels = np.asarray(labels, dtype=np.int64)
+    preds = np.asarray(preds, dtype=np.int64)
+    return np.bincount(
+        labels * num_classes + preds, minlength=num_classes * num_classes
+    ).reshape(num_classes, num_classes)
+
+
+def retrieval_metrics(embeddings, labels, ks=(1, 5, 10), block_size=256):
+    """
+    Evaluate leave-one-out retrieval over L2-normalized embeddings.
+
+    Every item queries all the others, and items sharing its label count as
+    relevant.
+
+    Returns recall@k (fraction of queries with at least one relevant item in
+    the top k) and mAP over the full ranking. Queries are processed in blocks
+    of block_size rows, so peak memory is O(block_size * N) rather than O(N^2);
+    each block is one matrix product plus a row-wise sort.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    labels = np.asarray(labels)
+    num_items = len(embeddings)
+    ks = [k for k in ks if k < num_items]
+
+    # Relevant items per query, excluding the query itself
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    num_relevant = counts[inverse] - 1
+
+    hits = dict.fromkeys(ks, 0)
+    ap_sum, num_queries = 0.0, 0
+
+    for start in range(0, num_items, block_size):
+        end = min(start + block_size, num_items)
+        rows = np.arange(end - start)
+
+        sims = embeddings[start:end] @ embeddings.T
+        sims[rows, np.arange(start, end)] = -np.inf  # drop self-matches
+        order = np.argsort(-sims, axis=1)[:, :-1]  # self ends up last
+        relevant = labels[order] == labels[start:end, None]
+
+        valid = num_relevant[start:end] > 0
+        for k in ks:
+            hits[k] += int(relevant[valid, :k].any(axis=1).sum())
+
+        # AP = mean over relevant positions of precision@position
+        cum_hits = np.cumsum(relevant, axis=1)
+        precision = cum_hits / np.arange(1, order.shape[1] + 1)
+        ap = (precision * relevant).sum(axis=1)[valid] / num_relevant[start:end][valid]
+        ap_sum += float(ap.sum())
+        num_queries += int(valid.sum())
+
+    num_queries = max(num_queries, 1)
+    metrics = {f'recall@{k}': hits[k] / num_queries for k in ks}
+    metrics['mAP'] = ap_sum / num_queries
+    return metrics
@@ -0,0 +1,111 @@
+import os
+import threading
+
+import numpy as np
+
+VECTORS_FILE = 'preferences.npy'
+USERS_FILE = 'users.txt'
+
+
+class PreferenceStore:
+    """
+    Running per-user preference vectors in the WardrobeNet embedding space.
+
+    Each like/dislike moves the user's vector by an exponential moving average, pref =
+    (1 - alpha) * pref + alpha * (+/-) item_embedding, so an update costs O(dim) no
+    matter how much history the user has. Consistent tastes push the norm towards 1;
+    mixed signals keep it small, which naturally weakens the re-ranking for uncertain
+    profiles.
+
+    On disk: preferences.npy, one memory-mapped float32 row per user
+    (capacity doubles as users arrive), and users.txt, an append-only list
+    of user IDs whose line number is the row.
+    """
+
+    def __init__(self, directory, dim, alpha=0.2, initial_capacity=1024):
+        self.directory = directory
+        self.dim = dim
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._rows = {}
+        users_path = os.path.join(directory, USERS_FILE)
+        if os.path.exists(users_path):
+            with open(users_path) as f:
+                for row, line in enumerate(f):
+                    self._rows[line.rstrip('\n')] = row
+
+        vectors_path = os.path.join(directory, VECTORS_FILE)
+        if os.path.exists(vectors_path):
+            self._vectors = np.load(vectors_path, mmap_mode='r+')
+            if self._vectors.shape[1] != dim:
+                raise ValueError(
+                    f"{vectors_path} stores {self._vectors.shape[1]}-D preferences, "
+                    f"expected {dim}"
+                )
+        else:
+            self._vectors = self._allocate(max(initial_capacity, len(self._rows)))
+
+    def _allocate(self, capacity):
+        path = os.path.join(self.directory, VECTORS_FILE)
+        tmp_path = path + '.tmp.npy'
+        vectors = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.float32, shape=(capacity, self.dim)
+        )
+        if getattr(self, '_vectors', None) is not None:
+            vectors[: len(self._vectors)] = self._vectors
+        vectors.flush()
+        del vectors
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r+')
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, user_id):
+        return user_id in self._rows
+
+    def _row(self, user_id):
+        row = self._rows.get(user_id)
+        if row is None:
+            row = len(self._rows)
+            if row >= len(self._vectors):
+                self._vectors = self._allocate(2 * len(self._vectors))
+            with open(os.path.join(self.directory, USERS_FILE), 'a') as f:
+                f.write(user_id + '\n')
+            self._rows[user_id] = row
+        return row
+
+    def update(self, user_id, embedding, liked):
+        """Fold one like (or dislike) of an item embedding into the user's vector."""
+        signal = np.asarray(embedding, dtype=np.float32) * (1.0 if liked else -1.0)
+        with self._lock:
+            row = self._row(user_id)
+            self._vectors[row] *= 1.0 - self.alpha
+            self._vectors[row] += self.alpha * signal
+
+    def get(self, user_id):
+        """Return the user's preference vector, or None for users without feedback."""
+        with self._lock:
+            row = self._rows.get(user_id)
+            return None if row is None else np.array(self._vectors[row])
+
+    def flush(self):
+        """Write the preference vectors to disk."""
+        with self._lock:
+            self._vectors.flush()
+
+
+def rerank(preference, candidate_vectors, scores, weight=0.5):
+    """
+    Re-score retrieval candidates towards a user's taste.
+
+    A single matrix-vector product: score + weight * (candidate . preference).
+    Returns (order, new_scores) with order sorting candidates best-first.
+    """
+    combined = np.asarray(scores, dtype=np.float32) + weight * (
+        candidate_vectors @ preference
+    )
+    order = np.argsort(-combined, kind='stable')
+    return order, combined[order]
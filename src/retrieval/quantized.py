@@ -0,0 +1,256 @@
+import json
+import os
+
+import faiss
+import numpy as np
+
+from retrieval.index import EmbeddingIndex, _load_labels, _pq_subquantizers
+
+CODE_TYPES = ('binary', 'int8', 'pq')
+DEFAULT_RERANK = 200
+RERANK_DEPTHS = (10, 20, 50, 100, 200, 400, 800, 1600, 3200)
+
+
+def _build_codes(embeddings, code_type):
+    num_items, dim = embeddings.shape
+    if code_type == 'binary':
+        # Sign bits: 1 bit per dimension, searched by Hamming distance
+        index = faiss.IndexBinaryFlat(dim)
+        index.add(np.packbits(embeddings > 0, axis=1))
+        return index
+
+    if code_type == 'int8':
+        index = faiss.IndexScalarQuantizer(
+            dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+    elif code_type == 'pq':
+        # 256 centroids per sub-quantizer need enough points to train; shrink for tiny
+        # catalogs
+        nbits = int(min(8, max(1, np.log2(max(num_items, 2)) - 1)))
+        index = faiss.IndexPQ(
+            dim, _pq_subquantizers(dim), nbits, faiss.METRIC_INNER_PRODUCT
+        )
+    else:
+        raise ValueError(
+            f"Unknown code type '{code_type}', expected one of {CODE_TYPES}"
+        )
+    if num_items:
+        # An empty catalog leaves the codes untrained; search() never reaches them
+        index.train(embeddings)
+        index.add(embeddings)
+    return index
+
+
+class TwoStageIndex(EmbeddingIndex):
+    """
+    Search compressed codes, then re-rank the best candidates exactly.
+
+    Memory-cheap EmbeddingIndex: the first pass searches compressed codes
+    (sign bits, int8 scalar-quantized or product-quantized vectors) for the
+    top `rerank` candidates, and the second pass re-scores only those with
+    exact float32 cosine against the full-precision vectors, which are
+    memory-mapped after load(). Resident memory is just the codes:
+    1/32 (binary, pq) or 1/4 (int8) of a flat float32 index.
+    """
+
+    def __init__(
+        self, index, ids, code_type, vectors, rerank=DEFAULT_RERANK, labels=None
+    ):
+        super().__init__(
+            index, ids, f'two-stage-{code_type}', vectors=vectors, labels=labels
+        )
+        self.code_type = code_type
+        self.rerank = rerank
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        """Embedding size."""
+        return self.vectors.shape[1]
+
+    @property
+    def memory_bytes(self):
+        """Bytes held by the compressed codes (the float32 vectors stay on disk)."""
+        return self.index.ntotal * self.index.code_size
+
+    @classmethod
+    def build(cls, embeddings, ids, code_type='pq', rerank=DEFAULT_RERANK, labels=None):
+        """Build an index of code_type codes over embeddings, keyed by ids."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(embeddings) != len(ids):
+            raise ValueError(f"Got {len(embeddings)} embeddings but {len(ids)} ids")
+        return cls(
+            _build_codes(embeddings, code_type),
+            ids,
+            code_type,
+            embeddings,
+            rerank=rerank,
+            labels=labels,
+        )
+
+    def _candidates(self, queries, depth):
+        if self.code_type == 'binary':
+            _, positions = self.index.search(np.packbits(queries > 0, axis=1), depth)
+        else:
+            _, positions = self.index.search(queries, depth)
+        return positions
+
+    def search(self, queries, k=10, rerank=None):
+        """
+        Search like EmbeddingIndex.search.
+
+        rerank overrides the number of first-pass candidates re-scored exactly (default:
+        self.rerank).
+        """
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+        k = min(k, len(self))
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        if not len(self):
+            return scores, positions.astype(object)
+
+        depth = min(max(rerank or self.rerank, k), len(self))
+        candidates = self._candidates(queries, depth)
+        for row, (query, candidate) in enumerate(zip(queries, candidates)):
+            # Sorted positions turn the gather into forward-only reads of the memory map
+            candidate = np.unique(candidate[candidate >= 0])
+            exact = np.asarray(self.vectors[candidate], dtype=np.float32) @ query
+            top = min(k, len(candidate))
+            if top == 0:
+                continue
+            best = np.argpartition(-exact, top - 1)[:top]
+            best = best[np.argsort(-exact[best])]
+            scores[row, :top] = exact[best]
+            positions[row, :top] = candidate[best]
+
+        missing = positions < 0
+        ids = self.ids[np.where(missing, 0, positions)].astype(object)
+        ids[missing] = None
+        return scores, ids
+
+    def exact_search(self, queries, k=10, block_size=4096):
+        """
+        Return exact top-k positions over the float32 vectors.
+
+        Brute force in blocks of block_size rows; used as ground truth when tuning.
+        """
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+        k = min(k, len(self))
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_positions = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self), block_size):
+            block = np.asarray(
+                self.vectors[start : start + block_size], dtype=np.float32
+            )
+            scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+            positions = np.concatenate(
+                [
+                    best_positions,
+                    np.broadcast_to(
+                        np.arange(start, start + len(block)), (len(queries), len(block))
+                    ),
+                ],
+                axis=1,
+            )
+            top = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_positions = np.take_along_axis(positions, top, axis=1)
+        return best_positions
+
+    def recall(self, queries, k=10, rerank=None, truth=None):
+        """Mean fraction of the exact top-k that the two-stage search returns."""
+        truth = self.exact_search(queries, k) if truth is None else truth
+        _, ids = self.search(queries, k, rerank=rerank)
+        found = [
+            len(set(row_ids) & set(self.ids[row_truth].tolist()))
+            for row_ids, row_truth in zip(ids, truth)
+        ]
+        return float(np.mean(found)) / truth.shape[1]
+
+    def tune_rerank(
+        self,
+        queries=None,
+        k=10,
+        tolerance=0.01,
+        depths=RERANK_DEPTHS,
+        num_queries=256,
+        seed=0,
+    ):
+        """
+        Tune the rerank depth to a recall target.
+
+        Sets the smallest depth whose recall@k relative to exact search is at least
+        1 - tolerance and returns (depth, recall). Without queries, num_queries
+        catalog vectors are sampled as queries.
+        """
+        if queries is None:
+            sample = np.random.default_rng(seed).choice(
+                len(self), min(num_queries, len(self)), replace=False
+            )
+            queries = np.asarray(self.vectors[np.sort(sample)], dtype=np.float32)
+        truth = self.exact_search(queries, k)
+
+        recall = 0.0
+        for depth in sorted(depths):
+            depth = min(depth, len(self))
+            recall = self.recall(queries, k, rerank=depth, truth=truth)
+            if recall >= 1 - tolerance or depth == len(self):
+                break
+        self.rerank = depth
+        return depth, recall
+
+    def reconstruct(self, item_id):
+        """Return the full-precision vector of an item."""
+        return np.asarray(self.vectors[self._positions[item_id]], dtype=np.float32)
+
+    get = reconstruct
+
+    def save(self, path):
+        """Write the compressed codes plus the same sidecars as EmbeddingIndex.save."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if self.code_type == 'binary':
+            faiss.write_index_binary(self.index, path)
+        else:
+            faiss.write_index(self.index, path)
+        np.save(path + '.ids.npy', self.ids.astype(str))
+        np.save(path + '.vectors.npy', np.asarray(self.vectors, dtype=np.float32))
+        self._save_labels(path)
+        with open(path + '.json', 'w') as f:
+            json.dump(
+                {
+                    'index_type': self.index_type,
+                    'code_type': self.code_type,
+                    'rerank': self.rerank,
+                    'dim': self.dim,
+                    'num_items': len(self),
+                },
+                f,
+                indent=2,
+            )
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        Load an index saved with save().
+
+        The float32 vectors are always memory-mapped; mmap=True also maps the codes.
+        """
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        if meta['code_type'] == 'binary':
+            index = faiss.read_index_binary(path, flags)
+        else:
+            index = faiss.read_index(path, flags)
+        ids = np.load(path + '.ids.npy')
+        vectors = np.load(path + '.vectors.npy', mmap_mode='r')
+        return cls(
+            index,
+            ids,
+            meta['code_type'],
+            vectors,
+            rerank=meta['rerank'],
+            labels=_load_labels(path),
+        )
@@ -0,0 +1,633 @@
+import collections
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from retrieval.index import EmbeddingIndex
+from utils.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'shards.json'
+DEFAULT_TIMEOUT_MS = 200.0
+# Latencies kept per shard for the percentiles in stats()
+STATS_WINDOW = 1024
+
+# header length (uint32), body length (uint64); followed by a UTF-8 JSON
+# header and a raw little-endian float32 body
+_FRAME = struct.Struct('<IQ')
+
+
+def default_shard_dir(model_path):
+    """Shards of the catalog index: best_model.pth -> best_model.shards/."""
+    return os.path.splitext(model_path)[0] + '.shards'
+
+
+def shard_of(item_id, num_shards):
+    """
+    Return the shard an item ID belongs to.
+
+    The assignment is the CRC32 of the ID, so a lookup by ID goes to a single
+    shard and every process agrees on the placement.
+    """
+    return zlib.crc32(str(item_id).encode('utf-8')) % num_shards
+
+
+def build_shards(
+    embeddings, ids, directory, num_shards, index_type='auto', labels=None
+):
+    """
+    Partition a catalog into per-shard indexes.
+
+    Items are placed by shard_of(); each shard is saved as
+    <directory>/shard-NN.index, plus a shards.json manifest. Each shard picks
+    its own index type from its size with index_type='auto'. Returns the
+    manifest.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    ids = np.asarray(ids)
+    if len(embeddings) != len(ids):
+        raise ValueError(f"Got {len(embeddings)} embeddings but {len(ids)} ids")
+
+    os.makedirs(directory, exist_ok=True)
+    assignment = np.array(
+        [shard_of(item_id, num_shards) for item_id in ids.tolist()], dtype=np.int64
+    )
+    shards = []
+    for shard in range(num_shards):
+        rows = np.flatnonzero(assignment == shard)
+        shard_labels = (
+            {name: values[rows] for name, values in labels.items()}
+            if labels is not None
+            else None
+        )
+        index = EmbeddingIndex.build(
+            embeddings[rows], ids[rows], index_type=index_type, labels=shard_labels
+        )
+        name = f'shard-{shard:02d}.index'
+        index.save(os.path.join(directory, name))
+        shards.append(
+            {'path': name, 'num_items': len(index), 'index_type': index.index_type}
+        )
+
+    manifest = {
+        'num_shards': num_shards,
+        'dim': embeddings.shape[1],
+        'num_items': len(ids),
+        'shards': shards,
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def split_index(index, directory, num_shards, index_type='auto'):
+    """
+    Shard an existing EmbeddingIndex.
+
+    Like build_shards(), but from the index's stored vectors and labels (no
+    re-embedding).
+    """
+    if index.vectors is None:
+        raise ValueError('The index was saved without its vectors and cannot be split')
+    return build_shards(
+        index.vectors,
+        index.ids,
+        directory,
+        num_shards,
+        index_type=index_type,
+        labels=index.labels,
+    )
+
+
+def load_manifest(directory):
+    """Read the shards.json manifest of a build_shards() directory."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def _send(sock, header, body=b''):
+    header = json.dumps(header).encode('utf-8')
+    sock.sendall(_FRAME.pack(len(header), len(body)) + header + body)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError('Connection closed mid-frame')
+        received += n
+    return bytes(buffer)
+
+
+def _recv(sock):
+    """Return (header, body) or None when the peer closed between frames."""
+    first = sock.recv(_FRAME.size)
+    if not first:
+        return None
+    prefix = (
+        first + _recv_exact(sock, _FRAME.size - len(first))
+        if len(first) < _FRAME.size
+        else first
+    )
+    header_len, body_len = _FRAME.unpack(prefix)
+    header = json.loads(_recv_exact(sock, header_len))
+    return header, _recv_exact(sock, body_len) if body_len else b''
+
+
+class _ShardHandler(socketserver.BaseRequestHandler):
+    """
+    Serve one coordinator connection.
+
+    Requests are answered in order until the coordinator disconnects.
+    """
+
+    def handle(self):
+        index = self.server.index
+        while True:
+            try:
+                request = _recv(self.request)
+            except (ConnectionError, OSError):
+                return
+            if request is None:
+                return
+            header, body = request
+            start = time.perf_counter()
+            try:
+                reply, reply_body = self._dispatch(index, header, body)
+            except KeyError as e:
+                reply, reply_body = {'error': 'missing', 'item_id': e.args[0]}, b''
+            except Exception as e:
+                logger.exception(f"Shard request {header.get('op')} failed")
+                reply, reply_body = {'error': repr(e)}, b''
+            reply['elapsed'] = time.perf_counter() - start
+            try:
+                _send(self.request, reply, reply_body)
+            except OSError:
+                return  # the coordinator timed out and dropped the connection
+
+    @staticmethod
+    def _dispatch(index, header, body):
+        op = header['op']
+        if op == 'search':
+            queries = np.frombuffer(body, dtype='<f4').reshape(header['shape'])
+            if not len(index):
+                return {'shape': [len(queries), 0], 'ids': [[] for _ in queries]}, b''
+            scores, ids = index.search(queries, header['k'])
+            return {'shape': list(scores.shape), 'ids': ids.tolist()}, scores.astype(
+                '<f4'
+            ).tobytes()
+        if op == 'get_many':
+            vectors = [
+                np.asarray(index.get(item_id), dtype='<f4')
+                for item_id in header['item_ids']
+            ]
+            return {}, b''.join(vector.tobytes() for vector in vectors)
+        if op == 'labels':
+            labels = index.labels_of(header['item_ids'])
+            if labels is not None:
+                labels = {name: values.tolist() for name, values in labels.items()}
+            return {'labels': labels}, b''
+        if op == 'info':
+            return {
+                'num_items': len(index),
+                'dim': index.dim,
+                'index_type': index.index_type,
+            }, b''
+        raise ValueError(f"Unknown op '{op}'")
+
+
+class _ShardServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, index):
+        self.index = index
+        super().__init__(socket_path, _ShardHandler)
+
+
+def run_shard(index_path, socket_path, mmap=True, ready=None):
+    """
+    Serve one shard on a Unix socket.
+
+    Worker process body, with one thread per coordinator connection (FAISS
+    releases the GIL while searching).
+    """
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    index = EmbeddingIndex.load(index_path, mmap=mmap)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with _ShardServer(socket_path, index) as server:
+        threading.Thread(
+            target=_exit_with_parent, args=(server, os.getppid()), daemon=True
+        ).start()
+        logger.info(f"Serving {len(index)} items from {index_path} on {socket_path}")
+        if ready is not None:
+            ready.set()
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+def _exit_with_parent(server, parent_pid, interval=1.0):
+    # A coordinator killed by a signal never calls close(); don't outlive it
+    while os.getppid() == parent_pid:
+        time.sleep(interval)
+    server.shutdown()
+
+
+class ShardError(RuntimeError):
+    """No shard answered a search in time, or a lookup's shard did not answer."""
+
+
+class _ShardStats:
+    def __init__(self):
+        self.latencies = collections.deque(maxlen=STATS_WINDOW)
+        self.server_seconds = 0.0
+        self.requests = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def to_dict(self):
+        latencies = np.asarray(self.latencies) * 1000
+        percentiles = (
+            np.percentile(latencies, (50, 95, 99))
+            if len(latencies)
+            else (0.0, 0.0, 0.0)
+        )
+        completed = self.requests - self.timeouts - self.errors
+        return {
+            'requests': self.requests,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'p50_ms': float(percentiles[0]),
+            'p95_ms': float(percentiles[1]),
+            'p99_ms': float(percentiles[2]),
+            'mean_server_ms': self.server_seconds * 1000 / completed
+            if completed
+            else 0.0,
+        }
+
+
+class ShardedIndex:
+    """
+    Search a catalog split across shard worker processes.
+
+    Exposes the EmbeddingIndex query interface (search, get, get_many,
+    labels_of), so it can be passed to serving.api.create_app as the index.
+
+    search() sends the queries to every shard in parallel, waits at most
+    timeout_ms for the replies and merges the per-shard top-k lists (each
+    already sorted) with a heap. Shards that time out or fail are left out:
+    the result is partial rather than late. search_shards() also returns
+    which shards are missing.
+
+    Connections are pooled per shard. A connection that timed out is closed
+    rather than reused, so a late reply can never be read as the answer to
+    the next request.
+
+    stats() reports per-shard request counts, timeouts, errors and recent
+    latency percentiles, to spot hot or slow shards. With METRICS enabled
+    the same observations go to shard_seconds{shard=...},
+    shard_timeouts{shard=...} and partial_results.
+    """
+
+    def __init__(self, socket_paths, timeout_ms=DEFAULT_TIMEOUT_MS, processes=None):
+        self.socket_paths = list(socket_paths)
+        self.timeout = timeout_ms / 1000.0
+        self._processes = processes or []
+        self._socket_dir = None
+        self._idle = [[] for _ in self.socket_paths]
+        self._lock = threading.Lock()
+        self._stats = [_ShardStats() for _ in self.socket_paths]
+        self._executor = ThreadPoolExecutor(
+            max_workers=4 * len(self.socket_paths), thread_name_prefix='shard'
+        )
+
+        infos = [
+            self._call(shard, {'op': 'info'}, timeout=30.0)[0]
+            for shard in range(self.num_shards)
+        ]
+        self._num_items = sum(info['num_items'] for info in infos)
+        self._dim = infos[0]['dim']
+        self.index_type = f'sharded-{self.num_shards}'
+
+    @classmethod
+    def launch(
+        cls,
+        directory,
+        timeout_ms=DEFAULT_TIMEOUT_MS,
+        socket_dir=None,
+        mmap=True,
+        start_timeout=120.0,
+    ):
+        """
+        Start the shard workers of a build_shards() directory.
+
+        Returns a coordinator that owns the worker processes (close() stops them).
+        """
+        manifest = load_manifest(directory)
+        owned_dir = None
+        if socket_dir is None:
+            socket_dir = owned_dir = tempfile.mkdtemp(prefix='wardrobe-shards-')
+        os.makedirs(socket_dir, exist_ok=True)
+
+        # spawn: the parent may hold threads (uvicorn, torch) that fork would copy
+        # mid-state
+        context = multiprocessing.get_context('spawn')
+        processes, socket_paths, events = [], [], []
+        for number, shard in enumerate(manifest['shards']):
+            socket_path = os.path.join(socket_dir, f'shard-{number:02d}.sock')
+            ready = context.Event()
+            process = context.Process(
+                target=run_shard,
+                args=(os.path.join(directory, shard['path']), socket_path, mmap, ready),
+                name=f'shard-{number:02d}',
+                daemon=True,
+            )
+            process.start()
+            processes.append(process)
+            socket_paths.append(socket_path)
+            events.append(ready)
+
+        deadline = time.monotonic() + start_timeout
+        for number, (process, ready) in enumerate(zip(processes, events)):
+            if not ready.wait(max(0.0, deadline - time.monotonic())):
+                for p in processes:
+                    p.terminate()
+                raise ShardError(
+                    f"Shard {number} did not start within {start_timeout:.0f}s "
+                    f"(exit code {process.exitcode})"
+                )
+
+        try:
+            coordinator = cls(socket_paths, timeout_ms=timeout_ms, processes=processes)
+        except BaseException:
+            for process in processes:
+                process.terminate()
+            raise
+        coordinator._socket_dir = owned_dir
+        return coordinator
+
+    @property
+    def num_shards(self):
+        """Number of shards."""
+        return len(self.socket_paths)
+
+    @property
+    def dim(self):
+        """Embedding size."""
+        return self._dim
+
+    def __len__(self):
+        return self._num_items
+
+    def _connection(self, shard):
+        with self._lock:
+            if self._idle[shard]:
+                return self._idle[shard].pop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_paths[shard])
+        return sock
+
+    def _call(self, shard, header, body=b'', timeout=None, deadline=None):
+        """
+        One request/reply round trip.
+
+        Raises TimeoutError when the deadline passes first and ShardError when the shard
+        reports a failure.
+        """
+        deadline = (
+            deadline
+            if deadline is not None
+            else time.monotonic() + (timeout or self.timeout)
+        )
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(
+                f"Shard {shard} deadline passed before the request was sent"
+            )
+
+        sock = self._connection(shard)
+        try:
+            sock.settimeout(remaining)
+            _send(sock, header, body)
+            sock.settimeout(max(deadline - time.monotonic(), 1e-6))
+            reply = _recv(sock)
+            if reply is None:
+                raise ConnectionError(f"Shard {shard} closed the connection")
+        except BaseException:
+            sock.close()
+            raise
+        with self._lock:
+            self._idle[shard].append(sock)
+
+        reply_header, reply_body = reply
+        if reply_header.get('error') == 'missing':
+            raise KeyError(reply_header['item_id'])
+        if 'error' in reply_header:
+            raise ShardError(f"Shard {shard}: {reply_header['error']}")
+        return reply_header, reply_body
+
+    def _timed_search(self, shard, body, shape, k, deadline):
+        start = time.perf_counter()
+        header, scores = self._call(
+            shard, {'op': 'search', 'k': k, 'shape': shape}, body, deadline=deadline
+        )
+        scores = np.frombuffer(scores, dtype='<f4').reshape(header['shape'])
+        return scores, header['ids'], time.perf_counter() - start, header['elapsed']
+
+    def _record(self, shard, outcome, elapsed=None, server_seconds=None):
+        stats = self._stats[shard]
+        with self._lock:
+            stats.requests += 1
+            if outcome == 'ok':
+                stats.latencies.append(elapsed)
+                stats.server_seconds += server_seconds
+            else:
+                setattr(stats, outcome, getattr(stats, outcome) + 1)
+        if outcome == 'ok':
+            METRICS.observe('shard_seconds', elapsed, shard=str(shard))
+        else:
+            METRICS.inc(f'shard_{outcome}', shard=str(shard))
+
+    def search_shards(self, queries, k=10, timeout_ms=None):
+        """
+        Search every shard and merge the replies.
+
+        Returns (scores, ids, missing): the merged top-k, with the
+        EmbeddingIndex.search layout, and the sorted list of shards that timed out
+        or failed.
+        """
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype='<f4')
+        timeout = self.timeout if timeout_ms is None else timeout_ms / 1000.0
+        deadline = time.monotonic() + timeout
+        body = queries.tobytes()
+        futures = {
+            self._executor.submit(
+                self._timed_search, shard, body, list(queries.shape), k, deadline
+            ): shard
+            for shard in range(self.num_shards)
+        }
+        done, not_done = wait(futures, timeout=timeout)
+
+        # A reply that lands after wait() returned is dropped (and counted as a timeout)
+        replies, missing = [], []
+        for future, shard in futures.items():
+            if future in not_done:
+                future.cancel()
+                self._record(shard, 'timeouts')
+                missing.append(shard)
+                continue
+            try:
+                shard_scores, shard_ids, elapsed, server_seconds = future.result()
+            except (TimeoutError, socket.timeout):
+                self._record(shard, 'timeouts')
+                missing.append(shard)
+                continue
+            except Exception as e:
+                logger.warning(f"Shard {shard} left out of the results: {e!r}")
+                self._record(shard, 'errors')
+                missing.append(shard)
+                continue
+            self._record(shard, 'ok', elapsed, server_seconds)
+            replies.append((shard_scores, shard_ids))
+        if not replies:
+            raise ShardError(f"No shard answered within {timeout * 1000:.0f} ms")
+        if missing:
+            METRICS.inc('partial_results')
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), None, dtype=object)
+        for row in range(len(queries)):
+            # Each shard's row is sorted by descending score; merge them lazily
+            rows = [
+                zip(shard_scores[row].tolist(), shard_ids[row])
+                for shard_scores, shard_ids in replies
+            ]
+            merged = heapq.merge(*rows, key=lambda pair: pair[0], reverse=True)
+            for col, (score, item_id) in enumerate(itertools.islice(merged, k)):
+                if item_id is None:
+                    break
+                scores[row, col], ids[row, col] = score, item_id
+        return scores, ids, missing
+
+    def search(self, queries, k=10):
+        """Search like EmbeddingIndex.search; may be partial (see search_shards)."""
+        scores, ids, _ = self.search_shards(queries, k)
+        return scores, ids
+
+    def _per_shard(self, item_ids, op):
+        """
+        Send one request per shard owning some of item_ids.
+
+        Requests are {'op': op, 'item_ids': [...]}, sent in parallel. Returns
+        [(positions, header, body)], positions indexing into item_ids.
+        """
+        by_shard = collections.defaultdict(list)
+        for position, item_id in enumerate(item_ids):
+            by_shard[shard_of(item_id, self.num_shards)].append(position)
+        futures = []
+        for shard, positions in by_shard.items():
+            header = {'op': op, 'item_ids': [item_ids[p] for p in positions]}
+            futures.append(
+                (positions, self._executor.submit(self._call, shard, header))
+            )
+        try:
+            return [(positions, *future.result()) for positions, future in futures]
+        except (TimeoutError, socket.timeout, OSError) as e:
+            raise ShardError(f"{op} request failed: {e!r}") from e
+
+    def get(self, item_id):
+        """Return the stored vector for an item ID, or raise KeyError."""
+        return self.get_many([item_id])[0]
+
+    reconstruct = get
+
+    def get_many(self, item_ids):
+        """
+        Return the stored vectors of item_ids.
+
+        The result is a (len(item_ids), dim) array, fetched with one request per
+        shard involved. Raises KeyError for an unknown ID.
+        """
+        item_ids = list(item_ids)
+        vectors = np.empty((len(item_ids), self.dim), dtype=np.float32)
+        for positions, _, body in self._per_shard(item_ids, 'get_many'):
+            vectors[positions] = np.frombuffer(body, dtype='<f4').reshape(
+                len(positions), self.dim
+            )
+        return vectors
+
+    def labels_of(self, item_ids):
+        """Return stored labels like EmbeddingIndex.labels_of, shard by shard."""
+        item_ids = list(item_ids)
+        labels = None
+        for positions, header, _ in self._per_shard(item_ids, 'labels'):
+            if header['labels'] is None:
+                return None
+            if labels is None:
+                labels = {
+                    name: np.zeros(len(item_ids), dtype=np.int64)
+                    for name in header['labels']
+                }
+            for name, values in header['labels'].items():
+                labels[name][positions] = values
+        return labels
+
+    def stats(self):
+        """
+        Return per-shard request statistics.
+
+        Each shard gets {requests, timeouts, errors, p50_ms, p95_ms, p99_ms,
+        mean_server_ms}; latencies are coordinator round trips over the last
+        STATS_WINDOW searches, mean_server_ms the time spent searching inside
+        the shard (the rest is queueing and transport).
+        """
+        with self._lock:
+            return [
+                {'shard': shard, **stats.to_dict()}
+                for shard, stats in enumerate(self._stats)
+            ]
+
+    def close(self):
+        """Close the connections and stop the shard workers."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for idle in self._idle:
+                for sock in idle:
+                    sock.close()
+                idle.clear()
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(timeout=5)
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
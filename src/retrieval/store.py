@@ -0,0 +1,363 @@
+import glob
+import json
+import logging
+import os
+import struct
+import threading
+
+import numpy as np
+
+from retrieval.index import EmbeddingIndex
+
+logger = logging.getLogger(__name__)
+
+OP_UPSERT = 1
+OP_DELETE = 2
+
+# seq (uint64), op (uint8), id length (uint16); followed by the UTF-8 id and,
+# for upserts, dim float32 values.
+_RECORD_HEADER = struct.Struct('<QBH')
+
+
+class WriteAheadLog:
+    """
+    Append-only binary log of upsert/delete mutations.
+
+    A torn record at the tail (crash mid-write) is cut off on replay, so new records are
+    never appended behind it.
+    """
+
+    def __init__(self, path, dim, fsync=False):
+        self.path = path
+        self.dim = dim
+        self.fsync = fsync
+        self._file = open(path, 'ab')  # noqa: SIM115 - kept open for appends
+
+    def append(self, seq, op, item_id, vector=None):
+        """Append one mutation record, flushed (and fsynced if enabled)."""
+        key = item_id.encode('utf-8')
+        record = _RECORD_HEADER.pack(seq, op, len(key)) + key
+        if op == OP_UPSERT:
+            record += np.asarray(vector, dtype='<f4').tobytes()
+        self._file.write(record)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def replay(self):
+        """
+        Yield (seq, op, item_id, vector) for every complete record.
+
+        Once exhausted, the log is truncated to the end of the last complete one.
+        """
+        vector_bytes = self.dim * 4
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            seq, op, key_len = _RECORD_HEADER.unpack_from(data, offset)
+            end = (
+                offset
+                + _RECORD_HEADER.size
+                + key_len
+                + (vector_bytes if op == OP_UPSERT else 0)
+            )
+            if op not in (OP_UPSERT, OP_DELETE) or end > len(data):
+                break
+            key_end = offset + _RECORD_HEADER.size + key_len
+            try:
+                item_id = data[offset + _RECORD_HEADER.size : key_end].decode('utf-8')
+            except UnicodeDecodeError:
+                break
+            vector = (
+                np.frombuffer(data[key_end:end], dtype='<f4').copy()
+                if op == OP_UPSERT
+                else None
+            )
+            yield seq, op, item_id, vector
+            offset = end
+
+        if offset < len(data):
+            logger.warning(
+                f"Dropping {len(data) - offset} bytes of torn record at the end of "
+                f"{self.path}"
+            )
+            self._file.flush()
+            self._file.truncate(offset)
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def rewrite(self, records):
+        """Atomically replace the log with the given records."""
+        self._file.close()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            self._file = f
+            for record in records:
+                self.append(*record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'ab')  # noqa: SIM115 - kept open for appends
+
+    def close(self):
+        """Close the log file."""
+        self._file.close()
+
+
+class IncrementalIndex:
+    """
+    Serve a snapshot index plus a write-ahead-logged delta.
+
+    Upserts and deletes land in an in-memory delta on top of an immutable
+    EmbeddingIndex snapshot. Queries merge the snapshot (minus shadowed IDs)
+    with an exact scan of the delta. Once the delta grows past
+    compact_threshold, a background thread folds it into a fresh snapshot while
+    queries keep being served.
+
+    Directory layout:
+        CURRENT                 {"generation": n, "seq": last seq in snapshot}
+        snapshot-<n>.index      EmbeddingIndex files
+        wal.log                 mutations newer than the snapshot
+    """
+
+    def __init__(
+        self, directory, dim, index_type='auto', compact_threshold=10_000, fsync=False
+    ):
+        self.directory = directory
+        self.dim = dim
+        self.index_type = index_type
+        self.compact_threshold = compact_threshold
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._compaction = None
+        self._snapshot = None
+        self._generation = 0
+        self._snapshot_seq = 0
+        # item_id -> (seq, vector); vector None marks a delete
+        self._delta = {}
+        self._delta_matrix = None
+
+        current_path = os.path.join(directory, 'CURRENT')
+        if os.path.exists(current_path):
+            with open(current_path) as f:
+                current = json.load(f)
+            self._generation = current['generation']
+            self._snapshot_seq = current['seq']
+            self._snapshot = EmbeddingIndex.load(self._snapshot_path(self._generation))
+
+        self._seq = self._snapshot_seq
+        self._wal = WriteAheadLog(os.path.join(directory, 'wal.log'), dim, fsync=fsync)
+        for seq, op, item_id, vector in self._wal.replay():
+            if seq > self._snapshot_seq:
+                self._delta[item_id] = (seq, vector if op == OP_UPSERT else None)
+                self._seq = max(self._seq, seq)
+
+    @classmethod
+    def from_index(cls, directory, index, **kwargs):
+        """Seed a new store with an existing EmbeddingIndex as generation 1."""
+        store = cls(directory, index.dim, index_type=index.index_type, **kwargs)
+        with store._lock:
+            if store._snapshot is not None or store._delta:
+                raise ValueError(f"{directory} already contains an index")
+            store._install_snapshot(index, generation=1, seq=0)
+        return store
+
+    def _snapshot_path(self, generation):
+        return os.path.join(self.directory, f'snapshot-{generation}.index')
+
+    def __len__(self):
+        with self._lock:
+            count = len(self._snapshot) if self._snapshot is not None else 0
+            for item_id, (_, vector) in self._delta.items():
+                in_snapshot = self._snapshot is not None and item_id in self._snapshot
+                count += (vector is not None) - in_snapshot
+            return count
+
+    @property
+    def pending(self):
+        """Number of mutations not yet folded into the snapshot."""
+        return len(self._delta)
+
+    def upsert(self, item_id, vector):
+        """Insert or replace the vector of an item."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Expected a {self.dim}-D vector, got {vector.shape[0]}-D")
+        self._mutate(OP_UPSERT, str(item_id), vector)
+
+    def delete(self, item_id):
+        """Remove an item."""
+        self._mutate(OP_DELETE, str(item_id), None)
+
+    def _mutate(self, op, item_id, vector):
+        with self._lock:
+            self._seq += 1
+            self._wal.append(self._seq, op, item_id, vector)
+            self._delta[item_id] = (self._seq, vector)
+            self._delta_matrix = None
+            should_compact = len(self._delta) >= self.compact_threshold
+        if should_compact:
+            self.compact(wait=False)
+
+    def _live_delta(self):
+        # Cached (ids, matrix) of delta upserts, rebuilt lazily after mutations.
+        if self._delta_matrix is None:
+            ids = [
+                item_id
+                for item_id, (_, vector) in self._delta.items()
+                if vector is not None
+            ]
+            matrix = (
+                np.stack([self._delta[item_id][1] for item_id in ids])
+                if ids
+                else np.zeros((0, self.dim), np.float32)
+            )
+            self._delta_matrix = (np.asarray(ids, dtype=object), matrix)
+        return self._delta_matrix
+
+    def search(self, queries, k=10):
+        """Search like EmbeddingIndex.search, over snapshot + pending delta."""
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+        with self._lock:
+            snapshot = self._snapshot
+            shadowed = set(self._delta)
+            delta_ids, delta_matrix = self._live_delta()
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), None, dtype=object)
+
+        # Over-fetch so that results shadowed by the delta can be dropped.
+        if snapshot is not None and len(snapshot):
+            snap_scores, snap_ids = snapshot.search(queries, k + len(shadowed))
+        else:
+            snap_scores = np.zeros((len(queries), 0), np.float32)
+            snap_ids = np.zeros((len(queries), 0), object)
+        delta_scores = queries @ delta_matrix.T
+
+        for row in range(len(queries)):
+            keep = [
+                j
+                for j, item_id in enumerate(snap_ids[row])
+                if item_id is not None and item_id not in shadowed
+            ]
+            row_scores = np.concatenate([snap_scores[row, keep], delta_scores[row]])
+            row_ids = np.concatenate([snap_ids[row, keep], delta_ids])
+            top = np.argsort(-row_scores, kind='stable')[:k]
+            scores[row, : len(top)] = row_scores[top]
+            ids[row, : len(top)] = row_ids[top]
+
+        return scores, ids
+
+    def get(self, item_id):
+        """Return the current vector for an item, or raise KeyError."""
+        with self._lock:
+            if item_id in self._delta:
+                vector = self._delta[item_id][1]
+                if vector is None:
+                    raise KeyError(item_id)
+                return vector
+            if self._snapshot is None:
+                raise KeyError(item_id)
+            return self._snapshot.reconstruct(item_id)
+
+    def compact(self, wait=True):
+        """
+        Fold the pending delta into a new snapshot on a background thread.
+
+        Returns the thread (already joined when wait=True). If a compaction is already
+        running, wait=False returns it; wait=True lets it finish and then folds whatever
+        it did not capture.
+        """
+        running = self._compaction
+        if running is not None and running.is_alive():
+            if not wait:
+                return running
+            running.join()
+
+        with self._lock:
+            if self._compaction is None or not self._compaction.is_alive():
+                captured = dict(self._delta)
+                captured_seq = self._seq
+                self._compaction = threading.Thread(
+                    target=self._compact,
+                    args=(self._snapshot, captured, captured_seq),
+                    daemon=True,
+                )
+                self._compaction.start()
+            compaction = self._compaction
+        if wait:
+            compaction.join()
+        return compaction
+
+    def _compact(self, snapshot, captured, captured_seq):
+        if snapshot is not None and len(snapshot):
+            vectors = snapshot.vectors
+            if vectors is None:
+                vectors = np.stack(
+                    [snapshot.reconstruct(item_id) for item_id in snapshot.ids]
+                )
+            keep = np.array(
+                [item_id not in captured for item_id in snapshot.ids.tolist()]
+            )
+            ids = snapshot.ids[keep].tolist()
+            vectors = np.asarray(vectors, dtype=np.float32)[keep]
+        else:
+            ids, vectors = [], np.zeros((0, self.dim), np.float32)
+
+        upserts = [
+            (item_id, vector)
+            for item_id, (_, vector) in captured.items()
+            if vector is not None
+        ]
+        if upserts:
+            ids += [item_id for item_id, _ in upserts]
+            vectors = np.concatenate(
+                [vectors, np.stack([vector for _, vector in upserts])]
+            )
+
+        new_index = EmbeddingIndex.build(vectors, ids, index_type=self.index_type)
+        with self._lock:
+            generation = self._generation + 1
+        new_index.save(self._snapshot_path(generation))
+
+        with self._lock:
+            self._install_snapshot(new_index, generation, captured_seq, saved=True)
+            for item_id, entry in captured.items():
+                if self._delta.get(item_id) is entry:
+                    del self._delta[item_id]
+            self._delta_matrix = None
+            self._wal.rewrite(
+                (seq, OP_UPSERT if vector is not None else OP_DELETE, item_id, vector)
+                for item_id, (seq, vector) in sorted(
+                    self._delta.items(), key=lambda item: item[1][0]
+                )
+            )
+        logger.info(
+            f"Compacted {len(captured)} mutations into snapshot {generation} "
+            f"({len(new_index)} items)"
+        )
+
+    def _install_snapshot(self, index, generation, seq, saved=False):
+        if not saved:
+            index.save(self._snapshot_path(generation))
+
+        current_path = os.path.join(self.directory, 'CURRENT')
+        with open(current_path + '.tmp', 'w') as f:
+            json.dump({'generation': generation, 'seq': seq}, f)
+        os.replace(current_path + '.tmp', current_path)
+
+        old_generation = self._generation
+        self._snapshot, self._generation, self._snapshot_seq = index, generation, seq
+        if old_generation and old_generation != generation:
+            for path in glob.glob(self._snapshot_path(old_generation) + '*'):
+                os.remove(path)
+
+    def close(self):
+        """Wait for a running compaction and close the log."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        self._wal.close()
@@ -0,0 +1,175 @@
+import argparse
+import logging
+import os
+
+import torch
+import uvicorn
+
+from config import CLASS_NAMES
+from data.dataset import get_transforms
+from models.checkpoint import get_device, load_wardrobenet
+from retrieval.index import EmbeddingIndex, default_clip_index_path, default_index_path
+from retrieval.preferences import PreferenceStore
+from retrieval.sharded import ShardedIndex
+from retrieval.store import IncrementalIndex
+from serving.api import create_app
+from utils.metrics import METRICS
+
+
+def main(args):
+    """Load the model and index and serve the API."""
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    device = get_device()
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    if args.metrics:
+        METRICS.enabled = True
+
+    model, meta = load_wardrobenet(args.model_path, device, with_meta=True)
+    embed_dim = model.embedding[0].out_features
+
+    index = None
+    index_path = args.index_path or default_index_path(args.model_path)
+    if args.shard_dir:
+        index = ShardedIndex.launch(args.shard_dir, timeout_ms=args.shard_timeout_ms)
+        logging.info(
+            f"Searching {len(index)} items over {index.num_shards} shard processes"
+        )
+    elif args.store_dir:
+        index = IncrementalIndex(args.store_dir, dim=embed_dim)
+    elif os.path.exists(index_path):
+        index = EmbeddingIndex.load(index_path)
+    else:
+        logging.warning(
+            f"No index at {index_path}; /similar and /recommend are disabled"
+        )
+
+    clip, clip_index = None, None
+    if args.clip_dir:
+        from models.clip_encoder import ClipEncoder
+
+        clip = ClipEncoder(args.clip_dir, device, text_cache_size=args.text_cache_size)
+        clip_index = EmbeddingIndex.load(
+            args.clip_index_path or default_clip_index_path(args.model_path)
+        )
+
+    app = create_app(
+        model,
+        transform=get_transforms(train=False),
+        device=device,
+        index=index,
+        feedback_path=args.feedback_path,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        class_names=meta['labels'].get('categories') or CLASS_NAMES,
+        preferences=PreferenceStore(
+            args.preferences_dir, dim=embed_dim, alpha=args.preference_alpha
+        ),
+        rerank_weight=args.rerank_weight,
+        clip=clip,
+        clip_index=clip_index,
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Wardrobe Intelligence inference API')
+    parser.add_argument(
+        '--model_path',
+        type=str,
+        required=True,
+        help='Path to trained WardrobeNet weights',
+    )
+    parser.add_argument(
+        '--index_path',
+        type=str,
+        default=None,
+        help='FAISS index (default: next to the model weights)',
+    )
+    parser.add_argument(
+        '--store_dir',
+        type=str,
+        default=None,
+        help='Serve a mutable IncrementalIndex from this directory instead',
+    )
+    parser.add_argument(
+        '--shard_dir',
+        type=str,
+        default=None,
+        help='Serve the shards written by build_index.py --num_shards, one process '
+        'per shard',
+    )
+    parser.add_argument(
+        '--shard_timeout_ms',
+        type=float,
+        default=200.0,
+        help='Per-query shard deadline; shards that miss it are left out of the '
+        'results',
+    )
+    parser.add_argument('--feedback_path', type=str, default='models/feedback.jsonl')
+    parser.add_argument(
+        '--preferences_dir',
+        type=str,
+        default='models/preferences',
+        help='Memory-mapped per-user preference vectors',
+    )
+    parser.add_argument(
+        '--preference_alpha',
+        type=float,
+        default=0.2,
+        help='EMA rate of preference updates',
+    )
+    parser.add_argument(
+        '--rerank_weight',
+        type=float,
+        default=0.5,
+        help='Weight of user preference when re-ranking',
+    )
+    parser.add_argument(
+        '--clip_dir',
+        type=str,
+        default=None,
+        help='Local CLIP checkpoint enabling GET /search',
+    )
+    parser.add_argument(
+        '--clip_index_path',
+        type=str,
+        default=None,
+        help='CLIP catalog index (default: <model>.clip.index)',
+    )
+    parser.add_argument(
+        '--text_cache_size',
+        type=int,
+        default=4096,
+        help='Text query embeddings kept in the LRU cache',
+    )
+    parser.add_argument(
+        '--max_batch_size',
+        type=int,
+        default=32,
+        help='Largest micro-batch per forward pass',
+    )
+    parser.add_argument(
+        '--max_wait_ms',
+        type=float,
+        default=5.0,
+        help='Longest a request waits for its batch to fill',
+    )
+    parser.add_argument(
+        '--num_threads',
+        type=int,
+        default=None,
+        help='Intra-op threads for the forward pass',
+    )
+    parser.add_argument(
+        '--metrics',
+        action='store_true',
+        help='Record stage timings and serve them on GET /metrics',
+    )
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,419 @@
+import io
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import numpy as np
+import torch
+from fastapi import Depends, FastAPI, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from PIL import Image
+from pydantic import BaseModel
+
+from retrieval.diversity import mmr
+from retrieval.preferences import rerank
+from retrieval.sharded import ShardError
+from serving.batcher import MicroBatcher
+from utils.metrics import METRICS, SIZE_BUCKETS
+
+
+class FeedbackRequest(BaseModel):
+    """Like or dislike of an item by a user."""
+
+    user_id: str
+    item_id: str
+    liked: bool
+
+
+class DiversityQuery(BaseModel):
+    """
+    Query parameters of the "recommend different" mode.
+
+    diverse applies MMR (mmr_lambda: 1 = pure relevance, lower = more varied);
+    category/color keep only items predicted as that label, and max_per_category /
+    max_per_color cap how many results may share one.
+    """
+
+    diverse: bool = False
+    mmr_lambda: float = 0.7
+    category: Optional[int] = None
+    color: Optional[int] = None
+    max_per_category: Optional[int] = None
+    max_per_color: Optional[int] = None
+
+    @property
+    def needs_labels(self):
+        """Whether the query filters or caps on predicted labels."""
+        return any(
+            value is not None
+            for value in (
+                self.category,
+                self.color,
+                self.max_per_category,
+                self.max_per_color,
+            )
+        )
+
+    @property
+    def active(self):
+        """Whether the query changes the plain similarity ranking."""
+        return self.diverse or self.needs_labels
+
+
+class FeedbackLog:
+    """
+    Log like/dislike signals to an append-only JSONL file.
+
+    The log is replayed into memory on startup.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._feedback = {}  # user_id -> {item_id: liked}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._feedback.setdefault(record['user_id'], {})[
+                        record['item_id']
+                    ] = record['liked']
+
+    def add(self, user_id, item_id, liked):
+        """Record a like or dislike, appending it to the log file."""
+        with self._lock:
+            self._feedback.setdefault(user_id, {})[item_id] = liked
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(
+                        json.dumps(
+                            {'user_id': user_id, 'item_id': item_id, 'liked': liked}
+                        )
+                        + '\n'
+                    )
+
+    def for_user(self, user_id):
+        """Return {item_id: liked} for a user."""
+        with self._lock:
+            return dict(self._feedback.get(user_id, {}))
+
+
+def make_predict_fn(model, device):
+    """Wrap WardrobeNet as a batch function over preprocessed image tensors."""
+
+    @torch.no_grad()
+    def predict(images):
+        METRICS.observe('batch_size', len(images), buckets=SIZE_BUCKETS)
+        with METRICS.timer('stage_seconds', stage='forward'):
+            batch = torch.stack(images).to(device)
+            cat_logits, color_logits, embeddings = model(batch)
+        with METRICS.timer('stage_seconds', stage='postprocess'):
+            cat_probs = torch.softmax(cat_logits, dim=1).cpu().numpy()
+            color_probs = torch.softmax(color_logits, dim=1).cpu().numpy()
+            embeddings = embeddings.float().cpu().numpy()
+        return [
+            {
+                'category_probs': cat_probs[i],
+                'color_probs': color_probs[i],
+                'embedding': embeddings[i],
+            }
+            for i in range(len(images))
+        ]
+
+    return predict
+
+
+def _format_results(scores, ids):
+    return [
+        {'item_id': item_id, 'score': float(score)}
+        for score, item_id in zip(scores, ids)
+        if item_id is not None
+    ]
+
+
+def create_app(
+    model,
+    transform,
+    device,
+    index=None,
+    feedback_path=None,
+    max_batch_size=32,
+    max_wait_ms=5.0,
+    class_names=None,
+    preferences=None,
+    rerank_weight=0.5,
+    rerank_depth=100,
+    diverse_pool=500,
+    clip=None,
+    clip_index=None,
+):
+    """
+    Build the inference API.
+
+    The model is loaded once by the caller; every /embed request is decoded and
+    preprocessed on the thread pool and then joined into a micro-batch for a single
+    forward pass.
+
+    index may be an EmbeddingIndex, an IncrementalIndex or a ShardedIndex
+    (anything with search() and get()); /similar and /recommend return 503
+    without one. GET /shards reports per-shard latency for a ShardedIndex.
+
+    preferences is an optional PreferenceStore: feedback then updates the
+    user's running preference vector, /recommend searches with it, and
+    /similar?user_id=... re-ranks the top rerank_depth neighbours towards it.
+    With DiversityQuery options, /similar and /recommend pick their results
+    from the top diverse_pool candidates with MMR and label constraints.
+    clip (a ClipEncoder) and clip_index (CLIP embeddings of the catalog)
+    enable GET /search for text and image + text queries.
+
+    GET /metrics serves per-stage latency histograms, micro-batch sizes and
+    cache hit counts in the Prometheus text format while utils.metrics.METRICS
+    is enabled.
+    """
+    model.eval()
+    batcher = MicroBatcher(
+        make_predict_fn(model, device),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+    )
+    feedback = FeedbackLog(feedback_path)
+    class_names = class_names or {}
+    if clip is not None:
+        METRICS.track_cache('clip_text', clip.text_cache)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await batcher.start()
+        yield
+        await batcher.stop()
+        if preferences is not None:
+            preferences.flush()
+        # Stops ShardedIndex worker processes and closes an IncrementalIndex's log
+        close = getattr(index, 'close', None)
+        if close is not None:
+            close()
+
+    app = FastAPI(title='Wardrobe Intelligence API', lifespan=lifespan)
+
+    @app.exception_handler(ShardError)
+    async def shards_unavailable(request, exc):
+        # Every shard missed the deadline (a partial answer is returned as usual)
+        return JSONResponse(status_code=503, content={'detail': str(exc)})
+
+    @app.get('/metrics', response_class=PlainTextResponse)
+    def metrics():
+        if not METRICS.enabled:
+            raise HTTPException(status_code=404, detail='Metrics are disabled')
+        return PlainTextResponse(
+            METRICS.render_prometheus(), media_type='text/plain; version=0.0.4'
+        )
+
+    @app.get('/shards')
+    def shards():
+        stats = getattr(index, 'stats', None)
+        if stats is None:
+            raise HTTPException(status_code=404, detail='The index is not sharded')
+        return {'shards': stats()}
+
+    def require_index():
+        if index is None:
+            raise HTTPException(status_code=503, detail='No similarity index loaded')
+        return index
+
+    def lookup(item_id):
+        try:
+            return require_index().get(item_id)
+        except KeyError:
+            raise HTTPException(
+                status_code=404, detail=f"Unknown item '{item_id}'"
+            ) from None
+
+    def lookup_many(item_ids):
+        # One round trip per shard for a ShardedIndex instead of one per item
+        get_many = getattr(require_index(), 'get_many', None)
+        if get_many is None:
+            return np.stack([lookup(item_id) for item_id in item_ids])
+        try:
+            return get_many(item_ids)
+        except KeyError as e:
+            raise HTTPException(
+                status_code=404, detail=f"Unknown item '{e.args[0]}'"
+            ) from None
+
+    def preprocess(data):
+        with METRICS.timer('stage_seconds', stage='decode'):
+            image = Image.open(io.BytesIO(data)).convert('RGB')
+        with METRICS.timer('stage_seconds', stage='preprocess'):
+            return transform(image)
+
+    @app.post('/embed')
+    async def embed(file: UploadFile = File(...)):  # noqa: B008
+        data = await file.read()
+        try:
+            tensor = await run_in_threadpool(preprocess, data)
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail=f"Could not decode image: {e}"
+            ) from e
+
+        output = await batcher.submit(tensor)
+        category = int(np.argmax(output['category_probs']))
+        return {
+            'category_id': category,
+            'category': class_names.get(category, f"Class {category}"),
+            'category_probs': output['category_probs'].tolist(),
+            'color_id': int(np.argmax(output['color_probs'])),
+            'color_probs': output['color_probs'].tolist(),
+            'embedding': output['embedding'].tolist(),
+        }
+
+    def candidates(query, depth, exclude=()):
+        with METRICS.timer('stage_seconds', stage='search'):
+            scores, ids = require_index().search(query, depth + len(exclude))
+        keep = np.array(
+            [item_id is not None and item_id not in exclude for item_id in ids[0]],
+            dtype=bool,
+        )
+        return scores[0][keep], ids[0][keep]
+
+    def personalize(user_id, scores, ids):
+        preference = (
+            preferences.get(user_id) if preferences is not None and user_id else None
+        )
+        if preference is None or not len(ids):
+            return scores, ids
+        vectors = lookup_many(ids)
+        order, scores = rerank(preference, vectors, scores, weight=rerank_weight)
+        return scores, ids[order]
+
+    def diversify(scores, ids, k, params):
+        if not params.active or not len(ids):
+            return scores[:k], ids[:k]
+        categories = colors = None
+        if params.needs_labels:
+            labels_of = getattr(require_index(), 'labels_of', None)
+            labels = labels_of(ids) if labels_of is not None else None
+            if labels is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail='The index was built without predicted labels',
+                )
+            keep = np.ones(len(ids), dtype=bool)
+            if params.category is not None:
+                keep &= labels['category'] == params.category
+            if params.color is not None:
+                keep &= labels['color'] == params.color
+            scores, ids = scores[keep], ids[keep]
+            categories, colors = labels['category'][keep], labels['color'][keep]
+            if not len(ids):
+                return scores, ids
+
+        picked = mmr(
+            lookup_many(ids),
+            scores,
+            k,
+            lambda_=params.mmr_lambda if params.diverse else 1.0,
+            categories=categories,
+            colors=colors,
+            max_per_category=params.max_per_category,
+            max_per_color=params.max_per_color,
+        )
+        return scores[picked], ids[picked]
+
+    def search_depth(k, user_id, params):
+        depth = max(k, rerank_depth) if user_id and preferences is not None else k
+        return max(depth, diverse_pool) if params.active else depth
+
+    @app.get('/similar')
+    def similar(
+        item_id: str,
+        k: int = 10,
+        user_id: Optional[str] = None,
+        params: DiversityQuery = Depends(),  # noqa: B008
+    ):
+        vector = lookup(item_id)
+        scores, ids = candidates(
+            vector, search_depth(k, user_id, params), exclude={item_id}
+        )
+        scores, ids = personalize(user_id, scores, ids)
+        scores, ids = diversify(scores, ids, k, params)
+        return {'item_id': item_id, 'results': _format_results(scores, ids)}
+
+    @app.get('/search')
+    def search(
+        text: str,
+        k: int = 10,
+        item_id: Optional[str] = None,
+        weight: float = 0.5,
+        negative: Optional[str] = None,
+    ):
+        if clip is None or clip_index is None:
+            raise HTTPException(status_code=503, detail='No CLIP encoder/index loaded')
+        if item_id is None:
+            query = clip.encode_text([text])[0]
+        else:
+            try:
+                image_embedding = clip_index.get(item_id)
+            except KeyError:
+                raise HTTPException(
+                    status_code=404, detail=f"Unknown item '{item_id}'"
+                ) from None
+            query = clip.combine(
+                image_embedding, text, weight=weight, negative_text=negative
+            )
+        with METRICS.timer('stage_seconds', stage='search'):
+            scores, ids = clip_index.search(query, k + (item_id is not None))
+        results = [
+            r for r in _format_results(scores[0], ids[0]) if r['item_id'] != item_id
+        ]
+        return {'text': text, 'item_id': item_id, 'results': results[:k]}
+
+    @app.post('/feedback')
+    def add_feedback(request: FeedbackRequest):
+        vector = lookup(request.item_id)
+        feedback.add(request.user_id, request.item_id, request.liked)
+        if preferences is not None:
+            preferences.update(request.user_id, vector, request.liked)
+        return {'status': 'ok'}
+
+    @app.get('/recommend')
+    def recommend(
+        user_id: str,
+        k: int = 10,
+        params: DiversityQuery = Depends(),  # noqa: B008
+    ):
+        ratings = feedback.for_user(user_id)
+        if preferences is not None:
+            query = preferences.get(user_id)
+            if query is None or not np.any(query):
+                raise HTTPException(
+                    status_code=404, detail=f"No feedback for user '{user_id}'"
+                )
+        else:
+            liked = [
+                lookup(item_id) for item_id, is_liked in ratings.items() if is_liked
+            ]
+            if not liked:
+                raise HTTPException(
+                    status_code=404, detail=f"No liked items for user '{user_id}'"
+                )
+
+            # Move toward liked styles and away from disliked ones.
+            query = np.mean(liked, axis=0)
+            disliked = [
+                lookup(item_id) for item_id, is_liked in ratings.items() if not is_liked
+            ]
+            if disliked:
+                query = query - 0.5 * np.mean(disliked, axis=0)
+        query = query / max(np.linalg.norm(query), 1e-12)
+
+        scores, ids = candidates(
+            query, search_depth(k, None, params), exclude=set(ratings)
+        )
+        scores, ids = diversify(scores, ids, k, params)
+        return {'user_id': user_id, 'results': _format_results(scores, ids)}
+
+    return app
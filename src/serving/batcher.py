@@ -0,0 +1,85 @@
+import asyncio
+import contextlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Gather concurrent requests into micro-batches for a batched function.
+
+    A batch is flushed when it reaches max_batch_size or when the oldest request has
+    waited max_wait_ms. batch_fn runs on a single worker thread, so the event loop keeps
+    accepting (and queueing) requests during a forward pass and the model is never
+    called concurrently.
+
+    batch_fn takes a list of inputs and returns a list of outputs of the
+    same length.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._worker = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='microbatch'
+        )
+
+    async def start(self):
+        """Start the batching worker."""
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the batching worker and shut down its executor."""
+        if self._worker is not None:
+            self._worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._worker
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, item):
+        """Queue one input and wait for its output."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                outputs = await loop.run_in_executor(
+                    self._executor, self.batch_fn, items
+                )
+            except Exception as e:
+                logger.exception(f"Batch of {len(items)} failed")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), output in zip(batch, outputs):
+                # The caller may have disconnected (cancelled) while we were busy.
+                if not future.done():
+                    future.set_result(output)
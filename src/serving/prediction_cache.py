@@ -0,0 +1,149 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from utils.lru import LRUCache
+
+FIELDS = ('category_probs', 'color_probs', 'embedding')
+
+
+def content_hash(data):
+    """
+    Return the cache key of an uploaded file's bytes.
+
+    The key is their SHA-256, so identical photos share it no matter who
+    uploads them or under which file name.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def model_version(path, backend='', chunk_size=1 << 20):
+    """
+    Return a tag identifying the weights a prediction came from.
+
+    The tag combines the content hash of the model file with the inference
+    backend, so retrained models never reuse stale cache entries.
+    """
+    digest = hashlib.sha256(backend.encode('utf-8'))
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Category/color probabilities and embeddings keyed by (content hash, model version).
+
+    A small in-memory LRU answers repeat scans within a process; behind it a SQLite file
+    shares results across processes and restarts. The SQLite store is bounded by
+    max_bytes: once exceeded, the least recently used rows are evicted down to 90% of
+    the budget.
+    """
+
+    def __init__(self, path, version, memory_items=256, max_bytes=256 * 2**20):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.memory = LRUCache(memory_items)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            ' hash TEXT, version TEXT,'
+            ' category_probs BLOB, color_probs BLOB, embedding BLOB,'
+            ' size INTEGER, last_access REAL, PRIMARY KEY (hash, version))'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS predictions_lru ON predictions (last_access)'
+        )
+        self._db.commit()
+        self._total_bytes = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM predictions'
+        ).fetchone()[0]
+
+    def get(self, key):
+        """
+        Return the cached prediction for a content hash, or None.
+
+        A prediction is {'category_probs', 'color_probs', 'embedding'} float32
+        arrays.
+        """
+        prediction = self.memory.get(key)
+        if prediction is not None:
+            return prediction
+
+        with self._lock:
+            row = self._db.execute(
+                'SELECT category_probs, color_probs, embedding FROM predictions'
+                ' WHERE hash = ? AND version = ?',
+                (key, self.version),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                'UPDATE predictions SET last_access = ? WHERE hash = ? AND version = ?',
+                (time.time(), key, self.version),
+            )
+            self._db.commit()
+
+        prediction = {
+            name: np.frombuffer(blob, dtype=np.float32)
+            for name, blob in zip(FIELDS, row)
+        }
+        self.memory.put(key, prediction)
+        return prediction
+
+    def put(self, key, prediction):
+        """Store a prediction in memory and on disk."""
+        prediction = {
+            name: np.ascontiguousarray(prediction[name], dtype=np.float32)
+            for name in FIELDS
+        }
+        self.memory.put(key, prediction)
+        blobs = [prediction[name].tobytes() for name in FIELDS]
+        size = sum(len(blob) for blob in blobs)
+
+        with self._lock:
+            existing = self._db.execute(
+                'SELECT size FROM predictions WHERE hash = ? AND version = ?',
+                (key, self.version),
+            ).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, self.version, *blobs, size, time.time()),
+            )
+            self._total_bytes += size - (existing[0] if existing else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._db.commit()
+
+    def _evict(self, target_bytes):
+        rows = self._db.execute(
+            'SELECT hash, version, size FROM predictions ORDER BY last_access'
+        )
+        victims = []
+        for key, version, size in rows:
+            if self._total_bytes <= target_bytes:
+                break
+            victims.append((key, version))
+            self._total_bytes -= size
+        self._db.executemany(
+            'DELETE FROM predictions WHERE hash = ? AND version = ?', victims
+        )
+
+    @property
+    def disk_bytes(self):
+        """Bytes of predictions stored on disk."""
+        return self._total_bytes
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()
@@ -1,148 +1,696 @@
 import argparse
+import contextlib
+import json
+import logging
 import os
+import time
+
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
-from data.dataset import MultiTaskWardrobeDataset, get_transforms
-from models.baseline import WardrobeNet
-import logging
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Subset
+from torch.utils.data.distributed import DistributedSampler
 from tqdm import tqdm
-import wandb
-import pandas as pd
 
-def setup_logging(log_dir):
+from config import CLASS_NAMES, COLOR_NAMES
+from data.cache import TensorCache, cache_key, module_fingerprint
+from data.dataset import (
+    IMAGENET_MEAN,
+    IMAGENET_STD,
+    MultiTaskWardrobeDataset,
+    get_transforms,
+)
+from data.fast_augment import FastWardrobeDataset, fast_loader
+from data.shards import ShardedWardrobeDataset
+from models.baseline import WardrobeNet
+from models.checkpoint import hash_files, save_checkpoint
+from utils.metrics import METRICS
+
+
+def setup_logging(log_dir, is_main=True):
+    """Log to the console and a file on the main process, warnings only elsewhere."""
+    if not is_main:
+        # Only rank 0 writes logs; other ranks still surface warnings and errors
+        logging.basicConfig(
+            level=logging.WARNING,
+            format=f'[rank {dist.get_rank()}] %(levelname)s - %(message)s',
+        )
+        return
     logging.basicConfig(
         filename=os.path.join(log_dir, 'training.log'),
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
+        format='%(asctime)s - %(levelname)s - %(message)s',
     )
     console = logging.StreamHandler()
     console.setLevel(logging.INFO)
     logging.getLogger('').addHandler(console)
 
+
+def setup_distributed(args):
+    """
+    Set up distributed training when launched by torchrun.
+
+    torchrun sets WORLD_SIZE/RANK/LOCAL_RANK in the environment. gloo works on
+    CPU-only machines; use nccl for GPUs. Returns (rank, world_size, device).
+    """
+    if not args.distributed and int(os.environ.get('WORLD_SIZE', 1)) == 1:
+        return 0, 1, torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    dist.init_process_group(backend=args.dist_backend)
+    local_rank = int(os.environ.get('LOCAL_RANK', 0))
+    if torch.cuda.is_available() and args.dist_backend == 'nccl':
+        torch.cuda.set_device(local_rank)
+        device = torch.device('cuda', local_rank)
+    else:
+        device = torch.device('cpu')
+    return dist.get_rank(), dist.get_world_size(), device
+
+
+def load_labels(args):
+    """
+    Return the label maps stored in the checkpoint.
+
+    They come from --labels_json if given, otherwise from config.py when its
+    sizes match the heads.
+    """
+    if args.labels_json:
+        with open(args.labels_json) as f:
+            labels = json.load(f)
+        return {
+            key: {int(k): v for k, v in labels.get(key, {}).items()}
+            for key in ('categories', 'colors')
+        }
+
+    labels = {}
+    if len(CLASS_NAMES) == args.num_categories:
+        labels['categories'] = dict(CLASS_NAMES)
+    if len(COLOR_NAMES) == args.num_colors:
+        labels['colors'] = dict(COLOR_NAMES)
+    return labels
+
+
+def load_val_cache(args, model, val_dataset, val_loader, device, frozen):
+    """
+    Cache the validation inputs on first use.
+
+    Validation inputs never change between epochs. The cache holds the pooled
+    backbone features when the backbone is frozen, otherwise the transformed
+    image tensors.
+    """
+    encode = model.backbone if frozen else None
+    extra = (
+        f"features:{module_fingerprint(model.backbone)}"
+        if encode is not None
+        else 'tensors'
+    )
+    base_dataset = getattr(
+        val_dataset, 'dataset', val_dataset
+    )  # unwrap a per-rank Subset
+    if dist.is_initialized():
+        extra += f":rank{dist.get_rank()}of{dist.get_world_size()}"
+    key = cache_key(base_dataset.transform, base_dataset.source_files(), extra)
+    return TensorCache.load_or_build(
+        args.cache_val, key, val_loader, encode=encode, device=device
+    )
+
+
+def load_train_features(args, model, train_dataset, device):
+    """
+    Cache backbone features of augmented training views for head-only epochs.
+
+    Features of --feature_views views of every training image are computed
+    once and memory-mapped. Head-only epochs then train the embedding and heads
+    from these without touching the backbone.
+    """
+    model.backbone.eval()
+    loader = DataLoader(
+        train_dataset,
+        batch_size=args.batch_size,
+        shuffle=False,
+        num_workers=args.num_workers,
+        collate_fn=getattr(train_dataset, 'collate', None),
+    )
+    extra = (
+        f"train-features:{module_fingerprint(model.backbone)}:views{args.feature_views}"
+    )
+    key = cache_key(train_dataset.transform, train_dataset.source_files(), extra)
+    cache_dir = args.feature_cache or os.path.join(args.output_dir, 'feature_cache')
+    return TensorCache.load_or_build(
+        cache_dir,
+        key,
+        loader,
+        encode=model.backbone,
+        device=device,
+        num_views=args.feature_views,
+        batch_size=args.head_batch_size,
+        shuffle=True,
+    )
+
+
+def get_amp_dtype(device):
+    """
+    Pick the mixed-precision dtype for device.
+
+    bf16 where the hardware handles it natively (no loss scaling needed),
+    otherwise fp16 on CUDA. Returns None when mixed precision isn't worthwhile.
+    """
+    if device.type == 'cuda':
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    if torch.ops.mkldnn._is_mkldnn_bf16_supported():
+        return torch.bfloat16
+    return None
+
+
 def main(args):
+    """Train WardrobeNet and keep the checkpoint with the best validation accuracy."""
     # Setup
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    rank, world_size, device = setup_distributed(args)
+    is_main = rank == 0
+    distributed = world_size > 1
     os.makedirs(args.output_dir, exist_ok=True)
-    setup_logging(args.output_dir)
-    logging.info(f"Starting training on {device}...")
+    setup_logging(args.output_dir, is_main)
+    logging.info(
+        f"Starting training on {device} "
+        f"({world_size} process{'es' if distributed else ''})..."
+    )
+
+    if args.head_only and distributed:
+        raise ValueError(
+            "--head_only trains from a single-process feature cache; launch without "
+            "torchrun"
+        )
+    if args.perf:
+        args.amp = args.channels_last = args.compile = True
+    amp_dtype = get_amp_dtype(device) if args.amp else None
+    if args.amp and amp_dtype is None:
+        logging.warning(
+            "Mixed precision requested but not supported on this CPU; training in fp32"
+        )
+    memory_format = (
+        torch.channels_last if args.channels_last else torch.contiguous_format
+    )
+    if args.metrics_json:
+        METRICS.enabled = True
 
     # Initialize W&B
-    if args.wandb:
+    if args.wandb and is_main:
+        import wandb  # optional dependency, only loaded when logging to W&B
+
         wandb.init(project="wardrobe-intelligence", config=vars(args))
 
     # Data
-    train_dataset = MultiTaskWardrobeDataset(
-        csv_file=args.train_csv,
-        root_dir=args.data_dir,
-        transform=get_transforms(train=True)
-    )
-    train_loader = DataLoader(train_dataset, batch_size=args.batch_size, shuffle=True, num_workers=4)
-    
-    val_dataset = MultiTaskWardrobeDataset(
-        csv_file=args.val_csv,
-        root_dir=args.data_dir,
-        transform=get_transforms(train=False)
+    train_sampler = None
+    if args.train_shards:
+        # Pre-decoded uint8 shards (see data/make_shards.py): no per-sample JPEG decode.
+        # Blocks are split across ranks inside the dataset.
+        train_dataset = ShardedWardrobeDataset(
+            args.train_shards, transform=get_transforms(train=True), shuffle=True
+        )
+        train_loader = DataLoader(
+            train_dataset, batch_size=args.batch_size, num_workers=args.num_workers
+        )
+    elif args.fast_augment:
+        # uint8 decode in the workers, augmentation batched per collated batch
+        train_dataset = FastWardrobeDataset(args.train_csv, args.data_dir)
+        train_sampler = (
+            DistributedSampler(train_dataset, shuffle=True) if distributed else None
+        )
+        train_loader = fast_loader(
+            train_dataset,
+            args.batch_size,
+            sampler=train_sampler,
+            num_workers=args.num_workers,
+            prefetch_factor=args.prefetch_factor,
+            pin_memory=device.type == 'cuda',
+        )
+    else:
+        train_dataset = MultiTaskWardrobeDataset(
+            csv_file=args.train_csv,
+            root_dir=args.data_dir,
+            transform=get_transforms(train=True),
+        )
+        train_sampler = (
+            DistributedSampler(train_dataset, shuffle=True) if distributed else None
+        )
+        train_loader = DataLoader(
+            train_dataset,
+            batch_size=args.batch_size,
+            shuffle=train_sampler is None,
+            sampler=train_sampler,
+            num_workers=args.num_workers,
+        )
+
+    if args.val_shards:
+        val_dataset = ShardedWardrobeDataset(
+            args.val_shards, transform=get_transforms(train=False), shuffle=False
+        )
+    else:
+        val_dataset = MultiTaskWardrobeDataset(
+            csv_file=args.val_csv,
+            root_dir=args.data_dir,
+            transform=get_transforms(train=False),
+        )
+        if distributed:
+            # Strided split without DistributedSampler's padding, so all-reduced counts
+            # are exact
+            val_dataset = Subset(val_dataset, range(rank, len(val_dataset), world_size))
+    val_loader = DataLoader(
+        val_dataset,
+        batch_size=args.batch_size,
+        shuffle=False,
+        num_workers=args.num_workers,
     )
-    val_loader = DataLoader(val_dataset, batch_size=args.batch_size, shuffle=False, num_workers=4)
 
     # Model
+    arch = {
+        'num_categories': args.num_categories,
+        'num_colors': args.num_colors,
+        'embed_dim': args.embed_dim,
+        'backbone': 'efficientnet_b0',
+    }
     model = WardrobeNet(
-        num_categories=args.num_categories,
-        num_colors=args.num_colors,
-        embed_dim=args.embed_dim,
-        backbone='efficientnet_b0',
-        pretrained=True
-    ).to(device)
-    
+        **arch, pretrained=True, pretrained_file=args.backbone_weights
+    ).to(device, memory_format=memory_format)
+    frozen = args.freeze_backbone or args.head_only
+    unfreeze_at = (
+        args.epochs - args.unfreeze_epochs if frozen and args.unfreeze_epochs else None
+    )
+    if frozen:
+        for param in model.backbone.parameters():
+            param.requires_grad = False
+    # net (training) and eval_net (validation) wrap model and share its parameters;
+    # model itself is kept for saving and forward_head. Validation bypasses DDP:
+    # ranks see different numbers of val batches and need no gradient sync.
+    eval_net = torch.compile(model) if args.compile else model
+    ddp = None
+    net = eval_net
+    if distributed:
+        ddp = DistributedDataParallel(
+            model, device_ids=[device.index] if device.type == 'cuda' else None
+        )
+        net = torch.compile(ddp) if args.compile else ddp
+
+    # Everything a consumer needs to rebuild and run the model travels with the weights
+    checkpoint_meta = {
+        'arch': arch,
+        'labels': load_labels(args),
+        'normalization': {'mean': IMAGENET_MEAN, 'std': IMAGENET_STD},
+        'data_hash': hash_files([args.train_csv, args.val_csv]),
+    }
+    checkpoint_path = os.path.join(
+        args.output_dir,
+        'best_model.safetensors' if args.safetensors else 'best_model.pth',
+    )
+
     # Multi-task Loss
     criterion_category = nn.CrossEntropyLoss()
     criterion_color = nn.CrossEntropyLoss()
-    optimizer = optim.Adam(model.parameters(), lr=args.lr)
-    
+    optimizer = optim.Adam(
+        [p for p in model.parameters() if p.requires_grad], lr=args.lr
+    )
+    # Loss scaling is only needed for fp16; bf16 has fp32's exponent range
+    scaler = torch.amp.GradScaler(device.type, enabled=amp_dtype == torch.float16)
+
+    train_features = (
+        load_train_features(args, model, train_dataset, device)
+        if args.head_only
+        else None
+    )
+
     # Training Loop
     best_acc = 0.0
-    
+    val_cache = None
+
     for epoch in range(args.epochs):
+        if epoch == unfreeze_at:
+            logging.info(
+                f"Unfreezing the backbone for the last {args.unfreeze_epochs} epochs"
+            )
+            frozen = False
+            val_cache = None  # cached validation features came from the frozen backbone
+            for param in model.backbone.parameters():
+                param.requires_grad = True
+            optimizer.add_param_group(
+                {
+                    'params': list(model.backbone.parameters()),
+                    'lr': args.lr * args.backbone_lr_scale,
+                }
+            )
+            if distributed:
+                # DDP only syncs the parameters that required grad when it was built
+                ddp = DistributedDataParallel(
+                    model, device_ids=[device.index] if device.type == 'cuda' else None
+                )
+                net = torch.compile(ddp) if args.compile else ddp
+        head_only = train_features is not None and frozen
+
         model.train()
-        running_loss = 0.0
-        
-        pbar = tqdm(train_loader, desc=f"Epoch {epoch+1}/{args.epochs}")
-        for images, cat_labels, color_labels in pbar:
-            images = images.to(device)
-            cat_labels = cat_labels.to(device)
-            color_labels = color_labels.to(device)
-            
-            optimizer.zero_grad()
-            cat_logits, color_logits, _ = model(images)
-            
-            loss_cat = criterion_category(cat_logits, cat_labels)
-            loss_color = criterion_color(color_logits, color_labels)
-            
-            # Combine losses (can be weighted)
-            loss = loss_cat + loss_color
-            loss.backward()
-            optimizer.step()
-            
-            running_loss += loss.item() * images.size(0)
-            pbar.set_postfix({'loss': loss.item()})
-            
-            if args.wandb:
-                wandb.log({"batch_loss": loss.item()})
-            
-        epoch_loss = running_loss / len(train_dataset)
-        logging.info(f"Epoch {epoch+1} Loss: {epoch_loss:.4f}")
-        
+        if frozen:
+            # Keep BatchNorm statistics fixed too, so backbone features stay
+            # deterministic
+            model.backbone.eval()
+        # Accumulated on-device so logging doesn't force a host sync every batch
+        running_loss = torch.zeros((), device=device)
+        num_samples = 0
+        if hasattr(train_dataset, 'set_epoch'):
+            train_dataset.set_epoch(epoch)
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
+        if head_only:
+            train_features.set_epoch(epoch)
+        # Head-only epochs read pooled (N, C) features, which have no channels_last
+        # layout
+        batches, forward = (
+            (train_features, model.forward_head) if head_only else (train_loader, net)
+        )
+        step_format = torch.contiguous_format if head_only else memory_format
+        start = step_start = time.perf_counter()
+
+        pbar = tqdm(
+            batches, desc=f"Epoch {epoch + 1}/{args.epochs}", disable=not is_main
+        )
+        # join() lets ranks that run out of batches early (uneven shard splits) shadow
+        # the others' all-reduces
+        with ddp.join() if ddp is not None else contextlib.nullcontext():
+            for step, (images, cat_labels, color_labels) in enumerate(pbar):
+                data_ready = time.perf_counter()
+                images = images.to(device, memory_format=step_format, non_blocking=True)
+                cat_labels = cat_labels.to(device, non_blocking=True)
+                color_labels = color_labels.to(device, non_blocking=True)
+
+                optimizer.zero_grad(set_to_none=True)
+                with torch.autocast(
+                    device_type=device.type,
+                    dtype=amp_dtype,
+                    enabled=amp_dtype is not None,
+                ):
+                    cat_logits, color_logits, _ = forward(images)
+
+                    loss_cat = criterion_category(cat_logits, cat_labels)
+                    loss_color = criterion_color(color_logits, color_labels)
+
+                    # Combine losses (can be weighted)
+                    loss = loss_cat + loss_color
+                scaler.scale(loss).backward()
+                scaler.step(optimizer)
+                scaler.update()
+
+                running_loss += loss.detach().float() * images.size(0)
+                num_samples += images.size(0)
+
+                if METRICS.enabled:
+                    # Wait for queued kernels so compute time isn't billed to the next
+                    # data wait
+                    if device.type == 'cuda':
+                        torch.cuda.synchronize(device)
+                    step_end = time.perf_counter()
+                    METRICS.observe(
+                        'train_step_seconds', data_ready - step_start, phase='data_wait'
+                    )
+                    METRICS.observe(
+                        'train_step_seconds', step_end - data_ready, phase='compute'
+                    )
+                    step_start = step_end
+
+                if (step + 1) % args.log_interval == 0:
+                    batch_loss = loss.item()
+                    pbar.set_postfix({'loss': batch_loss})
+                    if args.wandb and is_main:
+                        wandb.log({"batch_loss": batch_loss})
+
+        loss_stats = torch.stack(
+            [running_loss, torch.tensor(float(num_samples), device=device)]
+        )
+        if distributed:
+            dist.all_reduce(loss_stats)
+        epoch_loss = (loss_stats[0] / loss_stats[1]).item()
+        samples_per_sec = loss_stats[1].item() / (time.perf_counter() - start)
+        logging.info(
+            f"Epoch {epoch + 1} Loss: {epoch_loss:.4f} "
+            f"({samples_per_sec:.1f} samples/s)"
+        )
+        if args.metrics_json and is_main:
+            histograms = METRICS.to_dict()['histograms']
+            wait = histograms.get('train_step_seconds{phase="data_wait"}', {}).get(
+                'sum', 0.0
+            )
+            compute = histograms.get('train_step_seconds{phase="compute"}', {}).get(
+                'sum', 0.0
+            )
+            logging.info(
+                f"Data wait {wait:.1f}s vs compute {compute:.1f}s so far "
+                f"({wait / max(wait + compute, 1e-9):.0%} of step time waiting on the "
+                "loader)"
+            )
+            METRICS.dump_json(args.metrics_json)
+
         # Validation
         model.eval()
         correct_cat = 0
         correct_color = 0
         total = 0
-        
-        with torch.no_grad():
-            for images, cat_labels, color_labels in val_loader:
-                images = images.to(device)
-                cat_labels = cat_labels.to(device)
-                color_labels = color_labels.to(device)
-                
-                cat_logits, color_logits, _ = model(images)
-                
+
+        if args.cache_val and val_cache is None:
+            val_cache = load_val_cache(
+                args, model, val_dataset, val_loader, device, frozen
+            )
+
+        with torch.no_grad(), torch.autocast(
+            device_type=device.type, dtype=amp_dtype, enabled=amp_dtype is not None
+        ):
+            for images, cat_labels, color_labels in (
+                val_cache if val_cache is not None else val_loader
+            ):
+                images = images.to(device, non_blocking=True)
+                cat_labels = cat_labels.to(device, non_blocking=True)
+                color_labels = color_labels.to(device, non_blocking=True)
+
+                if val_cache is not None and frozen:
+                    cat_logits, color_logits, _ = model.forward_head(images)
+                else:
+                    cat_logits, color_logits, _ = eval_net(
+                        images.contiguous(memory_format=memory_format)
+                    )
+
                 _, pred_cat = torch.max(cat_logits.data, 1)
                 _, pred_color = torch.max(color_logits.data, 1)
-                
+
                 total += cat_labels.size(0)
-                correct_cat += (pred_cat == cat_labels).sum().item()
-                correct_color += (pred_color == color_labels).sum().item()
-        
+                correct_cat += (pred_cat == cat_labels).sum()
+                correct_color += (pred_color == color_labels).sum()
+
+        # Sum the per-rank counts so every rank sees the global accuracy
+        counts = torch.tensor(
+            [int(correct_cat), int(correct_color), total],
+            dtype=torch.long,
+            device=device,
+        )
+        if distributed:
+            dist.all_reduce(counts)
+        correct_cat, correct_color, total = counts.tolist()
         acc_cat = correct_cat / total
         acc_color = correct_color / total
         avg_acc = (acc_cat + acc_color) / 2
-        
-        logging.info(f"Epoch {epoch+1} Val Acc - Category: {acc_cat:.4f}, Color: {acc_color:.4f}")
-        
-        if args.wandb:
-            wandb.log({"val_loss": epoch_loss, "val_acc_category": acc_cat, "val_acc_color": acc_color, "epoch": epoch+1})
-        
+
+        logging.info(
+            f"Epoch {epoch + 1} Val Acc - Category: {acc_cat:.4f}, "
+            f"Color: {acc_color:.4f}"
+        )
+
+        if args.wandb and is_main:
+            wandb.log(
+                {
+                    "val_loss": epoch_loss,
+                    "val_acc_category": acc_cat,
+                    "val_acc_color": acc_color,
+                    "samples_per_sec": samples_per_sec,
+                    "epoch": epoch + 1,
+                }
+            )
+
         # Save Best Model
         if avg_acc > best_acc:
             best_acc = avg_acc
-            torch.save(model.state_dict(), os.path.join(args.output_dir, 'best_model.pth'))
-            logging.info(f"Saved best model with avg acc: {best_acc:.4f}")
+            if is_main:
+                save_checkpoint(
+                    checkpoint_path,
+                    model,
+                    epoch=epoch + 1,
+                    val_acc=avg_acc,
+                    **checkpoint_meta,
+                )
+                logging.info(f"Saved best model with avg acc: {best_acc:.4f}")
+
+    if distributed:
+        dist.destroy_process_group()
+
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Professional Wardrobe Intelligence Training')
-    parser.add_argument('--data_dir', type=str, required=True, help='Path to images directory')
-    parser.add_argument('--train_csv', type=str, required=True, help='Path to train annotations CSV')
-    parser.add_argument('--val_csv', type=str, required=True, help='Path to val annotations CSV')
+    parser = argparse.ArgumentParser(
+        description='Professional Wardrobe Intelligence Training'
+    )
+    parser.add_argument(
+        '--data_dir', type=str, required=True, help='Path to images directory'
+    )
+    parser.add_argument(
+        '--train_csv', type=str, required=True, help='Path to train annotations CSV'
+    )
+    parser.add_argument(
+        '--val_csv', type=str, required=True, help='Path to val annotations CSV'
+    )
+    parser.add_argument(
+        '--train_shards',
+        type=str,
+        default=None,
+        help='Train from pre-decoded shards (built from --train_csv) instead of '
+        'decoding images',
+    )
+    parser.add_argument(
+        '--val_shards',
+        type=str,
+        default=None,
+        help='Validate from pre-decoded shards (built from --val_csv) instead of '
+        'decoding images',
+    )
     parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument(
+        '--num_workers',
+        type=int,
+        default=4,
+        help='DataLoader worker processes per rank',
+    )
+    parser.add_argument(
+        '--fast_augment',
+        action='store_true',
+        help='Decode to uint8 tensors and augment whole batches '
+        '(data/fast_augment.py) instead of per-image PIL transforms',
+    )
+    parser.add_argument(
+        '--prefetch_factor',
+        type=int,
+        default=2,
+        help='Batches prefetched per worker with --fast_augment',
+    )
+    parser.add_argument(
+        '--distributed',
+        action='store_true',
+        help='DistributedDataParallel (implied when launched with torchrun)',
+    )
+    parser.add_argument(
+        '--dist_backend',
+        type=str,
+        default='gloo',
+        choices=['gloo', 'nccl'],
+        help='gloo for CPU-only nodes, nccl for GPUs',
+    )
     parser.add_argument('--batch_size', type=int, default=32)
     parser.add_argument('--lr', type=float, default=0.001)
     parser.add_argument('--num_categories', type=int, default=3)
     parser.add_argument('--num_colors', type=int, default=5)
     parser.add_argument('--embed_dim', type=int, default=512)
     parser.add_argument('--output_dir', type=str, default='models/')
-    parser.add_argument('--wandb', action='store_true', help='Enable Weights & Biases logging')
-    
+    parser.add_argument(
+        '--backbone_weights',
+        type=str,
+        default=None,
+        help='Local ImageNet weights for the backbone (skips the Hugging Face Hub '
+        'download)',
+    )
+    parser.add_argument(
+        '--freeze_backbone',
+        action='store_true',
+        help='Train only the embedding and heads',
+    )
+    parser.add_argument(
+        '--head_only',
+        action='store_true',
+        help='Freeze the backbone, cache its features once and train only the '
+        'embedding and heads from them',
+    )
+    parser.add_argument(
+        '--feature_views',
+        type=int,
+        default=4,
+        help='Augmented views per training image cached by --head_only',
+    )
+    parser.add_argument(
+        '--feature_cache',
+        type=str,
+        default=None,
+        help='Directory for --head_only features (default: <output_dir>/feature_cache)',
+    )
+    parser.add_argument(
+        '--head_batch_size',
+        type=int,
+        default=256,
+        help='Batch size for head-only epochs',
+    )
+    parser.add_argument(
+        '--unfreeze_epochs',
+        type=int,
+        default=0,
+        help='With --freeze_backbone/--head_only, train the whole model for this '
+        'many final epochs',
+    )
+    parser.add_argument(
+        '--backbone_lr_scale',
+        type=float,
+        default=0.1,
+        help='Backbone learning rate as a fraction of --lr once unfrozen',
+    )
+    parser.add_argument(
+        '--cache_val',
+        type=str,
+        default=None,
+        help='Directory to cache validation tensors (or frozen-backbone features) '
+        'across epochs',
+    )
+    parser.add_argument(
+        '--labels_json',
+        type=str,
+        default=None,
+        help='JSON with {"categories": {id: name}, "colors": {id: name}}',
+    )
+    parser.add_argument(
+        '--safetensors',
+        action='store_true',
+        help='Save the checkpoint in safetensors format',
+    )
+    parser.add_argument(
+        '--wandb', action='store_true', help='Enable Weights & Biases logging'
+    )
+    parser.add_argument(
+        '--amp',
+        action='store_true',
+        help='Mixed precision (bf16 on CPU/Ampere+, fp16 + loss scaling otherwise)',
+    )
+    parser.add_argument(
+        '--channels_last',
+        action='store_true',
+        help='Use channels_last memory format for the backbone',
+    )
+    parser.add_argument(
+        '--compile', action='store_true', help='torch.compile the model'
+    )
+    parser.add_argument(
+        '--perf',
+        action='store_true',
+        help='Shorthand for --amp --channels_last --compile',
+    )
+    parser.add_argument(
+        '--metrics_json',
+        type=str,
+        default=None,
+        help='Record per-step data-wait vs compute time and write it to this JSON file',
+    )
+    parser.add_argument(
+        '--log_interval',
+        type=int,
+        default=10,
+        help='Batches between progress-bar/W&B loss updates',
+    )
+
     args = parser.parse_args()
     main(args)
@@ -2,27 +2,35 @@ import logging
 import os
 import sys
 
+
 def get_logger(name, log_file=None, level=logging.INFO):
     """
-    Returns a configured logger.
-    If log_file is provided, logs to file as well.
+    Return a configured logger.
+
+    If log_file is provided, logs to file as well. Calling it again for the
+    same name reuses the existing handlers instead of stacking new ones (which
+    would duplicate every line).
     """
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    
+
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
-    
+
     # Console Handler
-    ch = logging.StreamHandler(sys.stdout)
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
-    
+    if not any(getattr(h, '_wardrobe_console', False) for h in logger.handlers):
+        ch = logging.StreamHandler(sys.stdout)
+        ch.setFormatter(formatter)
+        ch._wardrobe_console = True
+        logger.addHandler(ch)
+
     # File Handler
     if log_file:
-        fh = logging.FileHandler(log_file)
-        fh.setFormatter(formatter)
-        logger.addHandler(fh)
-        
+        path = os.path.abspath(log_file)
+        if not any(getattr(h, 'baseFilename', None) == path for h in logger.handlers):
+            fh = logging.FileHandler(log_file)
+            fh.setFormatter(formatter)
+            logger.addHandler(fh)
+
     return logger
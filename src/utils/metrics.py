@@ -0,0 +1,228 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Seconds: 0.5 ms .. 10 s, covering a JPEG decode up to a large CPU batch
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'key', 'buckets', 'start')
+
+    def __init__(self, metrics, key, buckets):
+        self.metrics = metrics
+        self.key = key
+        self.buckets = buckets
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.key, time.perf_counter() - self.start, self.buckets)
+        return False
+
+
+class Histogram:
+    """
+    Count observations in fixed buckets.
+
+    Keeps per-bucket counts plus sum and count, the same shape as a Prometheus
+    histogram.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Add one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        """Return the histogram as plain JSON-serializable values."""
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'buckets': dict(zip([*map(str, self.buckets), '+Inf'], self.counts)),
+        }
+
+
+def _label_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+class Metrics:
+    """
+    Collect counters and histograms for the hot paths.
+
+    Covers decode, preprocess, forward, postprocess and search, rendered in the
+    Prometheus text exposition format or dumped as JSON.
+
+    Disabled, timer() returns a shared no-op context manager and inc() /
+    observe() return immediately, so instrumented code costs one attribute
+    check. Enabled, an observation is a bisect and a few additions under a
+    lock.
+
+    Caches that already count their own hits and misses (LRUCache) are
+    registered with track_cache() and read only when metrics are rendered.
+    """
+
+    def __init__(self, enabled=False, namespace='wardrobe'):
+        self.enabled = enabled
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._caches = {}
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter."""
+        if not self.enabled:
+            return
+        key = _label_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Add one observation to a histogram."""
+        if self.enabled:
+            self._observe(_label_key(name, labels), value, buckets)
+
+    def _observe(self, key, value, buckets):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def timer(self, name, buckets=LATENCY_BUCKETS, **labels):
+        """
+        Time the enclosed block.
+
+        The elapsed seconds are observed in the name histogram:
+
+            with METRICS.timer('stage_seconds', stage='forward'):
+                outputs = model(batch)
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, _label_key(name, labels), buckets)
+
+    def track_cache(self, name, cache):
+        """Expose an object with hits/misses attributes as cache counters."""
+        self._caches[name] = cache
+
+    def reset(self):
+        """Drop every counter and histogram."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def _snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: histogram.to_dict() for key, histogram in self._histograms.items()
+            }
+        for name, cache in self._caches.items():
+            counters[_label_key('cache_hits', {'cache': name})] = cache.hits
+            counters[_label_key('cache_misses', {'cache': name})] = cache.misses
+        return counters, histograms
+
+    def to_dict(self):
+        """Return every metric as plain JSON-serializable values."""
+        counters, histograms = self._snapshot()
+        return {
+            'counters': {
+                name + _format_labels(labels): value
+                for (name, labels), value in sorted(counters.items())
+            },
+            'histograms': {
+                name + _format_labels(labels): value
+                for (name, labels), value in sorted(histograms.items())
+            },
+        }
+
+    def dump_json(self, path):
+        """Write to_dict() to path as JSON."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def render_prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        counters, histograms = self._snapshot()
+        lines = []
+        seen = set()
+        for (name, labels), value in sorted(counters.items()):
+            full_name = f'{self.namespace}_{name}_total'
+            if full_name not in seen:
+                seen.add(full_name)
+                lines.append(f'# TYPE {full_name} counter')
+            lines.append(f'{full_name}{_format_labels(labels)} {value}')
+
+        for (name, labels), histogram in sorted(histograms.items()):
+            full_name = f'{self.namespace}_{name}'
+            if full_name not in seen:
+                seen.add(full_name)
+                lines.append(f'# TYPE {full_name} histogram')
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                lines.append(
+                    f'{full_name}_bucket{_format_labels(labels, [("le", bound)])} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{full_name}_sum{_format_labels(labels)} {histogram["sum"]}')
+            lines.append(
+                f'{full_name}_count{_format_labels(labels)} {histogram["count"]}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+# Shared registry; serve.py --metrics and train.py --metrics_json switch it on
+METRICS = Metrics(enabled=os.environ.get('WARDROBE_METRICS', '') == '1')
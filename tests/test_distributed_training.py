@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from data.shards import write_shards  # noqa: E402
+
+timm = pytest.importorskip('timm')
+if not torch.distributed.is_available():
+    pytest.skip('torch.distributed is not available', allow_module_level=True)
+
+
+def write_images(image_dir, csv_path, num_images, seed):
+    """Write num_images random JPEGs plus a MultiTaskWardrobeDataset CSV."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(image_dir, exist_ok=True)
+    rows = []
+    for i in range(num_images):
+        name = f'{seed}-{i}.jpg'
+        pixels = rng.integers(0, 256, (48, 48, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(os.path.join(image_dir, name))
+        rows.append((name, i % 3, i % 5))
+    pd.DataFrame(rows, columns=['image_path', 'category_id', 'color_id']).to_csv(
+        csv_path, index=False
+    )
+
+
+def test_two_rank_gloo_training_over_shards_with_val_cache(tmp_path):
+    """Train two gloo ranks over shards, each caching its share of the val set."""
+    image_dir = tmp_path / 'images'
+    write_images(image_dir, tmp_path / 'train.csv', 12, seed=0)
+    # 7 images in shards of 3: rank 0 reads 4 of them, rank 1 reads 3
+    write_images(image_dir, tmp_path / 'val.csv', 7, seed=1)
+    for split, shard_size in (('train', 4), ('val', 3)):
+        write_shards(
+            tmp_path / f'{split}.csv',
+            image_dir,
+            tmp_path / f'{split}_shards',
+            image_size=32,
+            shard_size=shard_size,
+            num_workers=1,
+        )
+    # Local backbone weights, so the run never reaches the Hugging Face Hub
+    weights = tmp_path / 'backbone.pth'
+    torch.save(
+        timm.create_model(
+            'efficientnet_b0', pretrained=False, num_classes=0
+        ).state_dict(),
+        weights,
+    )
+
+    result = subprocess.run(  # noqa: S603 - runs this interpreter on our own code
+        [
+            sys.executable,
+            '-m',
+            'torch.distributed.run',
+            '--nproc_per_node',
+            '2',
+            os.path.join(ROOT, 'src', 'train.py'),
+            '--data_dir',
+            str(image_dir),
+            '--train_csv',
+            str(tmp_path / 'train.csv'),
+            '--val_csv',
+            str(tmp_path / 'val.csv'),
+            '--train_shards',
+            str(tmp_path / 'train_shards'),
+            '--val_shards',
+            str(tmp_path / 'val_shards'),
+            '--cache_val',
+            str(tmp_path / 'val_cache'),
+            '--dist_backend',
+            'gloo',
+            '--epochs',
+            '2',
+            '--batch_size',
+            '4',
+            '--num_workers',
+            '0',
+            '--backbone_weights',
+            str(weights),
+            '--output_dir',
+            str(tmp_path / 'out'),
+        ],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=900,
+    )
+
+    assert result.returncode == 0, result.stderr[-4000:]
+    assert (tmp_path / 'out' / 'best_model.pth').exists()
+    # One cache per rank, holding exactly the rows that rank validates on
+    caches = sorted((tmp_path / 'val_cache').glob('*.inputs.npy'))
+    assert sorted(len(np.load(path, mmap_mode='r')) for path in caches) == [3, 4]